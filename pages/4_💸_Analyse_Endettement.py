@@ -2,12 +2,33 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import plotly.express as px
 from datetime import datetime
+from utils.calculs import calculer_taux_endettement, coefficients_capacite_emprunt, calculer_mensualites_prets_par_mois, calculer_trajectoire_endettement
+from utils.calculs_projection import generer_projection_complete
+from utils.cache_projection import CACHE_PROJECTION, cle_projection, projection_en_cache
+from utils.openfisca_utils import OPENFISCA_READY
+from utils.renegociation_prets import generer_options, evaluer_options, MODES_REMBOURSEMENT
 from utils.state_manager import initialize_session
 
 # Initialiser la session au début du script
 initialize_session()
 
+# Grille du calcul de capacité d'emprunt : taux nominal, durée et taux d'assurance
+GRILLE_TAUX_PCT = tuple(np.round(np.arange(1.0, 6.01, 0.25), 2))
+GRILLE_DUREES_ANNEES = tuple(range(10, 26))
+GRILLE_TAUX_ASSURANCE_PCT = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5)
+
+@st.cache_data(show_spinner=False)
+def _coefficients_capacite(taux, durees, taux_assurance):
+    """Capital empruntable par euro de mensualité sur toute la grille, calculé une seule fois par session serveur."""
+    return coefficients_capacite_emprunt(taux, durees, taux_assurance)
+
+@st.cache_data(show_spinner=False)
+def _mensualites_par_mois(df_prets, df_ventes, mois_debut, n_mois):
+    """Mensualités mensuelles de tous les prêts : l'échéancier n'est recalculé que si les prêts ou les ventes changent."""
+    return calculer_mensualites_prets_par_mois(df_prets, mois_debut, n_mois, df_ventes)
+
 # Tentative d'importation de la fonction de calcul des mensualités
 try:
     from utils.calculs import calculer_mensualite_pret
@@ -57,118 +78,12 @@ elif st.session_state.df_revenus.empty and not st.session_state.df_prets.empty:
      st.warning("⚠️ Aucun revenu n'a été saisi, mais des prêts existent. Le taux d'endettement sera infini ou non calculable.")
      # On continue pour afficher au moins les charges de prêts
 
-df_revenus = st.session_state.df_revenus.copy()
-df_prets = st.session_state.df_prets.copy()
-df_stocks = st.session_state.df_stocks.copy()
-
-# Assurer les types de données corrects et gérer les NaN
-df_revenus['Montant Annuel'] = pd.to_numeric(df_revenus['Montant Annuel'], errors='coerce').fillna(0)
-
-colonnes_prets_requises = {'Montant Initial':0.0, 'Taux Annuel %':0.0, 'Durée Initiale (ans)':0.0, 'Date Début':pd.NaT, 'Assurance Emprunteur %':0.0, 'Actif Associé': 'N/A'}
-for col, valeur_defaut in colonnes_prets_requises.items():
-    if col not in df_prets.columns:
-        df_prets[col] = valeur_defaut
-df_prets['Montant Initial'] = pd.to_numeric(df_prets['Montant Initial'], errors='coerce').fillna(0)
-df_prets['Taux Annuel %'] = pd.to_numeric(df_prets['Taux Annuel %'], errors='coerce').fillna(0)
-df_prets['Durée Initiale (ans)'] = pd.to_numeric(df_prets['Durée Initiale (ans)'], errors='coerce').fillna(0)
-df_prets['Assurance Emprunteur %'] = pd.to_numeric(df_prets['Assurance Emprunteur %'], errors='coerce').fillna(0)
-df_prets['Date Début'] = pd.to_datetime(df_prets['Date Début'], errors='coerce')
-
-colonnes_stocks_requises = {'Type': None, 'Valeur Brute': 0.0, 'Rendement %': 0.0, 'Actif': 'Actif Inconnu'}
-for col, valeur_defaut in colonnes_stocks_requises.items():
-    if col not in df_stocks.columns:
-        df_stocks[col] = valeur_defaut
-df_stocks['Valeur Brute'] = pd.to_numeric(df_stocks['Valeur Brute'], errors='coerce').fillna(0)
-df_stocks['Rendement %'] = pd.to_numeric(df_stocks['Rendement %'], errors='coerce').fillna(0)
-
-
-# --- 1. Calcul des Charges de Prêts Mensuelles ---
-charges_details_list = []
-
-for _, pret in df_prets.iterrows():
-    is_active = False
-    status_reason = ""
-    
-    # Vérifier les conditions pour qu'un prêt soit actif
-    if not (pd.notna(pret['Date Début']) and pret['Date Début'] < datetime.now()):
-        status_reason = f"Prêt futur (début le {pret['Date Début'].strftime('%d/%m/%Y')})" if pd.notna(pret['Date Début']) else "Date de début manquante"
-    elif not (pret['Montant Initial'] > 0):
-        status_reason = "Montant initial nul ou manquant"
-    elif not (pret['Durée Initiale (ans)'] > 0):
-        status_reason = "Durée nulle ou manquante"
-    elif not (pd.notna(pret['Taux Annuel %'])):
-        status_reason = "Taux manquant"
-    else:
-        is_active = True
-        status_reason = "Actif et inclus dans le calcul"
-
-    # Calculer la mensualité si possible, quel que soit le statut
-    mensualite = np.nan
-    if pret['Montant Initial'] > 0 and pret['Durée Initiale (ans)'] > 0 and pd.notna(pret['Taux Annuel %']):
-        mensualite = calculer_mensualite_pret(
-            pret['Montant Initial'],
-            pret['Taux Annuel %'],
-            pret['Durée Initiale (ans)'],
-            pret.get('Assurance Emprunteur %', 0)
-        )
-
-    charges_details_list.append({
-        "Description": f"Prêt ({pret.get('Actif Associé', 'N/A')})",
-        "Mensualité (€)": mensualite if pd.notna(mensualite) else 0,
-        "Statut": "Actif" if is_active else "Inactif",
-        "Raison / Statut": status_reason
-    })
-
-df_charges_details = pd.DataFrame(charges_details_list)
-
-# Calculer le total basé uniquement sur les prêts actifs
-total_charges_prets_mensuelles = df_charges_details[df_charges_details['Statut'] == 'Actif']['Mensualité (€)'].sum()
-
-# --- 2. Calcul des Revenus Mensuels Pondérés ---
-revenus_details_list = []
-
-# Revenus autres que locatifs
-revenus_autres_annuels = df_revenus['Montant Annuel'].sum()
-revenus_autres_mensuels = revenus_autres_annuels / 12.0
-if revenus_autres_mensuels > 0:
-    revenus_details_list.append({
-        "Source": "Autres revenus (salaires, pensions, etc.)", 
-        "Montant Mensuel Brut (€)": revenus_autres_mensuels, 
-        "Pondération (%)": 100, 
-        "Montant Mensuel Pondéré (€)": revenus_autres_mensuels
-    })
-
-# Revenus locatifs (Immobilier productif)
-revenus_locatifs_bruts_annuels_total = 0.0
-revenus_locatifs_pondérés_mensuels_total = 0.0
-
-df_immobilier_productif = df_stocks[df_stocks['Type'] == "Immobilier productif"]
-
-for _, actif in df_immobilier_productif.iterrows():
-    if actif['Valeur Brute'] > 0 and pd.notna(actif['Rendement %']) and actif['Rendement %'] != 0:
-        revenu_locatif_actif_annuel_brut = actif['Valeur Brute'] * (actif['Rendement %'] / 100.0)
-        revenu_locatif_actif_mensuel_brut = revenu_locatif_actif_annuel_brut / 12.0
-        revenu_locatif_actif_mensuel_pondere = revenu_locatif_actif_mensuel_brut * 0.70
-        
-        revenus_locatifs_bruts_annuels_total += revenu_locatif_actif_annuel_brut
-        revenus_locatifs_pondérés_mensuels_total += revenu_locatif_actif_mensuel_pondere
-        
-        revenus_details_list.append({
-            "Source": f"Locatif Brut - {actif['Actif']}",
-            "Montant Mensuel Brut (€)": revenu_locatif_actif_mensuel_brut,
-            "Pondération (%)": 70,
-            "Montant Mensuel Pondéré (€)": revenu_locatif_actif_mensuel_pondere
-        })
-
-total_revenus_mensuels_pondérés = revenus_autres_mensuels + revenus_locatifs_pondérés_mensuels_total
-df_revenus_details = pd.DataFrame(revenus_details_list)
-
-# --- 3. Calcul du Taux d'Endettement ---
-taux_endettement_actuel = 0.0
-if total_revenus_mensuels_pondérés > 0:
-    taux_endettement_actuel = (total_charges_prets_mensuelles / total_revenus_mensuels_pondérés) * 100.0
-elif total_charges_prets_mensuelles > 0: # Dettes mais pas de revenus pris en compte
-    taux_endettement_actuel = float('inf') 
+endettement = calculer_taux_endettement(st.session_state.df_revenus, st.session_state.df_prets, st.session_state.df_stocks)
+df_charges_details = endettement['charges_details']
+df_revenus_details = endettement['revenus_details']
+total_charges_prets_mensuelles = endettement['total_charges_prets_mensuelles']
+total_revenus_mensuels_pondérés = endettement['total_revenus_mensuels_ponderes']
+taux_endettement_actuel = endettement['taux_endettement']
 
 # --- 4. Affichage des Résultats ---
 st.subheader("📈 Synthèse du Taux d'Endettement")
@@ -253,3 +168,150 @@ with st.expander("🔍 Détail des Charges de Prêts Mensuelles"):
         st.markdown(f"**Total des Charges de Prêts Actives (incluses dans le calcul) : {total_charges_prets_mensuelles:,.2f} €**")
     else:
         st.write("Aucun prêt n'a été saisi.")
+
+st.markdown("---")
+st.subheader("🏦 Capacité d'Emprunt Supplémentaire")
+st.write(f"""
+Montant maximal d'un nouvel emprunt dont la mensualité (assurance comprise) reste dans la capacité résiduelle
+de {max(mensualite_residuelle, 0):,.2f} € par mois, soit un taux d'endettement de {taux_endettement_max_cible:.1f}% au plus.
+""")
+if mensualite_residuelle <= 0:
+    st.warning("Le taux d'endettement cible est déjà atteint : aucune capacité d'emprunt supplémentaire.")
+else:
+    taux_assurance_capacite = st.select_slider("Taux d'assurance annuel (% du capital initial)", options=GRILLE_TAUX_ASSURANCE_PCT, value=0.3, format_func=lambda t: f"{t:.1f} %")
+    # Seule la capacité résiduelle dépend du taux cible : la grille de coefficients est réutilisée telle quelle
+    capacites = mensualite_residuelle * _coefficients_capacite(GRILLE_TAUX_PCT, GRILLE_DUREES_ANNEES, GRILLE_TAUX_ASSURANCE_PCT)
+    df_capacites = pd.DataFrame(
+        capacites[:, :, GRILLE_TAUX_ASSURANCE_PCT.index(taux_assurance_capacite)],
+        index=[f"{t:.2f} %" for t in GRILLE_TAUX_PCT], columns=[f"{d} ans" for d in GRILLE_DUREES_ANNEES]
+    )
+    fig_capacite = px.imshow(
+        df_capacites, text_auto=',.0f', aspect='auto', color_continuous_scale='Greens', origin='lower',
+        labels=dict(x="Durée", y="Taux nominal", color="Capacité (€)"),
+        title=f"Montant empruntable (€) selon le taux et la durée — assurance {taux_assurance_capacite:.1f} %"
+    )
+    st.plotly_chart(fig_capacite, use_container_width=True)
+
+st.markdown("---")
+st.subheader("📅 Trajectoire du Taux d'Endettement")
+st.write(f"""
+Évolution mois par mois du taux d'endettement et du reste à vivre : échéanciers de tous les prêts (y compris futurs,
+soldés à la vente du bien associé) rapportés aux revenus projetés (départs à la retraite, pensions, revalorisations).
+Les mois au-delà de la cible de {taux_endettement_max_cible:.1f}% sont signalés.
+
+Contrairement au taux actuel ci-dessus, qui estime les loyers par la valeur et le rendement des biens, la trajectoire
+retient les loyers saisis (loyer mensuel brut) des biens détenus, toujours pondérés à 70%, et les revenus revalorisés
+de la projection : le taux du premier mois peut donc différer du taux actuel.
+""")
+col_traj1, col_traj2 = st.columns([3, 1])
+duree_trajectoire = col_traj1.slider("Horizon de la trajectoire (années)", 1, 50, 25, help="Avec la même durée que sur la page Projection, la projection déjà calculée est réutilisée.")
+moteur_trajectoire = 'openfisca' if OPENFISCA_READY else 'bareme'
+entrees_trajectoire = (
+    duree_trajectoire, st.session_state.df_stocks, st.session_state.df_revenus, st.session_state.df_depenses, st.session_state.df_prets,
+    st.session_state.df_adultes, st.session_state.df_enfants, st.session_state.df_pension_hypotheses, st.session_state.hyp_economiques,
+    st.session_state.parent_isole, st.session_state.df_ventes
+)
+# La projection n'est lancée qu'à la demande ; une fois en cache, la trajectoire s'affiche directement
+projection_disponible = CACHE_PROJECTION.contient(cle_projection(*entrees_trajectoire, moteur_trajectoire))
+if projection_disponible or col_traj2.button("Calculer la trajectoire", use_container_width=True):
+    with st.spinner("Projection des revenus en cours..."):
+        projection_trajectoire, _, _ = projection_en_cache(generer_projection_complete, *entrees_trajectoire, moteur_impot=moteur_trajectoire)
+    maintenant = datetime.now()
+    mois_debut = maintenant.year * 12 + maintenant.month - 1
+    mensualites_mois = _mensualites_par_mois(st.session_state.df_prets, st.session_state.df_ventes, mois_debut, duree_trajectoire * 12)
+    trajectoire = calculer_trajectoire_endettement(projection_trajectoire, mensualites_mois, mois_debut, taux_endettement_max_cible)
+    mois_depassement = trajectoire[trajectoire['Dépassement']]
+
+    col_t1, col_t2, col_t3 = st.columns(3)
+    col_t1.metric("Mois au-delà de la cible", f"{len(mois_depassement)} / {len(trajectoire)}")
+    taux_max_trajectoire = trajectoire["Taux d'Endettement %"].max()
+    mois_taux_max = trajectoire.loc[trajectoire["Taux d'Endettement %"].idxmax(), 'Mois']
+    col_t2.metric("Taux d'endettement maximal", f"{taux_max_trajectoire:.2f} %", help=f"Atteint en {mois_taux_max.strftime('%m/%Y')}.")
+    col_t3.metric("Reste à vivre mensuel minimal", f"{trajectoire['Reste à Vivre Mensuel'].min():,.0f} €")
+    taux_premier_mois = trajectoire["Taux d'Endettement %"].iat[0]
+    st.caption(f"Premier mois de la trajectoire : {taux_premier_mois:.2f} % (taux actuel : {taux_endettement_actuel:.2f} %).")
+
+    fig_trajectoire = px.line(trajectoire, x='Mois', y="Taux d'Endettement %", title="Taux d'endettement mensuel projeté")
+    fig_trajectoire.add_scatter(x=mois_depassement['Mois'], y=mois_depassement["Taux d'Endettement %"], mode='markers', marker=dict(color='red', size=5), name='Au-delà de la cible')
+    fig_trajectoire.add_hline(y=taux_endettement_max_cible, line_dash='dash', line_color='red', annotation_text=f"Cible {taux_endettement_max_cible:.1f}%")
+    st.plotly_chart(fig_trajectoire, use_container_width=True)
+
+    fig_reste_a_vivre = px.area(trajectoire, x='Mois', y='Reste à Vivre Mensuel', title="Reste à vivre mensuel projeté (après charges, impôt et mensualités)")
+    st.plotly_chart(fig_reste_a_vivre, use_container_width=True)
+
+    if not mois_depassement.empty:
+        with st.expander(f"🔍 Détail des {len(mois_depassement)} mois au-delà de la cible"):
+            st.dataframe(
+                mois_depassement.drop(columns='Dépassement').style.format({
+                    'Mois': lambda d: d.strftime('%m/%Y'), 'Revenus Mensuels Pondérés': "{:,.2f} €", 'Mensualités Prêts': "{:,.2f} €",
+                    "Taux d'Endettement %": "{:.2f} %", 'Reste à Vivre Mensuel': "{:,.2f} €",
+                }),
+                use_container_width=True, hide_index=True
+            )
+else:
+    col_traj2.caption("Aucune projection en cache pour ces données.")
+
+st.markdown("---")
+st.subheader("🔁 Remboursement Anticipé et Renégociation")
+st.write("""
+Comparez des remboursements anticipés (partiels ou totaux) et des renégociations de taux sur les prêts saisis.
+Chaque combinaison des valeurs choisies est évaluée : intérêts économisés, variation de la mensualité et impact
+sur le patrimoine net à l'horizon (l'épargne mobilisée et les mensualités économisées étant placées au rendement indiqué).
+""")
+df_prets = st.session_state.df_prets
+if df_prets.empty:
+    st.info("Aucun prêt n'a été saisi.")
+else:
+    df_stocks = st.session_state.df_stocks
+    placements = df_stocks[df_stocks['Type'] == 'Financier']
+    valeurs_placements = pd.to_numeric(placements['Valeur Brute'], errors='coerce').fillna(0)
+    rendement_placements = float(np.average(pd.to_numeric(placements['Rendement %'], errors='coerce').fillna(0), weights=valeurs_placements)) if valeurs_placements.sum() > 0 else 2.0
+
+    col_reneg1, col_reneg2 = st.columns(2)
+    with col_reneg1:
+        prets_etudies = st.multiselect("Prêts étudiés", options=list(df_prets.index), default=list(df_prets.index),
+                                       format_func=lambda i: f"{df_prets.at[i, 'Actif Associé']} ({pd.to_numeric(df_prets.at[i, 'Montant Initial'], errors='coerce'):,.0f} €)")
+        delais_mois = st.multiselect("Dates envisagées", options=[1, 3, 6, 12, 18, 24, 36, 48, 60, 84, 120], default=[1, 12, 36], format_func=lambda m: f"Dans {m} mois")
+        horizon_reneg = st.slider("Horizon d'évaluation (années)", 1, 40, 25)
+        taux_placement = st.number_input("Rendement de l'épargne (%)", value=round(rendement_placements, 2), step=0.1,
+                                         help="Rendement des sommes mobilisées ou libérées ; par défaut, le rendement moyen des actifs financiers saisis.")
+    with col_reneg2:
+        montants_anticipes = st.multiselect("Montants de remboursement anticipé (€)", options=[5000, 10000, 20000, 30000, 50000, 75000, 100000, 150000, 200000, 500000], default=[10000, 30000, 50000])
+        modes_remboursement = st.multiselect("Après un remboursement anticipé", options=list(MODES_REMBOURSEMENT), default=list(MODES_REMBOURSEMENT), format_func=MODES_REMBOURSEMENT.get)
+        taux_renegocies = st.multiselect("Nouveaux taux de renégociation (%)", options=[round(t, 2) for t in np.arange(0.5, 6.01, 0.25)], default=[])
+        frais_renegociation = st.multiselect("Frais de renégociation (€)", options=[0, 500, 1000, 1500, 2000, 3000, 5000], default=[0, 1000])
+
+    debut_mois = pd.Timestamp(datetime.now()).normalize().replace(day=1)
+    options = generer_options(prets_etudies, [debut_mois + pd.DateOffset(months=m) for m in delais_mois], montants_anticipes, modes_remboursement, taux_renegocies, frais_renegociation)
+    resultats_reneg = evaluer_options(df_prets, options, horizon_reneg, taux_placement)
+    if resultats_reneg.empty:
+        st.info("Aucune option évaluable : choisissez au moins un prêt en cours aux dates envisagées, et des montants ou des taux.")
+    else:
+        resultats_reneg['Prêt'] = resultats_reneg['Prêt'].map(lambda i: df_prets.at[i, 'Actif Associé'])
+        critere = st.radio("Classer par", options=['Impact Patrimoine Net Final (€)', 'Intérêts Économisés (€)', 'Variation Mensualité (€)'], horizontal=True)
+        resultats_reneg = resultats_reneg.sort_values(critere, ascending=critere == 'Variation Mensualité (€)', ignore_index=True)
+
+        col_res1, col_res2, col_res3 = st.columns(3)
+        col_res1.metric("Options évaluées", f"{len(resultats_reneg):,}")
+        col_res2.metric("Meilleur impact sur le patrimoine net", f"{resultats_reneg['Impact Patrimoine Net Final (€)'].max():,.0f} €")
+        col_res3.metric("Intérêts économisés (max.)", f"{resultats_reneg['Intérêts Économisés (€)'].max():,.0f} €")
+
+        fig_reneg = px.scatter(
+            resultats_reneg, x='Variation Mensualité (€)', y='Impact Patrimoine Net Final (€)', color='Type', symbol='Mode',
+            hover_data=['Prêt', 'Date', 'Montant Remboursé (€)', 'Nouveau Taux %', 'Frais (€)', 'Intérêts Économisés (€)'],
+            title=f"Options : variation de mensualité et impact sur le patrimoine net à {horizon_reneg} ans"
+        )
+        st.plotly_chart(fig_reneg, use_container_width=True)
+
+        colonnes_affichees = ['Prêt', 'Type', 'Date', 'Mode', 'Montant Remboursé (€)', 'Nouveau Taux %', 'Frais (€)', 'Mensualité Actuelle (€)', 'Nouvelle Mensualité (€)',
+                              'Variation Mensualité (€)', 'Échéances Restantes', 'Nouvelles Échéances Restantes', 'Intérêts Économisés (€)', 'Impact Patrimoine Net Final (€)']
+        st.dataframe(
+            resultats_reneg[colonnes_affichees].head(100).style.format({
+                'Date': lambda d: d.strftime('%m/%Y'), 'Montant Remboursé (€)': "{:,.0f} €", 'Nouveau Taux %': "{:.2f} %", 'Frais (€)': "{:,.0f} €",
+                'Mensualité Actuelle (€)': "{:,.2f} €", 'Nouvelle Mensualité (€)': "{:,.2f} €", 'Variation Mensualité (€)': "{:+,.2f} €",
+                'Intérêts Économisés (€)': "{:,.0f} €", 'Impact Patrimoine Net Final (€)': "{:+,.0f} €",
+            }),
+            use_container_width=True, hide_index=True
+        )
+        if len(resultats_reneg) > 100:
+            st.caption(f"100 meilleures options affichées sur {len(resultats_reneg):,}.")
@@ -1,11 +1,21 @@
 # pages/4_📈_Projection.py
+import json
+from functools import partial
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime # Ajout de l'import datetime
-from utils.calculs_projection import generer_projection_complete
+from utils.cache_impot import CACHE_IMPOT, VARIABLE_CHEMIN_CACHE
+from utils.cache_projection import CACHE_PROJECTION, cle_projection, projection_en_cache
+from utils.calculs import calculer_produits_nets_vente
+from utils.calculs_projection import ProjectionIncrementale
+from utils.openfisca_utils import MOTEURS_IMPOT, OPENFISCA_READY, valider_bareme_contre_openfisca
+from utils.projection_mensuelle import generer_projection_mensuelle
+from utils.projection_monte_carlo import generer_projection_monte_carlo, HYP_MONTE_CARLO_DEFAUT, LOIS_MONTE_CARLO, BASES_EPUISEMENT
 from utils.state_manager import initialize_session
+from utils.trace_performance import TracePerformance
 
 # Initialiser la session au début du script
 initialize_session()
@@ -13,6 +23,10 @@ initialize_session()
 # Configuration de la barre latérale pour cette page
 st.sidebar.title("Paramètres de Projection")
 duree_simulation = st.sidebar.slider("Durée de la simulation (années)", 1, 50, 25)
+resolution_mensuelle = st.sidebar.radio(
+    "Résolution de la projection", options=["Annuelle", "Mensuelle"], horizontal=True,
+    help="Au pas mensuel, les départs en retraite ont lieu le mois anniversaire et les ventes au mois choisi ; les graphiques restent annuels (agrégation) et le détail mensuel est affiché en fin de page."
+) == "Mensuelle"
 
 with st.sidebar.expander("Hypothèses Économiques", expanded=False):
     # Ajout du slider pour le taux d'inflation
@@ -30,6 +44,55 @@ with st.sidebar.expander("Hypothèses Économiques", expanded=False):
     )
     st.session_state.hyp_economiques['revalo_salaire'] = revalo_salaire
 
+with st.sidebar.expander("Calcul de l'Impôt", expanded=False):
+    moteur_impot = st.radio(
+        "Moteur de calcul de l'impôt sur le revenu",
+        options=list(MOTEURS_IMPOT),
+        format_func=lambda m: {"openfisca": "OpenFisca (référence)", "bareme": "Barème intégré (rapide)"}[m],
+        index=0 if OPENFISCA_READY else 1,
+        help="Le barème intégré reproduit le calcul OpenFisca (quotient familial, plafonnement, décote) à l'euro près, sans charger la législation complète."
+    )
+    if OPENFISCA_READY and st.button("Valider le barème contre OpenFisca", use_container_width=True):
+        with st.spinner("Comparaison sur un échantillon de foyers..."):
+            validation = valider_bareme_contre_openfisca()
+        st.write(f"Écart maximal : **{validation['ecart_max']:,.0f} €** (moyen : {validation['ecart_moyen']:,.2f} €)")
+
+with st.sidebar.expander("Simulation Monte Carlo", expanded=False):
+    hyp_defaut = HYP_MONTE_CARLO_DEFAUT
+    n_trajectoires_mc = st.select_slider("Nombre de trajectoires", options=[1000, 2000, 5000, 10000, 20000], value=hyp_defaut['n_trajectoires'])
+    loi_mc = st.radio("Loi des rendements", options=list(LOIS_MONTE_CARLO), format_func=lambda l: {"normale": "Normale", "student": "Student (queues épaisses)"}[l], horizontal=True)
+    vol_financier = st.slider("Volatilité actifs financiers (%)", 0.0, 30.0, hyp_defaut['volatilites']['Financier'], 0.5)
+    vol_immo = st.slider("Volatilité immobilier (%)", 0.0, 15.0, hyp_defaut['volatilites']['Immobilier productif'], 0.5)
+    vol_inflation = st.slider("Volatilité de l'inflation (%)", 0.0, 3.0, hyp_defaut['volatilites']['Inflation'], 0.1)
+    graine_mc = st.number_input("Graine aléatoire", value=hyp_defaut['graine'], step=1, format="%d")
+    hyp_monte_carlo = {
+        'n_trajectoires': n_trajectoires_mc,
+        'loi': loi_mc,
+        'graine': int(graine_mc),
+        'volatilites': {'Financier': vol_financier, 'Immobilier de jouissance': vol_immo, 'Immobilier productif': vol_immo, 'Inflation': vol_inflation},
+    }
+
+with st.sidebar.expander("Administration des caches", expanded=False):
+    stats_projection, stats_impot = CACHE_PROJECTION.statistiques(), CACHE_IMPOT.statistiques()
+    st.markdown("**Projections** (partagé entre sessions)")
+    col_cache1, col_cache2 = st.columns(2)
+    col_cache1.metric("Taux de hit", f"{stats_projection['taux_hit']:.0%}", help=f"{stats_projection['hits']} hits / {stats_projection['misses']} misses")
+    col_cache2.metric("Mémoire", f"{stats_projection['octets'] / 1024:,.0f} Ko", help=f"{stats_projection['entrees']} projections, plafond {stats_projection['taille_max_octets'] / 1024 ** 2:,.0f} Mo")
+    st.markdown("**Impôts**")
+    col_cache3, col_cache4 = st.columns(2)
+    col_cache3.metric("Taux de hit", f"{stats_impot['taux_hit']:.0%}", help=f"{stats_impot['hits']} hits / {stats_impot['misses']} misses")
+    col_cache4.metric("Foyers", f"{stats_impot['entrees']:,}")
+    if stats_projection['persistance']:
+        st.caption(f"Persistance sur disque active : {stats_projection['octets_disque'] / 1024 ** 2:,.1f} Mo sur {stats_projection['taille_max_octets_disque'] / 1024 ** 2:,.0f} Mo.")
+    else:
+        st.caption(f"Persistance sur disque inactive (configurée sur le serveur par la variable d'environnement `{VARIABLE_CHEMIN_CACHE}`).")
+    if st.button("Vider les caches", use_container_width=True):
+        CACHE_PROJECTION.vider()
+        CACHE_IMPOT.vider()
+        st.rerun()
+    mesurer_performances = st.checkbox("Mesurer les performances du calcul", value=False,
+                                       help="Chronomètre chaque étape de la projection (par année pour la boucle séquentielle).")
+
 st.title("📈 Projection de l'Évolution des Flux et du Patrimoine")
 
 #st.header("Paramètres Spécifiques à la Projection")
@@ -155,6 +218,7 @@ else:
         expander_title = f"Vente de '{row.get('Bien à Vendre')}'" if row.get('Bien à Vendre') else f"Nouvel Événement de Vente #{i+1}"
         with st.expander(expander_title, expanded=not row.get('Bien à Vendre')):
             col1, col2, col3 = st.columns([3, 2, 1])
+            mois_vente = int(row['Mois de Vente']) if pd.notna(row.get('Mois de Vente')) else 1
             with col1:
                 try:
                     bien_index = liste_biens_immobiliers.index(row.get('Bien à Vendre')) if row.get('Bien à Vendre') in liste_biens_immobiliers else 0
@@ -163,12 +227,18 @@ else:
                 bien_a_vendre = st.selectbox("Bien à Vendre", options=liste_biens_immobiliers, index=bien_index, key=f"vente_bien_{i}")
             with col2:
                 annee_vente = st.number_input("Année de Vente", value=int(row.get('Année de Vente', datetime.now().year)), min_value=datetime.now().year, step=1, key=f"vente_annee_{i}", format="%d")
+                if resolution_mensuelle:
+                    mois_vente = st.selectbox("Mois de Vente", options=list(range(1, 13)), index=mois_vente - 1, key=f"vente_mois_{i}")
             with col3:
                 st.write("")
                 if st.button("🗑️ Supprimer", key=f"delete_vente_{i}", use_container_width=True):
                     indices_to_delete_ventes.append(i)
             
-            updated_ventes_data.append({'Bien à Vendre': bien_a_vendre, 'Année de Vente': annee_vente})
+            vente = {'Bien à Vendre': bien_a_vendre, 'Année de Vente': annee_vente}
+            # Le mois n'est conservé qu'une fois saisi : la projection annuelle n'en dépend pas
+            if resolution_mensuelle or 'Mois de Vente' in df_ventes_copy.columns:
+                vente['Mois de Vente'] = mois_vente
+            updated_ventes_data.append(vente)
 
     if indices_to_delete_ventes:
         st.session_state.df_ventes = st.session_state.df_ventes.drop(indices_to_delete_ventes).reset_index(drop=True)
@@ -185,8 +255,35 @@ else:
         st.session_state.df_ventes = pd.concat([st.session_state.df_ventes, new_row], ignore_index=True)
         st.rerun()
 
+if liste_biens_immobiliers:
+    with st.expander("🕰️ Meilleure année de vente", expanded=False):
+        st.write("Produit net d'une vente au 31 décembre de chaque année (prix - impôt sur la plus-value - capital restant dû des prêts associés), selon le taux annuel de valorisation du bien.")
+        annees_vente_candidates = np.arange(datetime.now().year, datetime.now().year + duree_simulation + 1)
+        taux_valorisation_candidats = np.round(np.arange(-2.0, 6.01, 0.5), 1)
+        # Tous les biens, années et taux en un seul appel
+        produits_vente = calculer_produits_nets_vente(df_immobilier, st.session_state.df_prets, annees_vente_candidates, taux_valorisation_candidats)
+        bien_etudie = st.selectbox("Bien étudié", options=liste_biens_immobiliers, key="bien_meilleure_vente")
+        produit_net_bien = produits_vente['produit_net'][liste_biens_immobiliers.index(bien_etudie)]
+        fig_meilleure_vente = px.imshow(
+            produit_net_bien, x=[f"{t:+.1f} %" for t in taux_valorisation_candidats], y=annees_vente_candidates,
+            aspect='auto', color_continuous_scale='Viridis', origin='lower',
+            labels=dict(x="Valorisation annuelle", y="Année de vente", color="Produit net (€)"),
+            title=f"Produit net de la vente de '{bien_etudie}'"
+        )
+        fig_meilleure_vente.update_traces(hovertemplate="Vente en %{y}, valorisation %{x} : %{z:,.0f} €<extra></extra>")
+        st.plotly_chart(fig_meilleure_vente, use_container_width=True)
+        meilleures_annees = annees_vente_candidates[produit_net_bien.argmax(axis=0)]
+        st.caption("Meilleure année de vente par taux de valorisation : " + ", ".join(f"{t:+.1f} % → {a}" for t, a in zip(taux_valorisation_candidats, meilleures_annees)))
+
 st.divider()
 lancer_projection = st.sidebar.button("🚀 Lancer la Projection Complète", type="primary", use_container_width=True)
+if not lancer_projection and not resolution_mensuelle and st.session_state.get('tableau_financier') is None:
+    # Projection déjà calculée pour ces entrées (fichier de démonstration, sauvegarde rechargée) : restitution immédiate
+    lancer_projection = CACHE_PROJECTION.contient(cle_projection(
+        duree_simulation, st.session_state.df_stocks, st.session_state.df_revenus, st.session_state.df_depenses,
+        st.session_state.df_prets, st.session_state.df_adultes, st.session_state.df_enfants, st.session_state.df_pension_hypotheses,
+        st.session_state.hyp_economiques, st.session_state.parent_isole, st.session_state.df_ventes, moteur_impot
+    ))
 if lancer_projection:
     with st.spinner("Calcul de la projection en cours..."):
         # --- Consolidate Revenues for Projection ---
@@ -215,21 +312,119 @@ if lancer_projection:
 
         # S'assurer que les hypothèses d'inflation et de revalorisation des salaires sont à 0
         # pour cette projection, suite à la suppression des sliders.
-        tableau_financier, logs = generer_projection_complete(
-            duree_simulation,
-            st.session_state.df_stocks,
-            df_revenus_for_projection, # Pass the consolidated revenues
-            st.session_state.df_depenses,
-            st.session_state.df_prets,
-            st.session_state.df_adultes,
-            st.session_state.df_enfants,
-            st.session_state.df_pension_hypotheses,
-            st.session_state.hyp_economiques, # Utilisation des hypothèses du session_state
-            st.session_state.parent_isole,
-            st.session_state.df_ventes
-        )
+        # Moteur incrémental propre à la session : seules les années affectées par les modifications sont recalculées
+        if 'projection_incrementale' not in st.session_state:
+            st.session_state.projection_incrementale = ProjectionIncrementale()
+        projection_incrementale = st.session_state.projection_incrementale
+        # Cache partagé entre sessions : un foyer identique déjà projeté est restitué sans calcul
+        trace = TracePerformance() if mesurer_performances else None
+        if resolution_mensuelle:
+            projection_mensuelle, tableau_financier, logs = generer_projection_mensuelle(
+                duree_simulation, st.session_state.df_stocks, df_revenus_for_projection, st.session_state.df_depenses, st.session_state.df_prets,
+                st.session_state.df_adultes, st.session_state.df_enfants, st.session_state.df_pension_hypotheses, st.session_state.hyp_economiques,
+                st.session_state.parent_isole, st.session_state.df_ventes, moteur_impot=moteur_impot, trace=trace
+            )
+        else:
+            tableau_financier, logs, depuis_cache = projection_en_cache(
+                partial(projection_incrementale.calculer, trace=trace),
+                duree_simulation,
+                st.session_state.df_stocks,
+                df_revenus_for_projection, # Pass the consolidated revenues
+                st.session_state.df_depenses,
+                st.session_state.df_prets,
+                st.session_state.df_adultes,
+                st.session_state.df_enfants,
+                st.session_state.df_pension_hypotheses,
+                st.session_state.hyp_economiques, # Utilisation des hypothèses du session_state
+                st.session_state.parent_isole,
+                st.session_state.df_ventes,
+                moteur_impot=moteur_impot
+            )
+            projection_mensuelle = None
+            if depuis_cache:
+                st.sidebar.caption("Projection restituée depuis le cache.")
+            elif projection_incrementale.annee_reprise is None:
+                st.sidebar.caption("Projection inchangée : aucun recalcul nécessaire.")
+            elif projection_incrementale.annees_recalculees < duree_simulation:
+                st.sidebar.caption(f"Projection recalculée à partir de {projection_incrementale.annee_reprise} ({projection_incrementale.annees_recalculees} années).")
+        # En résolution mensuelle, le tableau annuel est l'agrégation de la projection mensuelle
         st.session_state.tableau_financier = tableau_financier
+        st.session_state.projection_mensuelle = projection_mensuelle
         st.session_state.logs_evenements = logs
+        st.session_state.trace_projection = trace
+
+trace_projection = st.session_state.get('trace_projection')
+if trace_projection is not None:
+    with st.expander("Performance", expanded=False):
+        if not trace_projection.evenements:
+            st.info("Projection restituée depuis le cache : aucune étape mesurée. Videz les caches pour mesurer un calcul complet.")
+        else:
+            details_impot = trace_projection.details('calculer_impots')
+            col_perf1, col_perf2, col_perf3 = st.columns(3)
+            col_perf1.metric("Durée totale", f"{sum(e['duree'] for e in trace_projection.evenements if e['etape'] in ('generer_projection_complete', 'generer_projection_mensuelle')) * 1000:,.1f} ms")
+            col_perf2.metric("Hits cache impôt", f"{sum(d.get('cache_hits', 0) for d in details_impot):,}")
+            col_perf3.metric("Misses cache impôt", f"{sum(d.get('cache_misses', 0) for d in details_impot):,}")
+            st.dataframe(trace_projection.synthese().style.format({'Durée Totale (ms)': "{:,.2f}", 'Durée Moyenne (ms)': "{:,.3f}"}),
+                         use_container_width=True, hide_index=True)
+            par_annee = trace_projection.par_annee()
+            if not par_annee.empty:
+                fig_perf = px.bar(par_annee, x=par_annee.index, y=list(par_annee.columns), title="Durée des étapes de la boucle séquentielle (ms)")
+                fig_perf.update_layout(xaxis_title="Année", yaxis_title="Durée (ms)", legend_title="Étape")
+                st.plotly_chart(fig_perf, use_container_width=True)
+            st.download_button("📥 Exporter la trace (Chrome Trace JSON)", json.dumps(trace_projection.vers_chrome_trace()).encode('utf-8'),
+                               file_name="trace_projection.json", mime="application/json",
+                               help="À ouvrir dans chrome://tracing ou https://ui.perfetto.dev")
+
+lancer_monte_carlo = st.sidebar.button("🎲 Lancer la Simulation Monte Carlo", use_container_width=True)
+if lancer_monte_carlo:
+    with st.spinner(f"Simulation de {hyp_monte_carlo['n_trajectoires']:,} trajectoires en cours..."):
+        try:
+            st.session_state.resultats_monte_carlo = generer_projection_monte_carlo(
+                duree_simulation,
+                st.session_state.df_stocks,
+                st.session_state.df_revenus,
+                st.session_state.df_depenses,
+                st.session_state.df_prets,
+                st.session_state.df_adultes,
+                st.session_state.df_enfants,
+                st.session_state.df_pension_hypotheses,
+                st.session_state.hyp_economiques,
+                st.session_state.parent_isole,
+                st.session_state.df_ventes,
+                hyp_monte_carlo=hyp_monte_carlo,
+                moteur_impot=moteur_impot
+            )
+        except ValueError as e:
+            st.error(f"Simulation Monte Carlo impossible : {e}")
+
+if st.session_state.get('resultats_monte_carlo') and st.session_state.resultats_monte_carlo['bandes']:
+    resultats_mc = st.session_state.resultats_monte_carlo
+    st.subheader("Simulation Monte Carlo")
+    col_mc1, col_mc2 = st.columns(2)
+    col_mc1.metric("Trajectoires simulées", f"{resultats_mc['n_trajectoires']:,}")
+    col_mc2.metric("Probabilité d'épuisement de l'épargne", f"{resultats_mc['proba_epuisement']:.1%}",
+                   help=f"Part des trajectoires où {BASES_EPUISEMENT[resultats_mc.get('base_epuisement', 'financier')]} devient négative au moins une année.")
+
+    for indicateur, couleur in (("Patrimoine Net", "65, 105, 225"), ("Reste à Vivre", "60, 179, 113")):
+        df_bandes = resultats_mc['bandes'][indicateur]
+        cols_percentiles = [col for col in df_bandes.columns if col != 'Année']
+        fig_fan = go.Figure()
+        # Bandes symétriques, de la plus large à la plus étroite, autour de la médiane
+        for k in range(len(cols_percentiles) // 2):
+            bas, haut = cols_percentiles[k], cols_percentiles[-(k + 1)]
+            fig_fan.add_trace(go.Scatter(x=df_bandes['Année'], y=df_bandes[haut], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+            fig_fan.add_trace(go.Scatter(x=df_bandes['Année'], y=df_bandes[bas], mode='lines', line=dict(width=0), fill='tonexty',
+                                         fillcolor=f"rgba({couleur}, {0.15 * (k + 1)})", name=f"{bas} – {haut}"))
+        col_mediane = cols_percentiles[len(cols_percentiles) // 2]
+        fig_fan.add_trace(go.Scatter(x=df_bandes['Année'], y=df_bandes[col_mediane], mode='lines', line=dict(color=f"rgb({couleur})", width=3), name=f"Médiane ({col_mediane})"))
+        fig_fan.update_layout(title=f"Distribution du {indicateur}", xaxis_title="Année", yaxis_title="Montant (€)")
+        st.plotly_chart(fig_fan, use_container_width=True)
+
+    if resultats_mc['proba_epuisement'] > 0:
+        df_epuisement = pd.DataFrame({'Année': resultats_mc['bandes']['Patrimoine Net']['Année'], "Probabilité d'épuisement": resultats_mc['proba_epuisement_par_annee']})
+        fig_epuisement = px.line(df_epuisement, x='Année', y="Probabilité d'épuisement", title="Probabilité cumulée d'épuisement de l'épargne", markers=True)
+        fig_epuisement.update_yaxes(tickformat=".0%")
+        st.plotly_chart(fig_epuisement, use_container_width=True)
 
 if 'tableau_financier' in st.session_state and st.session_state.tableau_financier is not None:
     dfp = st.session_state.tableau_financier
@@ -432,3 +627,19 @@ if 'tableau_financier' in st.session_state and st.session_state.tableau_financie
     patrimoine_columns = ["Année", "Patrimoine Net", "Actifs Totaux", "Passifs Totaux", "Patrimoine Financier", "Immobilier Jouissance", "Immobilier Productif"]
     df_patrimoine_table = dfp[patrimoine_columns]
     st.dataframe(df_patrimoine_table.style.format(precision=0, na_rep='-'), use_container_width=True, hide_index=True)
+
+    projection_mensuelle = st.session_state.get('projection_mensuelle')
+    if projection_mensuelle is not None and not projection_mensuelle.empty:
+        st.subheader("Détail Mensuel")
+        fig_mensuel = px.line(projection_mensuelle, x='Mois', y=["Patrimoine Net", "Patrimoine Financier", "Passifs Totaux"],
+                              title="Évolution Mensuelle du Patrimoine", labels={"value": "Montant (€)", "variable": "Indicateur"})
+        st.plotly_chart(fig_mensuel, use_container_width=True)
+        fig_flux_mensuels = px.bar(projection_mensuelle, x='Mois', y=["Reste à Vivre", "Charges (hors prêts)", "Mensualités Prêts", "Impôt sur le Revenu"],
+                                   title="Répartition Mensuelle du Revenu", labels={"value": "Montant Mensuel (€)", "variable": "Poste"})
+        st.plotly_chart(fig_flux_mensuels, use_container_width=True)
+        colonnes_mensuelles = ["Mois"] + [col for col in flux_columns_base + patrimoine_columns[1:] if col in projection_mensuelle.columns]
+        st.caption("Les colonnes de flux donnent le montant du mois.")
+        st.dataframe(projection_mensuelle[colonnes_mensuelles].style.format(precision=0, na_rep='-').format({'Mois': lambda m: m.strftime('%m/%Y')}),
+                     use_container_width=True, hide_index=True)
+        st.download_button("📥 Exporter la projection mensuelle (CSV)", projection_mensuelle.to_csv(index=False).encode('utf-8'),
+                           file_name="projection_mensuelle.csv", mime="text/csv")
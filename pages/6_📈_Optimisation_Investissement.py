@@ -1,7 +1,8 @@
 # pages/7_🚀_Optimisation_Investissement.py
 import streamlit as st
-from utils.optim_patrimoine.ui_components import setup_sidebar, display_results
-from utils.optim_patrimoine.optimization import setup_and_run_optimization
+import numpy as np
+from utils.optim_patrimoine.ui_components import setup_sidebar, display_results, display_global_search, display_frontier
+from utils.optim_patrimoine.optimization import setup_and_run_optimization, run_global_optimization, run_frontier_sweep, PARAMETRES_FRONTIERE
 from utils.state_manager import initialize_session
 
 st.set_page_config(layout="wide", page_title="Optimisation d'Investissement")
@@ -21,10 +22,23 @@ st.session_state.optim_params = params # Sauvegarder les paramètres pour un acc
 if st.button("Lancer l'Optimisation", type="primary", use_container_width=True):
     if not params['df_options_financiers_edited'][params['df_options_financiers_edited']['Actif']].empty or params['include_immo']:
         with st.spinner("Recherche de la stratégie optimale en cours..."):
-            opt_result, simulation_args = setup_and_run_optimization(params)
+            st.session_state.global_search = None
+            if params['optimization_mode'] == 'locale':
+                opt_result, simulation_args = setup_and_run_optimization(params)
+            else:
+                try:
+                    global_search = run_global_optimization(params, mode=params['optimization_mode'], n_starts=params['n_starts'], sampler=params['sampler'],
+                                                            time_budget=params['time_budget'], workers=params['workers'])
+                except ValueError as e:
+                    st.error(str(e))
+                    global_search = None
+                opt_result, simulation_args = (global_search['best'], global_search['args']) if global_search and global_search['best'] is not None else (None, None)
+                st.session_state.global_search = global_search
             if opt_result is not None and simulation_args is not None:
                 st.session_state.opt_result = opt_result
                 st.session_state.simulation_args = simulation_args
+                if st.session_state.global_search:
+                    display_global_search(st.session_state.global_search)
                 display_results(opt_result, simulation_args)
             elif opt_result is None and simulation_args is None and not params['fix_immo_price']: # Cas où aucun actif n'est sélectionné
                  st.warning("Veuillez sélectionner au moins un actif financier ou inclure un projet immobilier pour lancer l'optimisation.")
@@ -33,6 +47,37 @@ if st.button("Lancer l'Optimisation", type="primary", use_container_width=True):
     else:
         st.warning("Veuillez sélectionner au moins un actif financier ou inclure un projet immobilier pour lancer l'optimisation.")
 
-elif 'opt_result' in st.session_state and 'simulation_args' in st.session_state:
+elif st.session_state.get('opt_result') is not None and st.session_state.get('simulation_args') is not None:
     st.info("Affichage des derniers résultats d'optimisation. Modifiez les paramètres et relancez pour une nouvelle analyse.")
+    if st.session_state.get('global_search'):
+        display_global_search(st.session_state.global_search)
     display_results(st.session_state.opt_result, st.session_state.simulation_args)
+
+st.divider()
+st.subheader("📈 Frontière d'Optimisation")
+st.write("Résolvez l'optimisation pour toute une plage de valeurs d'un paramètre afin de visualiser son effet sur le patrimoine final et l'allocation optimale.")
+col_param, col_min, col_max, col_points = st.columns([2, 1, 1, 1])
+with col_param:
+    frontier_parameter = st.selectbox("Paramètre balayé", options=list(PARAMETRES_FRONTIERE), format_func=lambda p: PARAMETRES_FRONTIERE[p][0])
+default_min, default_max = PARAMETRES_FRONTIERE[frontier_parameter][1]
+with col_min:
+    frontier_min = st.number_input("Valeur minimale", value=float(default_min), key=f"frontier_min_{frontier_parameter}")
+with col_max:
+    frontier_max = st.number_input("Valeur maximale", value=float(default_max), key=f"frontier_max_{frontier_parameter}")
+with col_points:
+    frontier_points = st.slider("Nombre de points", 50, 200, 50, 10)
+
+if st.button("Calculer la Frontière", use_container_width=True):
+    if frontier_max <= frontier_min:
+        st.error("La valeur maximale doit être supérieure à la valeur minimale.")
+    elif params['df_options_financiers_edited'][params['df_options_financiers_edited']['Actif']].empty and not params['include_immo'] and frontier_parameter != 'fixed_immo_price':
+        st.warning("Veuillez sélectionner au moins un actif financier ou inclure un projet immobilier pour calculer la frontière.")
+    else:
+        with st.spinner(f"Résolution de {frontier_points} optimisations en cours..."):
+            st.session_state.frontier = {
+                'label': PARAMETRES_FRONTIERE[frontier_parameter][0],
+                'df': run_frontier_sweep(params, frontier_parameter, np.linspace(frontier_min, frontier_max, frontier_points), workers=params.get('workers')),
+            }
+
+if st.session_state.get('frontier'):
+    display_frontier(st.session_state.frontier['df'], st.session_state.frontier['label'])
@@ -1,11 +1,13 @@
 # pages/8_💾_Sauvegarde_&_Chargement.py
 import streamlit as st
-import os
 from utils.state_manager import (
-    save_state_to_file, 
     load_state_from_file, 
     reset_state, 
-    initialize_session
+    initialize_session,
+    extraire_etat_session,
+    sauvegarde_paresseuse,
+    caracteristiques_fichier_sauvegarde,
+    FORMATS_SAUVEGARDE
 )
 
 # Configuration de la page
@@ -17,28 +19,34 @@ initialize_session()
 
 # --- Section Sauvegarde ---
 st.header("Sauvegarder l'état de la session")
-save_path = "session_state.json" # Fichier temporaire sur le serveur
-
-if st.button("Préparer le fichier de sauvegarde"):
-    save_state_to_file(save_path)
-
-# Le bouton de téléchargement apparaît si le fichier de sauvegarde a été créé
-if os.path.exists(save_path):
-    with open(save_path, "rb") as fp:
-        st.download_button(
-            label="Télécharger le fichier de sauvegarde",
-            data=fp,
-            file_name="audit_patrimonial_sauvegarde.json",
-            mime="application/json"
-        )
-    # On peut optionnellement supprimer le fichier temporaire après préparation
-    # os.remove(save_path)
+col_format, col_compression = st.columns([3, 1])
+with col_format:
+    format_sauvegarde = st.radio(
+        "Format du fichier",
+        options=list(FORMATS_SAUVEGARDE),
+        format_func=lambda f: {"json": "JSON (lisible)", "binaire": "Binaire compressé (rapide, conserve les types)"}[f],
+        horizontal=True
+    )
+with col_compression:
+    compresser = st.checkbox("Compresser (gzip)", value=False, disabled=format_sauvegarde != "json",
+                             help="Le format binaire est toujours compressé.")
+extension, mime = caracteristiques_fichier_sauvegarde(format_sauvegarde, compresser)
+
+# Le fichier est produit en mémoire, propre à la session, uniquement au clic sur le bouton ;
+# il est réutilisé tant que l'état n'a pas changé.
+st.download_button(
+    label="Télécharger le fichier de sauvegarde",
+    data=sauvegarde_paresseuse(extraire_etat_session(), format_sauvegarde, compresser, st.session_state.setdefault('memo_sauvegarde', {})),
+    file_name=f"audit_patrimonial_sauvegarde{extension}",
+    mime=mime,
+    on_click="ignore"
+)
 
 # --- Section Chargement ---
 st.header("Charger l'état de la session depuis un fichier")
 uploaded_file = st.file_uploader(
-    "Choisissez un fichier de sauvegarde (.json)", 
-    type="json"
+    "Choisissez un fichier de sauvegarde (.json, .json.gz ou .zip)", 
+    type=["json", "gz", "zip"]
 )
 
 if uploaded_file is not None:
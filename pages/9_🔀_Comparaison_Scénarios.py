@@ -0,0 +1,110 @@
+# pages/9_🔀_Comparaison_Scénarios.py
+import os
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from utils.openfisca_utils import MOTEURS_IMPOT
+from utils.scenarios import executer_grille_scenarios, synthese_scenarios, generer_grille_scenarios, libelle_variante, annees_vente_possibles
+from utils.state_manager import initialize_session
+
+st.set_page_config(layout="wide", page_title="Comparaison de Scénarios")
+st.title("🔀 Comparaison de Scénarios")
+st.write("""
+Comparez plusieurs variantes du foyer (âge de départ à la retraite, année de vente d'un bien, inflation, rendements)
+sans modifier la saisie : chaque combinaison des valeurs choisies est projetée, puis les trajectoires sont comparées.
+""")
+
+# Initialiser la session au début du script
+initialize_session()
+
+st.sidebar.title("Paramètres de la Comparaison")
+duree_simulation = st.sidebar.slider("Durée de la simulation (années)", 1, 50, 25)
+moteur_impot = st.sidebar.radio(
+    "Moteur de calcul de l'impôt sur le revenu",
+    options=list(MOTEURS_IMPOT),
+    format_func=lambda m: {"openfisca": "OpenFisca (référence)", "bareme": "Barème intégré (rapide)"}[m],
+    index=1
+)
+workers = st.sidebar.number_input("Processus parallèles", min_value=1, max_value=max(1, os.cpu_count() or 1), value=max(1, os.cpu_count() or 1), step=1)
+
+if st.session_state.df_adultes.empty:
+    st.info("Veuillez d'abord renseigner le foyer (onglets 'Famille & Événements', 'Patrimoine' et 'Flux').")
+    st.stop()
+
+variantes = []
+st.subheader("Variantes à comparer")
+col_var1, col_var2 = st.columns(2)
+with col_var1:
+    st.markdown("##### Âge de départ à la retraite")
+    for prenom in st.session_state.df_adultes['Prénom'].dropna():
+        ages = st.multiselect(f"Âges testés pour {prenom}", options=list(range(55, 71)), key=f"scenario_retraite_{prenom}")
+        if ages:
+            variantes.append({'type': 'retraite', 'cible': prenom, 'valeurs': sorted(ages)})
+
+    st.markdown("##### Hypothèses économiques")
+    taux_proposes = [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0]
+    for type_variante in ('inflation', 'revalo_salaire'):
+        taux = st.multiselect(f"{libelle_variante({'type': type_variante})} (%)", options=taux_proposes, key=f"scenario_{type_variante}")
+        if taux:
+            variantes.append({'type': type_variante, 'valeurs': sorted(taux)})
+
+with col_var2:
+    st.markdown("##### Vente d'un bien immobilier")
+    df_stocks = st.session_state.df_stocks
+    biens_immobiliers = df_stocks.loc[df_stocks['Type'].isin(['Immobilier de jouissance', 'Immobilier productif']), 'Actif'].dropna().tolist()
+    for bien in biens_immobiliers:
+        annees = st.multiselect(f"Années de vente testées pour « {bien} »", options=["Pas de vente"] + annees_vente_possibles(duree_simulation), key=f"scenario_vente_{bien}")
+        if annees:
+            variantes.append({'type': 'vente', 'cible': bien, 'valeurs': [None if a == "Pas de vente" else a for a in annees]})
+
+    st.markdown("##### Rendement des actifs financiers")
+    for actif in df_stocks.loc[df_stocks['Type'] == 'Financier', 'Actif'].dropna():
+        rendements = st.multiselect(f"Rendements testés pour « {actif} » (%)", options=[0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0], key=f"scenario_rendement_{actif}")
+        if rendements:
+            variantes.append({'type': 'rendement', 'cible': actif, 'valeurs': sorted(rendements)})
+
+n_scenarios = len(generer_grille_scenarios(variantes)) if variantes else 0
+st.caption(f"{n_scenarios} scénario(s) à projeter sur {duree_simulation} ans.")
+
+if st.button("🚀 Lancer la Comparaison", type="primary", use_container_width=True, disabled=n_scenarios == 0):
+    entrees_base = {
+        'stocks_df': st.session_state.df_stocks,
+        'revenus_df': st.session_state.df_revenus,
+        'depenses_df': st.session_state.df_depenses,
+        'prets_df': st.session_state.df_prets,
+        'adultes_df': st.session_state.df_adultes,
+        'enfants_df': st.session_state.df_enfants,
+        'df_pension_hypotheses': st.session_state.df_pension_hypotheses,
+        'hyp_economiques': st.session_state.hyp_economiques,
+        'est_parent_isole': st.session_state.parent_isole,
+        'ventes_df': st.session_state.df_ventes,
+    }
+    with st.spinner(f"Projection de {n_scenarios} scénarios en cours..."):
+        try:
+            df_scenarios = executer_grille_scenarios(duree_simulation, entrees_base, variantes, moteur_impot=moteur_impot, workers=int(workers))
+            st.session_state.comparaison_scenarios = {'resultats': df_scenarios, 'variantes': variantes}
+        except ValueError as e:
+            st.error(f"Comparaison impossible : {e}")
+
+comparaison = st.session_state.get('comparaison_scenarios')
+if comparaison is not None and not comparaison['resultats'].empty:
+    df_scenarios, variantes_calculees = comparaison['resultats'], comparaison['variantes']
+    colonnes_variantes = [libelle_variante(v) for v in variantes_calculees]
+    valeurs_scenarios = df_scenarios.groupby('Scénario')[colonnes_variantes].first()
+    libelles = {id_scenario: " | ".join(f"{col} : {'—' if pd.isna(val) else val}" for col, val in ligne.items()) for id_scenario, ligne in valeurs_scenarios.iterrows()}
+    df_scenarios = df_scenarios.assign(Libellé=df_scenarios['Scénario'].map(libelles))
+
+    st.divider()
+    st.subheader("Synthèse par Scénario")
+    synthese = synthese_scenarios(df_scenarios, variantes_calculees)
+    st.dataframe(synthese.style.format({'Patrimoine Net Final': "{:,.0f} €", 'Reste à Vivre Minimal': "{:,.0f} €", 'Reste à Vivre Cumulé': "{:,.0f} €"}),
+                 use_container_width=True, hide_index=True)
+
+    for indicateur in ("Patrimoine Net", "Reste à Vivre"):
+        fig = px.line(df_scenarios, x='Année', y=indicateur, color='Libellé', line_group='Scénario',
+                      title=f"Évolution du {indicateur} par Scénario", labels={'Libellé': 'Scénario'})
+        fig.update_layout(yaxis_title="Montant (€)", legend=dict(orientation="h", yanchor="top", y=-0.2))
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.download_button("📥 Télécharger les résultats (CSV)", df_scenarios.drop(columns='Libellé').to_csv(index=False).encode('utf-8'),
+                       file_name="comparaison_scenarios.csv", mime="text/csv")
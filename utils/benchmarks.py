@@ -0,0 +1,166 @@
+# utils/benchmarks.py
+"""
+Banc de performance des moteurs de calcul, exécutable hors ligne :
+
+    python -m utils.benchmarks                          # mesure et compare à la référence
+    python -m utils.benchmarks --enregistrer            # (ré)écrit la référence
+    python -m utils.benchmarks --filtre projection --seuil 0.5
+
+Chaque cas est mesuré sur des foyers synthétiques (durée médiane, minimale, appels par seconde et pic
+mémoire Python). Le programme se termine en erreur si un cas régresse au-delà du seuil par rapport à la
+référence JSON.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from .cache_impot import CACHE_IMPOT
+from .calculs import generer_tableau_amortissement, generer_echeanciers_prets
+from .calculs_projection import generer_projection_complete
+from .projection_mensuelle import generer_projection_mensuelle
+from .foyers_synthetiques import generer_foyer, entrees_projection, generer_parametres_optimisation
+from .openfisca_utils import OPENFISCA_READY
+from .optim_patrimoine.optimization import build_problem, setup_and_run_optimization
+from .optim_patrimoine.simulation import run_unified_simulation
+from .state_manager import CustomEncoder, lire_etat_json, ecrire_etat_binaire, lire_etat_binaire
+
+# Tailles de foyers projetés : (nombre d'actifs, nombre de prêts, horizon en années)
+TAILLES_PROJECTION = ((1, 0, 5), (10, 3, 25), (50, 10, 30), (200, 50, 50))
+TAILLES_PROJECTION_OPENFISCA = ((10, 3, 25), (200, 50, 50))
+
+def _cas_projection(n_actifs, n_prets, duree, moteur_impot):
+    entrees = entrees_projection(generer_foyer(n_actifs=n_actifs, n_prets=n_prets, n_adultes=2, n_enfants=2, graine=n_actifs))
+    return lambda: generer_projection_complete(duree, *entrees, moteur_impot=moteur_impot)
+
+def _cas_projection_mensuelle(n_actifs, n_prets, duree):
+    entrees = entrees_projection(generer_foyer(n_actifs=n_actifs, n_prets=n_prets, n_adultes=2, n_enfants=2, graine=n_actifs))
+    return lambda: generer_projection_mensuelle(duree, *entrees, moteur_impot='bareme')
+
+def _cas_sauvegarde_chargement():
+    etat = generer_foyer(n_actifs=200, n_prets=50, graine=0)
+    return lambda: lire_etat_json(json.dumps(etat, cls=CustomEncoder, indent=4))
+
+def _cas_sauvegarde_chargement_binaire():
+    etat = generer_foyer(n_actifs=200, n_prets=50, graine=0)
+    return lambda: lire_etat_binaire(ecrire_etat_binaire(etat))
+
+def _cas_simulation_unifiee():
+    probleme = build_problem(generer_parametres_optimisation(include_immo=True, horizon=25))
+    return lambda: run_unified_simulation(probleme['initial_guess'], *probleme['args'])
+
+def definir_cas(avec_openfisca=True):
+    """
+    Retourne les cas de mesure : {nom: (préparation, avant_chaque_appel)}. La préparation construit les
+    entrées (non chronométrée) et renvoie la fonction à mesurer ; `avant_chaque_appel` remet à zéro un
+    état partagé (cache d'impôt) pour mesurer des appels à froid.
+    """
+    cas = {
+        'amortissement_pret': (lambda: (lambda: generer_tableau_amortissement(250000, 3.5, 25, '2020-01-15', 0.3)), None),
+        'echeanciers_50_prets': (lambda: (lambda df=generer_foyer(n_actifs=50, n_prets=50)['df_prets']: generer_echeanciers_prets(df)), None),
+    }
+    for n_actifs, n_prets, duree in TAILLES_PROJECTION:
+        cas[f"projection_{n_actifs}a_{n_prets}p_{duree}ans_bareme"] = (lambda a=n_actifs, p=n_prets, d=duree: _cas_projection(a, p, d, 'bareme'), None)
+    if avec_openfisca and OPENFISCA_READY:
+        for n_actifs, n_prets, duree in TAILLES_PROJECTION_OPENFISCA:
+            cas[f"projection_{n_actifs}a_{n_prets}p_{duree}ans_openfisca"] = (lambda a=n_actifs, p=n_prets, d=duree: _cas_projection(a, p, d, 'openfisca'), CACHE_IMPOT.vider)
+    # Même foyer que le plus grand cas annuel, au pas mensuel (600 mois)
+    cas['projection_mensuelle_200a_50p_50ans_bareme'] = (lambda: _cas_projection_mensuelle(200, 50, 50), None)
+    cas['simulation_unifiee_25ans'] = (_cas_simulation_unifiee, None)
+    cas['optimisation_locale'] = (lambda: (lambda params=generer_parametres_optimisation(include_immo=True): setup_and_run_optimization(params)), None)
+    cas['sauvegarde_chargement_200a'] = (_cas_sauvegarde_chargement, None)
+    cas['sauvegarde_chargement_binaire_200a'] = (_cas_sauvegarde_chargement_binaire, None)
+    return cas
+
+def mesurer(appel, repetitions=5, avant_chaque_appel=None):
+    """Mesure un appel : un appel d'échauffement, `repetitions` appels chronométrés, puis un appel sous tracemalloc."""
+    def executer():
+        if avant_chaque_appel is not None:
+            avant_chaque_appel()
+        debut = time.perf_counter()
+        appel()
+        return time.perf_counter() - debut
+
+    executer()
+    durees = [executer() for _ in range(max(1, repetitions))]
+    tracemalloc.start()
+    try:
+        executer()
+        _, pic_memoire = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    mediane = statistics.median(durees)
+    return {
+        'mediane_s': mediane,
+        'min_s': min(durees),
+        'appels_par_s': 1.0 / mediane if mediane > 0 else float('inf'),
+        'pic_memoire_octets': pic_memoire,
+        'repetitions': len(durees),
+    }
+
+def executer_benchmarks(filtre=None, repetitions=5, avec_openfisca=True, afficher=print):
+    """Exécute les cas dont le nom contient `filtre` et retourne {nom: mesures}."""
+    resultats = {}
+    for nom, (preparer, avant_chaque_appel) in definir_cas(avec_openfisca).items():
+        if filtre and filtre not in nom:
+            continue
+        resultats[nom] = mesurer(preparer(), repetitions, avant_chaque_appel)
+        mesure = resultats[nom]
+        afficher(f"{nom:<45} {mesure['mediane_s'] * 1000:>10.2f} ms {mesure['appels_par_s']:>10.1f} appels/s {mesure['pic_memoire_octets'] / 1024 ** 2:>8.2f} Mo")
+    return resultats
+
+def comparer_a_la_reference(resultats, reference, seuil=0.25, tolerance_s=0.002):
+    """
+    Liste les régressions : durée médiane ou pic mémoire dépassant la référence de plus de `seuil` (relatif).
+    Les écarts de durée inférieurs à `tolerance_s` sont ignorés (bruit de mesure des cas très courts).
+    """
+    regressions = []
+    for nom, mesure in resultats.items():
+        ref = reference.get(nom)
+        if ref is None:
+            continue
+        if mesure['mediane_s'] > ref['mediane_s'] * (1 + seuil) and mesure['mediane_s'] - ref['mediane_s'] > tolerance_s:
+            regressions.append(f"{nom} : durée {mesure['mediane_s'] * 1000:.2f} ms (référence {ref['mediane_s'] * 1000:.2f} ms)")
+        if mesure['pic_memoire_octets'] > ref['pic_memoire_octets'] * (1 + seuil):
+            regressions.append(f"{nom} : mémoire {mesure['pic_memoire_octets'] / 1024 ** 2:.2f} Mo (référence {ref['pic_memoire_octets'] / 1024 ** 2:.2f} Mo)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance des moteurs de calcul de l'audit patrimonial.")
+    parser.add_argument('--reference', default='benchmarks_reference.json', help="Fichier JSON de référence (défaut : benchmarks_reference.json)")
+    parser.add_argument('--enregistrer', action='store_true', help="Enregistre les mesures comme nouvelle référence")
+    parser.add_argument('--seuil', type=float, default=0.25, help="Régression tolérée, relative (défaut : 0.25, soit +25 %%)")
+    parser.add_argument('--filtre', help="N'exécute que les cas dont le nom contient ce texte")
+    parser.add_argument('--repetitions', type=int, default=5, help="Nombre d'appels chronométrés par cas (défaut : 5)")
+    parser.add_argument('--sans-openfisca', action='store_true', help="Exclut les cas utilisant OpenFisca")
+    args = parser.parse_args(argv)
+
+    resultats = executer_benchmarks(args.filtre, args.repetitions, not args.sans_openfisca)
+    chemin_reference = Path(args.reference)
+
+    if args.enregistrer:
+        reference = json.loads(chemin_reference.read_text(encoding='utf-8')) if chemin_reference.exists() else {'resultats': {}}
+        reference['meta'] = {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(), 'machine': platform.platform()}
+        reference['resultats'].update(resultats)
+        chemin_reference.write_text(json.dumps(reference, indent=4), encoding='utf-8')
+        print(f"Référence enregistrée dans {chemin_reference}.")
+        return 0
+
+    if not chemin_reference.exists():
+        print(f"Pas de référence ({chemin_reference}) : relancez avec --enregistrer pour la créer.")
+        return 0
+    regressions = comparer_a_la_reference(resultats, json.loads(chemin_reference.read_text(encoding='utf-8'))['resultats'], args.seuil)
+    if regressions:
+        print(f"{len(regressions)} régression(s) au-delà de {args.seuil:.0%} :", file=sys.stderr)
+        for regression in regressions:
+            print(f"  - {regression}", file=sys.stderr)
+        return 1
+    print(f"Aucune régression au-delà de {args.seuil:.0%}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
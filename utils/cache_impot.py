@@ -0,0 +1,114 @@
+# utils/cache_impot.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+def empreinte_foyer(annee, foyer_details):
+    """
+    Calcule l'empreinte canonique minimale d'un foyer pour le calcul de l'impôt :
+    année, revenu arrondi à l'euro et année de naissance de chaque déclarant,
+    années de naissance des personnes à charge et case T (parent isolé).
+
+    Retourne None si le foyer n'est pas calculable (année de naissance d'un déclarant manquante).
+    """
+    declarants = []
+    for adulte in foyer_details['adultes_details']:
+        annee_naissance = adulte.get('annee_naissance')
+        if pd.isna(annee_naissance):
+            return None
+        declarants.append([int(round(float(adulte['revenu']))), int(annee_naissance)])
+
+    personnes_a_charge = sorted(
+        int(enfant.get('Année Naissance')) for enfant in foyer_details['enfants_details'] if pd.notna(enfant.get('Année Naissance'))
+    )
+    return [int(annee), declarants, personnes_a_charge, bool(foyer_details.get('est_parent_isole', False))]
+
+def cle_foyer(annee, foyer_details):
+    """Clé de cache (condensat SHA-1 de l'empreinte canonique) d'un foyer, ou None s'il n'est pas calculable."""
+    empreinte = empreinte_foyer(annee, foyer_details)
+    if empreinte is None:
+        return None
+    return hashlib.sha1(json.dumps(empreinte, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+class CacheImpot:
+    """
+    Cache LRU des impôts calculés, indexé par empreinte de foyer, avec persistance SQLite optionnelle.
+    Partagé par toutes les sessions du processus (accès protégés par un verrou).
+    """
+    def __init__(self, taille_max=50000, chemin_sqlite=None):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self._connexion = None
+        self.hits = 0
+        self.misses = 0
+        if chemin_sqlite:
+            self.activer_persistance(chemin_sqlite)
+
+    def activer_persistance(self, chemin_sqlite):
+        """Active la persistance sur disque dans une base SQLite (créée si nécessaire)."""
+        with self._verrou:
+            self._connexion = sqlite3.connect(chemin_sqlite, check_same_thread=False)
+            self._connexion.execute("CREATE TABLE IF NOT EXISTS impots (cle TEXT PRIMARY KEY, impot REAL NOT NULL)")
+            self._connexion.commit()
+
+    def obtenir(self, cle):
+        """Retourne l'impôt mis en cache pour `cle`, ou None."""
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return self._entrees[cle]
+            if self._connexion is not None:
+                ligne = self._connexion.execute("SELECT impot FROM impots WHERE cle = ?", (cle,)).fetchone()
+                if ligne is not None:
+                    self._inserer(cle, ligne[0])
+                    self.hits += 1
+                    return ligne[0]
+            self.misses += 1
+            return None
+
+    def enregistrer(self, valeurs):
+        """Enregistre un dictionnaire {cle: impot} en mémoire et, si activé, sur disque."""
+        with self._verrou:
+            for cle, impot in valeurs.items():
+                self._inserer(cle, float(impot))
+            if self._connexion is not None and valeurs:
+                self._connexion.executemany("INSERT OR REPLACE INTO impots (cle, impot) VALUES (?, ?)", [(cle, float(impot)) for cle, impot in valeurs.items()])
+                self._connexion.commit()
+
+    def _inserer(self, cle, impot):
+        self._entrees[cle] = impot
+        self._entrees.move_to_end(cle)
+        while len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+
+    def vider(self):
+        """Vide le cache mémoire (la base SQLite éventuelle est conservée) et remet les compteurs à zéro."""
+        with self._verrou:
+            self._entrees.clear()
+            self.hits = self.misses = 0
+
+    def statistiques(self):
+        """Retourne les compteurs du cache (hits, misses, taux de hit, nombre d'entrées en mémoire)."""
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taux_hit': self.hits / total if total else 0.0,
+                'entrees': len(self._entrees),
+                'persistance': self._connexion is not None,
+            }
+
+# Base SQLite de persistance des caches : configurée côté serveur par variable d'environnement, jamais depuis
+# l'interface (les sessions ne doivent pas pouvoir choisir un fichier sur le disque du serveur)
+VARIABLE_CHEMIN_CACHE = 'AUDIT_PATRIMONIAL_CACHE_SQLITE'
+CHEMIN_CACHE_SQLITE = os.environ.get(VARIABLE_CHEMIN_CACHE) or None
+
+# Instance partagée par tout le processus
+CACHE_IMPOT = CacheImpot(chemin_sqlite=CHEMIN_CACHE_SQLITE)
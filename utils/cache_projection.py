@@ -0,0 +1,188 @@
+# utils/cache_projection.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import pandas as pd
+from .cache_impot import CHEMIN_CACHE_SQLITE
+
+def empreinte_dataframe(df):
+    """Empreinte stable (SHA-1) du contenu d'un DataFrame : colonnes, types, index et valeurs."""
+    condensat = hashlib.sha1(repr((list(df.columns), [str(t) for t in df.dtypes])).encode('utf-8'))
+    if not df.empty:
+        condensat.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return condensat.hexdigest()
+
+def cle_projection(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot):
+    """
+    Clé de cache d'une projection : condensat des onze entrées de `generer_projection_complete`
+    (DataFrames hachés par contenu), du moteur d'impôt et de l'année de départ de la projection.
+    """
+    from .openfisca_utils import OPENFISCA_READY
+
+    empreinte = {
+        'annee_depart': datetime.now().year,
+        'duree': int(duree),
+        'dataframes': [empreinte_dataframe(df) for df in (stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, ventes_df)],
+        'hyp_economiques': hyp_economiques,
+        'est_parent_isole': bool(est_parent_isole),
+        # Sans OpenFisca, le moteur 'openfisca' retombe sur le barème : le résultat n'est pas le même
+        'moteur_impot': moteur_impot if OPENFISCA_READY else 'bareme',
+    }
+    return hashlib.sha1(json.dumps(empreinte, sort_keys=True, default=str, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def taille_projection(projection, logs):
+    """Taille mémoire approximative (octets) d'un résultat de projection."""
+    return int(projection.memory_usage(deep=True).sum()) + sum(len(log.encode('utf-8')) for log in logs)
+
+def _encoder_projection(projection):
+    """DataFrame -> fichier Arrow IPC compressé (format de données, sans code exécutable à la relecture)."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(projection, nthreads=1)
+    flux = pa.BufferOutputStream()
+    with pa.ipc.new_file(flux, table.schema, options=pa.ipc.IpcWriteOptions(compression='lz4', use_threads=False)) as ecrivain:
+        ecrivain.write_table(table)
+    return flux.getvalue().to_pybytes()
+
+def _decoder_projection(contenu):
+    """Fichier Arrow IPC -> DataFrame (types et index pandas restaurés depuis les métadonnées)."""
+    import pyarrow as pa
+    lecteur = pa.ipc.open_file(pa.py_buffer(contenu), options=pa.ipc.IpcReadOptions(use_threads=False))
+    return lecteur.read_all().to_pandas(use_threads=False)
+
+class CacheProjection:
+    """
+    Cache LRU des projections calculées, borné en octets, avec persistance SQLite optionnelle.
+    Partagé par toutes les sessions du processus (accès protégés par un verrou). Les résultats sont
+    copiés à l'enregistrement et à la lecture : les pages peuvent modifier le tableau obtenu.
+    Sur disque, la projection est stockée en Arrow IPC et le journal en JSON ; la table est elle aussi
+    bornée en octets (`taille_max_octets_disque`), les projections les moins récemment utilisées étant supprimées.
+    """
+    def __init__(self, taille_max_octets=256 * 1024 * 1024, chemin_sqlite=None, taille_max_octets_disque=1024 * 1024 * 1024):
+        self.taille_max_octets = taille_max_octets
+        self.taille_max_octets_disque = taille_max_octets_disque
+        self._entrees = OrderedDict()
+        self._octets = 0
+        self._verrou = threading.Lock()
+        self._connexion = None
+        self.hits = 0
+        self.misses = 0
+        if chemin_sqlite:
+            self.activer_persistance(chemin_sqlite)
+
+    def activer_persistance(self, chemin_sqlite):
+        """Active la persistance sur disque dans une base SQLite (créée si nécessaire)."""
+        with self._verrou:
+            self._connexion = sqlite3.connect(chemin_sqlite, check_same_thread=False)
+            # L'ancienne table stockait des pickles : elle n'est plus jamais relue
+            self._connexion.execute("DROP TABLE IF EXISTS projections")
+            self._connexion.execute("CREATE TABLE IF NOT EXISTS projections_arrow (cle TEXT PRIMARY KEY, projection BLOB NOT NULL, "
+                                    "logs TEXT NOT NULL, octets INTEGER NOT NULL, utilisation REAL NOT NULL)")
+            self._elaguer_disque()
+            self._connexion.commit()
+
+    def contient(self, cle):
+        """Indique si une projection est disponible pour `cle`, sans modifier les compteurs."""
+        with self._verrou:
+            if cle in self._entrees:
+                return True
+            return self._connexion is not None and self._connexion.execute("SELECT 1 FROM projections_arrow WHERE cle = ?", (cle,)).fetchone() is not None
+
+    def obtenir(self, cle):
+        """Retourne une copie de (projection, logs) mise en cache pour `cle`, ou None."""
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                projection, logs, _ = self._entrees[cle]
+                return projection.copy(), list(logs)
+            if self._connexion is not None:
+                ligne = self._connexion.execute("SELECT projection, logs FROM projections_arrow WHERE cle = ?", (cle,)).fetchone()
+                if ligne is not None:
+                    projection, logs = _decoder_projection(ligne[0]), json.loads(ligne[1])
+                    self._connexion.execute("UPDATE projections_arrow SET utilisation = ? WHERE cle = ?", (time.time(), cle))
+                    self._connexion.commit()
+                    self._inserer(cle, projection, logs)
+                    self.hits += 1
+                    return projection.copy(), list(logs)
+            self.misses += 1
+            return None
+
+    def enregistrer(self, cle, projection, logs):
+        """
+        Enregistre une projection en mémoire et, si activé, sur disque. Une projection que le format Arrow
+        ne sait pas représenter (colonnes de types mélangés) reste en mémoire seulement.
+        """
+        projection, logs = projection.copy(), list(logs)
+        with self._verrou:
+            self._inserer(cle, projection, logs)
+            if self._connexion is not None:
+                try:
+                    contenu = _encoder_projection(projection)
+                except (ImportError, ValueError, TypeError, NotImplementedError):
+                    return
+                logs_json = json.dumps(logs, ensure_ascii=False)
+                self._connexion.execute("INSERT OR REPLACE INTO projections_arrow (cle, projection, logs, octets, utilisation) VALUES (?, ?, ?, ?, ?)",
+                                        (cle, contenu, logs_json, len(contenu) + len(logs_json.encode('utf-8')), time.time()))
+                self._elaguer_disque()
+                self._connexion.commit()
+
+    def _elaguer_disque(self):
+        """Supprime les projections les moins récemment utilisées au-delà de `taille_max_octets_disque`."""
+        self._connexion.execute(
+            "DELETE FROM projections_arrow WHERE cle IN (SELECT cle FROM (SELECT cle, SUM(octets) OVER "
+            "(ORDER BY utilisation DESC, cle) AS cumul FROM projections_arrow) WHERE cumul > ?)",
+            (self.taille_max_octets_disque,))
+
+    def _inserer(self, cle, projection, logs):
+        if cle in self._entrees:
+            self._octets -= self._entrees.pop(cle)[2]
+        taille = taille_projection(projection, logs)
+        self._entrees[cle] = (projection, logs, taille)
+        self._octets += taille
+        while self._octets > self.taille_max_octets and len(self._entrees) > 1:
+            _, (_, _, taille_evincee) = self._entrees.popitem(last=False)
+            self._octets -= taille_evincee
+
+    def vider(self):
+        """Vide le cache mémoire (la base SQLite éventuelle est conservée) et remet les compteurs à zéro."""
+        with self._verrou:
+            self._entrees.clear()
+            self._octets = 0
+            self.hits = self.misses = 0
+
+    def statistiques(self):
+        """Retourne les compteurs du cache (hits, misses, taux de hit, entrées et octets en mémoire et sur disque)."""
+        with self._verrou:
+            total = self.hits + self.misses
+            octets_disque = self._connexion.execute("SELECT COALESCE(SUM(octets), 0) FROM projections_arrow").fetchone()[0] if self._connexion is not None else 0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taux_hit': self.hits / total if total else 0.0,
+                'entrees': len(self._entrees),
+                'octets': self._octets,
+                'taille_max_octets': self.taille_max_octets,
+                'persistance': self._connexion is not None,
+                'octets_disque': octets_disque,
+                'taille_max_octets_disque': self.taille_max_octets_disque,
+            }
+
+# Instance partagée par tout le processus (persistance configurée comme pour le cache des impôts)
+CACHE_PROJECTION = CacheProjection(chemin_sqlite=CHEMIN_CACHE_SQLITE)
+
+def projection_en_cache(calcul, duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot='openfisca'):
+    """
+    Retourne (projection, logs, depuis_cache) : le résultat en cache s'il existe, sinon celui de `calcul`
+    (appelé avec les mêmes arguments que `generer_projection_complete`), qui est alors mis en cache.
+    """
+    cle = cle_projection(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot)
+    resultat = CACHE_PROJECTION.obtenir(cle)
+    if resultat is not None:
+        return resultat[0], resultat[1], True
+    projection, logs = calcul(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot=moteur_impot)
+    CACHE_PROJECTION.enregistrer(cle, projection, logs)
+    return projection, logs, False
@@ -20,85 +20,428 @@ def calculer_mensualite_pret(montant_emprunte, taux_annuel_pourcentage, duree_an
     mensualite_pi = -npf.pmt(taux_mensuel_nominal, nombre_mensualites, montant_emprunte) if taux_mensuel_nominal > 0 else montant_emprunte / nombre_mensualites
     cout_assurance_mensuel = montant_emprunte * taux_mensuel_assurance # Coût assurance constant sur capital initial
     return mensualite_pi + cout_assurance_mensuel
-            
+
+def coefficients_capacite_emprunt(taux_annuels_pct, durees_annees, taux_assurance_annuels_pct=(0.0,)):
+    """
+    Capital empruntable par euro de mensualité (assurance comprise), inverse de `calculer_mensualite_pret`,
+    sur la grille taux × durée × taux d'assurance. Retourne un tableau de forme
+    (len(taux_annuels_pct), len(durees_annees), len(taux_assurance_annuels_pct)).
+    """
+    taux_mensuel = (np.nan_to_num(np.asarray(taux_annuels_pct, dtype=float)) / 100 / 12)[:, None, None]
+    nombre_mensualites = np.floor(np.asarray(durees_annees, dtype=float) * 12)[None, :, None]
+    taux_mensuel_assurance = (np.nan_to_num(np.asarray(taux_assurance_annuels_pct, dtype=float)) / 100 / 12)[None, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Mensualité P&I par euro emprunté : r / (1 - (1 + r)^-n), ou 1 / n à taux nul
+        annuite = np.where(taux_mensuel > 0, taux_mensuel / -np.expm1(-nombre_mensualites * np.log1p(taux_mensuel)), 1 / nombre_mensualites)
+        coefficients = 1 / (annuite + taux_mensuel_assurance)
+    return np.where(nombre_mensualites > 0, coefficients, 0.0)
+
+def calculer_capacite_emprunt(mensualite_disponible, taux_annuels_pct, durees_annees, taux_assurance_annuels_pct=(0.0,)):
+    """
+    Montant maximal empruntable avec une mensualité (assurance comprise) de `mensualite_disponible`, pour
+    chaque point de la grille taux × durée × taux d'assurance (cf. `coefficients_capacite_emprunt`).
+    Une mensualité disponible négative ou nulle donne une capacité nulle.
+    """
+    return max(float(mensualite_disponible), 0.0) * coefficients_capacite_emprunt(taux_annuels_pct, durees_annees, taux_assurance_annuels_pct)
+
+COLONNES_AMORTISSEMENT_ANNUEL = ['Mensualités P&I Annuelles', 'Assurance Annuelle', 'Mensualités Annuelles', 'Intérêts Annuels', 'Principal Annuel', 'CRD']
+
+def calculer_echeanciers_mensuels(montants, taux_annuels_pct, durees_annees, dates_debut, taux_assurance_annuels_pct=None):
+    """
+    Calcule en une seule passe vectorisée les échéanciers mensuels de N prêts à partir de la formule d'annuité.
+
+    Les tableaux retournés ont la forme (N, n_mois_max) ; les mois au-delà de la durée d'un prêt sont
+    masqués (`masque` à False) et valent 0. `mois_absolus` vaut `année * 12 + (mois - 1)` pour chaque échéance.
+    """
+    montants = np.atleast_1d(np.asarray(montants, dtype=float))
+    n_prets = len(montants)
+    taux = np.nan_to_num(np.atleast_1d(np.asarray(taux_annuels_pct, dtype=float)), nan=0.0)
+    durees = np.atleast_1d(np.asarray(durees_annees, dtype=float))
+    if taux_assurance_annuels_pct is None:
+        taux_assurance_annuels_pct = np.zeros(n_prets)
+    taux_assurance = np.nan_to_num(np.atleast_1d(np.asarray(taux_assurance_annuels_pct, dtype=float)), nan=0.0)
+
+    dates = pd.to_datetime(pd.Index(np.atleast_1d(dates_debut)), errors='coerce')
+    dates_valides = np.asarray(dates.notna())
+    mois_depart = np.nan_to_num(np.asarray(dates.year, dtype=float) * 12 + np.asarray(dates.month, dtype=float) - 1).astype(np.int64)
+
+    n_mois = np.where(np.isfinite(durees), np.floor(np.nan_to_num(durees) * 12), 0).astype(np.int64)
+    valides = (montants > 0) & (durees > 0) & (n_mois > 0) & dates_valides
+    n_mois = np.where(valides, n_mois, 0)
+    capital = np.where(valides, montants, 0.0)
+
+    # Un taux nul ou négatif est traité comme un prêt sans intérêts (cf. calculer_mensualite_pret)
+    r = np.where(taux > 0, taux / 100 / 12, 0.0)
+    n_mois_max = int(n_mois.max()) if n_prets else 0
+    k = np.arange(n_mois_max + 1)[None, :]
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        n_sur = np.maximum(n_mois, 1)
+        facteur_n = (1 + r) ** n_sur
+        mensualite_pi = np.where(r > 0, capital * r * facteur_n / (facteur_n - 1), capital / n_sur)
+        croissance = (1 + r)[:, None] ** k
+        crd_theorique = np.where(
+            (r > 0)[:, None],
+            capital[:, None] * croissance - mensualite_pi[:, None] * (croissance - 1) / np.where(r > 0, r, 1)[:, None],
+            capital[:, None] - mensualite_pi[:, None] * k,
+        )
+    crd_theorique = np.maximum(0, np.nan_to_num(crd_theorique))
+
+    masque = k[:, :-1] < n_mois[:, None]
+    crd_debut = crd_theorique[:, :-1]
+    interets = crd_debut * r[:, None]
+    principal = mensualite_pi[:, None] - interets
+    mensualite_ajustee = np.broadcast_to(mensualite_pi[:, None], masque.shape).copy()
+
+    # Dernière échéance : on solde le capital restant
+    derniere = k[:, :-1] == (n_mois[:, None] - 1)
+    principal = np.where(derniere, crd_debut, principal)
+    mensualite_ajustee = np.where(derniere, crd_debut + interets, mensualite_ajustee)
+    crd = np.where(derniere, 0.0, crd_theorique[:, 1:])
+
+    assurance = np.broadcast_to((capital * taux_assurance / 100 / 12)[:, None], masque.shape)
+    zero = lambda a: np.where(masque, a, 0.0)
+    return {
+        'masque': masque,
+        'mois_absolus': mois_depart[:, None] + k[:, :-1],
+        'n_mois': n_mois,
+        'mensualite_pi': zero(mensualite_ajustee),
+        'assurance': zero(assurance),
+        'interets': zero(interets),
+        'principal': zero(principal),
+        'crd': zero(crd),
+    }
+
+def agreger_echeanciers_annuels(echeanciers_mensuels):
+    """
+    Agrège par année civile des échéanciers mensuels (cf. `calculer_echeanciers_mensuels`).
+
+    Retourne (annees, valeurs) où `annees` est le vecteur des années couvertes et `valeurs` un dict de
+    matrices (N, n_annees) reprenant les colonnes de COLONNES_AMORTISSEMENT_ANNUEL, plus le masque `actif`
+    des années où le prêt a au moins une échéance.
+    """
+    masque = echeanciers_mensuels['masque']
+    n_prets = masque.shape[0]
+    if not masque.any():
+        return np.array([], dtype=np.int64), {col: np.zeros((n_prets, 0)) for col in COLONNES_AMORTISSEMENT_ANNUEL + ['actif']}
+
+    mois_absolus = echeanciers_mensuels['mois_absolus']
+    annees_mois = mois_absolus // 12
+    annee_min = int(annees_mois[masque].min())
+    n_annees = int(annees_mois[masque].max()) - annee_min + 1
+    cle = (np.arange(n_prets)[:, None] * n_annees + (annees_mois - annee_min))[masque]
+
+    def somme(valeurs):
+        return np.bincount(cle, weights=valeurs[masque], minlength=n_prets * n_annees).reshape(n_prets, n_annees)
+
+    mensualite_pi, assurance = somme(echeanciers_mensuels['mensualite_pi']), somme(echeanciers_mensuels['assurance'])
+    nb_echeances = np.bincount(cle, minlength=n_prets * n_annees).reshape(n_prets, n_annees)
+
+    # CRD de fin d'année : CRD de la dernière échéance de l'année (arithmétique entière sur les mois)
+    dernier_mois = np.full(n_prets * n_annees, -1, dtype=np.int64)
+    np.maximum.at(dernier_mois, cle, np.broadcast_to(np.arange(masque.shape[1]), masque.shape)[masque])
+    dernier_mois = dernier_mois.reshape(n_prets, n_annees)
+    crd = np.where(dernier_mois >= 0, np.take_along_axis(echeanciers_mensuels['crd'], np.maximum(dernier_mois, 0), axis=1), 0.0)
+
+    valeurs = {
+        'Mensualités P&I Annuelles': mensualite_pi,
+        'Assurance Annuelle': assurance,
+        'Mensualités Annuelles': mensualite_pi + assurance,
+        'Intérêts Annuels': somme(echeanciers_mensuels['interets']),
+        'Principal Annuel': somme(echeanciers_mensuels['principal']),
+        'CRD': crd,
+        'actif': nb_echeances > 0,
+    }
+    return np.arange(annee_min, annee_min + n_annees), valeurs
+
+def generer_tableaux_amortissement_batch(montants, taux_annuels_pct, durees_annees, dates_debut, taux_assurance_annuels_pct=None, identifiants=None):
+    """
+    Génère en un seul appel les tableaux d'amortissement annuels de N prêts.
+
+    Retourne un DataFrame empilé indexé par (Prêt, Année) avec les mêmes colonnes que `generer_tableau_amortissement`.
+    Les prêts invalides (montant ou durée nuls, date manquante) n'ont aucune ligne.
+    """
+    echeanciers_mensuels = calculer_echeanciers_mensuels(montants, taux_annuels_pct, durees_annees, dates_debut, taux_assurance_annuels_pct)
+    annees, valeurs = agreger_echeanciers_annuels(echeanciers_mensuels)
+    n_prets = echeanciers_mensuels['masque'].shape[0]
+    identifiants = np.arange(n_prets) if identifiants is None else np.asarray(list(identifiants), dtype=object)
+
+    idx_pret, idx_annee = np.nonzero(valeurs['actif'])
+    index = pd.MultiIndex.from_arrays([identifiants[idx_pret], annees[idx_annee]], names=['Prêt', 'Année'])
+    return pd.DataFrame({col: valeurs[col][idx_pret, idx_annee] for col in COLONNES_AMORTISSEMENT_ANNUEL}, index=index)
+
+def _tableau_annuel_pret(annees, valeurs, ligne):
+    """Extrait le tableau d'amortissement annuel d'un prêt (ligne `ligne`) des matrices agrégées."""
+    actif = valeurs['actif'][ligne]
+    if not actif.any():
+        return pd.DataFrame()
+    return pd.DataFrame({col: valeurs[col][ligne, actif] for col in COLONNES_AMORTISSEMENT_ANNUEL}, index=pd.Index(annees[actif], name='Année'))
+
+def calculer_echeanciers_mensuels_prets(prets_df):
+    """Échéanciers mensuels (cf. `calculer_echeanciers_mensuels`) des prêts d'un DataFrame `df_prets`, dans l'ordre de ses lignes."""
+    assurance = prets_df['Assurance Emprunteur %'] if 'Assurance Emprunteur %' in prets_df.columns else None
+    return calculer_echeanciers_mensuels(
+        pd.to_numeric(prets_df['Montant Initial'], errors='coerce'),
+        pd.to_numeric(prets_df['Taux Annuel %'], errors='coerce'),
+        pd.to_numeric(prets_df['Durée Initiale (ans)'], errors='coerce'),
+        prets_df['Date Début'],
+        None if assurance is None else pd.to_numeric(assurance, errors='coerce'),
+    )
+
+def generer_echeanciers_prets(prets_df):
+    """Génère les tableaux d'amortissement annuels de tous les prêts d'un DataFrame `df_prets`, indexés par l'index du prêt."""
+    if prets_df.empty:
+        return {}
+    annees, valeurs = agreger_echeanciers_annuels(calculer_echeanciers_mensuels_prets(prets_df))
+    return {idx: _tableau_annuel_pret(annees, valeurs, ligne) for ligne, idx in enumerate(prets_df.index)}
+
 def generer_tableau_amortissement(montant_emprunte, taux_annuel_pourcentage, duree_annees, date_debut_pret, taux_assurance_annuel_pct=0):
     """Génère un tableau d'amortissement annuel pour un prêt."""
     if montant_emprunte <= 0 or duree_annees <= 0:
         return pd.DataFrame()
 
-    # Traiter NaN ou None pour les taux comme 0
-    taux_annuel_pourcentage = taux_annuel_pourcentage if pd.notna(taux_annuel_pourcentage) else 0
-    taux_assurance_annuel_pct = taux_assurance_annuel_pct if pd.notna(taux_assurance_annuel_pct) else 0
+    echeanciers_mensuels = calculer_echeanciers_mensuels([montant_emprunte], [taux_annuel_pourcentage], [duree_annees], [date_debut_pret], [taux_assurance_annuel_pct])
+    annees, valeurs = agreger_echeanciers_annuels(echeanciers_mensuels)
+    return _tableau_annuel_pret(annees, valeurs, 0)
 
-    taux_mensuel_nominal = (taux_annuel_pourcentage / 100) / 12
-    n_mois = int(duree_annees * 12)
-    
-    mensualite_pi = calculer_mensualite_pret(montant_emprunte, taux_annuel_pourcentage, duree_annees, 0) # Mensualité P&I seule
-    cout_assurance_mensuel = calculer_mensualite_pret(montant_emprunte, 0, duree_annees, taux_assurance_annuel_pct) # Assurance seule
-                                     # (calculer_mensualite_pret avec taux nominal 0 et juste assurance)
-                                     # ou plus simplement: montant_emprunte * (taux_assurance_annuel_pct / 100) / 12
-    cout_assurance_mensuel = montant_emprunte * (taux_assurance_annuel_pct / 100) / 12
-
-    capital_restant, data = montant_emprunte, []
-    current_date = pd.to_datetime(date_debut_pret)
-
-    for mois_num in range(n_mois):
-        interet_mois = capital_restant * taux_mensuel_nominal if taux_mensuel_nominal > 0 else 0
-        principal_mois = mensualite_pi - interet_mois
-        
-        if mois_num == n_mois - 1: # Dernière échéance
-            principal_mois = capital_restant # Solder le prêt
-            if taux_mensuel_nominal > 0 : # Recalculer la mensualité P&I pour la dernière échéance si nécessaire
-                 mensualite_pi_ajustee = principal_mois + interet_mois
-            else:
-                 mensualite_pi_ajustee = principal_mois
+def calculer_taux_endettement(df_revenus, df_prets, df_stocks, date_reference=None):
+    """
+    Calcule le taux d'endettement du foyer : mensualités des prêts en cours rapportées aux revenus mensuels
+    pondérés (100 % des revenus saisis, 70 % des loyers bruts estimés des biens d'immobilier productif).
+
+    Retourne un dictionnaire : détail des charges de prêts et des revenus (DataFrames), totaux mensuels et
+    'taux_endettement' en % (infini si des charges existent sans revenus).
+    """
+    date_reference = date_reference or datetime.now()
+    df_revenus, df_prets, df_stocks = df_revenus.copy(), df_prets.copy(), df_stocks.copy()
+
+    # Assurer les types de données corrects et gérer les NaN
+    df_revenus['Montant Annuel'] = pd.to_numeric(df_revenus['Montant Annuel'], errors='coerce').fillna(0)
+
+    colonnes_prets_requises = {'Montant Initial':0.0, 'Taux Annuel %':0.0, 'Durée Initiale (ans)':0.0, 'Date Début':pd.NaT, 'Assurance Emprunteur %':0.0, 'Actif Associé': 'N/A'}
+    for col, valeur_defaut in colonnes_prets_requises.items():
+        if col not in df_prets.columns:
+            df_prets[col] = valeur_defaut
+    df_prets['Montant Initial'] = pd.to_numeric(df_prets['Montant Initial'], errors='coerce').fillna(0)
+    df_prets['Taux Annuel %'] = pd.to_numeric(df_prets['Taux Annuel %'], errors='coerce').fillna(0)
+    df_prets['Durée Initiale (ans)'] = pd.to_numeric(df_prets['Durée Initiale (ans)'], errors='coerce').fillna(0)
+    df_prets['Assurance Emprunteur %'] = pd.to_numeric(df_prets['Assurance Emprunteur %'], errors='coerce').fillna(0)
+    df_prets['Date Début'] = pd.to_datetime(df_prets['Date Début'], errors='coerce')
+
+    colonnes_stocks_requises = {'Type': None, 'Valeur Brute': 0.0, 'Rendement %': 0.0, 'Actif': 'Actif Inconnu'}
+    for col, valeur_defaut in colonnes_stocks_requises.items():
+        if col not in df_stocks.columns:
+            df_stocks[col] = valeur_defaut
+    df_stocks['Valeur Brute'] = pd.to_numeric(df_stocks['Valeur Brute'], errors='coerce').fillna(0)
+    df_stocks['Rendement %'] = pd.to_numeric(df_stocks['Rendement %'], errors='coerce').fillna(0)
+
+    # --- 1. Charges de prêts mensuelles ---
+    charges_details_list = []
+    for _, pret in df_prets.iterrows():
+        is_active = False
+        # Vérifier les conditions pour qu'un prêt soit actif
+        if not (pd.notna(pret['Date Début']) and pret['Date Début'] < date_reference):
+            status_reason = f"Prêt futur (début le {pret['Date Début'].strftime('%d/%m/%Y')})" if pd.notna(pret['Date Début']) else "Date de début manquante"
+        elif not (pret['Montant Initial'] > 0):
+            status_reason = "Montant initial nul ou manquant"
+        elif not (pret['Durée Initiale (ans)'] > 0):
+            status_reason = "Durée nulle ou manquante"
+        elif not (pd.notna(pret['Taux Annuel %'])):
+            status_reason = "Taux manquant"
         else:
-            mensualite_pi_ajustee = mensualite_pi
+            is_active = True
+            status_reason = "Actif et inclus dans le calcul"
 
-        capital_restant -= principal_mois
-        capital_restant = max(0, capital_restant) # Éviter les CRD négatifs dus aux arrondis
+        # Calculer la mensualité si possible, quel que soit le statut
+        mensualite = np.nan
+        if pret['Montant Initial'] > 0 and pret['Durée Initiale (ans)'] > 0 and pd.notna(pret['Taux Annuel %']):
+            mensualite = calculer_mensualite_pret(pret['Montant Initial'], pret['Taux Annuel %'], pret['Durée Initiale (ans)'], pret.get('Assurance Emprunteur %', 0))
 
-        data.append({
-            'Année': current_date.year, 'Mois': current_date.month, 
-            'Mensualité P&I': mensualite_pi_ajustee, 
-            'Assurance': cout_assurance_mensuel,
-            'Mensualité Totale': mensualite_pi_ajustee + cout_assurance_mensuel,
-            'Intérêts': interet_mois, 'Principal': principal_mois, 'CRD': capital_restant
+        charges_details_list.append({
+            "Description": f"Prêt ({pret.get('Actif Associé', 'N/A')})",
+            "Mensualité (€)": mensualite if pd.notna(mensualite) else 0,
+            "Statut": "Actif" if is_active else "Inactif",
+            "Raison / Statut": status_reason
         })
-        current_date += pd.DateOffset(months=1)
-
-    if not data: return pd.DataFrame()
-    df = pd.DataFrame(data)
-    df_annuel = df.groupby('Année').agg(
-        {'Mensualité P&I': 'sum', 
-         'Assurance': 'sum',
-         'Mensualité Totale': 'sum',
-         'Intérêts': 'sum', 
-         'Principal': 'sum', 
-         'CRD': 'last'}
-    )
-    return df_annuel.rename(columns={
-        'Mensualité P&I': 'Mensualités P&I Annuelles',
-        'Assurance': 'Assurance Annuelle',
-        'Mensualité Totale': 'Mensualités Annuelles', # C'est le total P+I+A
-        'Intérêts': 'Intérêts Annuels',
-        'Principal': 'Principal Annuel'
+    df_charges_details = pd.DataFrame(charges_details_list)
+    total_charges_prets_mensuelles = df_charges_details[df_charges_details['Statut'] == 'Actif']['Mensualité (€)'].sum() if not df_charges_details.empty else 0.0
+
+    # --- 2. Revenus mensuels pondérés ---
+    revenus_details_list = []
+    revenus_autres_mensuels = df_revenus['Montant Annuel'].sum() / 12.0
+    if revenus_autres_mensuels > 0:
+        revenus_details_list.append({
+            "Source": "Autres revenus (salaires, pensions, etc.)",
+            "Montant Mensuel Brut (€)": revenus_autres_mensuels,
+            "Pondération (%)": 100,
+            "Montant Mensuel Pondéré (€)": revenus_autres_mensuels
+        })
+
+    revenus_locatifs_ponderes_mensuels_total = 0.0
+    for _, actif in df_stocks[df_stocks['Type'] == "Immobilier productif"].iterrows():
+        if actif['Valeur Brute'] > 0 and pd.notna(actif['Rendement %']) and actif['Rendement %'] != 0:
+            revenu_locatif_actif_mensuel_brut = actif['Valeur Brute'] * (actif['Rendement %'] / 100.0) / 12.0
+            revenu_locatif_actif_mensuel_pondere = revenu_locatif_actif_mensuel_brut * 0.70
+            revenus_locatifs_ponderes_mensuels_total += revenu_locatif_actif_mensuel_pondere
+            revenus_details_list.append({
+                "Source": f"Locatif Brut - {actif['Actif']}",
+                "Montant Mensuel Brut (€)": revenu_locatif_actif_mensuel_brut,
+                "Pondération (%)": 70,
+                "Montant Mensuel Pondéré (€)": revenu_locatif_actif_mensuel_pondere
+            })
+    total_revenus_mensuels_ponderes = revenus_autres_mensuels + revenus_locatifs_ponderes_mensuels_total
+
+    # --- 3. Taux d'endettement ---
+    taux_endettement = 0.0
+    if total_revenus_mensuels_ponderes > 0:
+        taux_endettement = (total_charges_prets_mensuelles / total_revenus_mensuels_ponderes) * 100.0
+    elif total_charges_prets_mensuelles > 0: # Dettes mais pas de revenus pris en compte
+        taux_endettement = float('inf')
+
+    return {
+        'charges_details': df_charges_details,
+        'revenus_details': pd.DataFrame(revenus_details_list),
+        'total_charges_prets_mensuelles': total_charges_prets_mensuelles,
+        'total_revenus_mensuels_ponderes': total_revenus_mensuels_ponderes,
+        'taux_endettement': taux_endettement,
+    }
+
+def calculer_mensualites_prets_par_mois(prets_df, mois_debut, n_mois, ventes_df=None):
+    """
+    Total des mensualités (assurance comprise) dues chaque mois pour les `n_mois` mois à partir du mois
+    absolu `mois_debut` (`année * 12 + mois - 1`), prêts futurs compris. Les prêts d'un bien vendu
+    (`ventes_df`) sont soldés à partir du mois de vente ('Mois de Vente', janvier par défaut).
+    """
+    mensualites = np.zeros(n_mois)
+    if prets_df.empty or n_mois <= 0:
+        return mensualites
+    echeanciers = calculer_echeanciers_mensuels_prets(prets_df)
+    fin = np.full(len(prets_df), np.inf)
+    if ventes_df is not None and not ventes_df.empty:
+        mois_vente = pd.to_numeric(ventes_df.get('Mois de Vente', pd.Series(1, index=ventes_df.index)), errors='coerce').fillna(1)
+        mois_absolu_vente = (pd.to_numeric(ventes_df['Année de Vente'], errors='coerce') * 12 + mois_vente - 1).groupby(ventes_df['Bien à Vendre']).min()
+        fin = prets_df['Actif Associé'].map(mois_absolu_vente).fillna(np.inf).to_numpy(dtype=float)
+    mois = echeanciers['mois_absolus'] - mois_debut
+    retenus = echeanciers['masque'] & (mois >= 0) & (mois < n_mois) & (echeanciers['mois_absolus'] < fin[:, None])
+    montants = echeanciers['mensualite_pi'] + echeanciers['assurance']
+    return np.bincount(mois[retenus], weights=montants[retenus], minlength=n_mois)
+
+def calculer_trajectoire_endettement(projection_df, mensualites_par_mois, mois_debut, taux_max_pct=35.0):
+    """
+    Trajectoire mensuelle du taux d'endettement et du reste à vivre, à partir d'une projection annuelle
+    (`generer_projection_complete`) et des mensualités de prêts dues chaque mois depuis le mois absolu
+    `mois_debut` (cf. `calculer_mensualites_prets_par_mois`). Les revenus sont ceux de la projection :
+    les loyers y sont les loyers saisis ('Loyer Mensuel Brut (€)') des biens détenus, pondérés à 70 %, et non
+    l'estimation valeur × rendement de `calculer_taux_endettement`. Le reste à vivre déduit les charges et
+    l'impôt projetés.
+
+    Retourne un DataFrame mensuel ; 'Dépassement' signale les mois au-delà de `taux_max_pct`.
+    """
+    n_mois = len(mensualites_par_mois)
+    mois_absolus = mois_debut + np.arange(n_mois)
+    lignes = pd.Index(projection_df['Année']).get_indexer(mois_absolus // 12)
+    dans_projection = lignes >= 0
+    mois_absolus, lignes, mensualites = mois_absolus[dans_projection], lignes[dans_projection], np.asarray(mensualites_par_mois, dtype=float)[dans_projection]
+
+    def mensuel(colonne):
+        return pd.to_numeric(projection_df[colonne], errors='coerce').fillna(0).to_numpy(dtype=float)[lignes] / 12
+    revenus_ponderes = mensuel('Salaires Annuels') + mensuel('Pensions Annuelles') + mensuel('Autres Revenus Annuels') + 0.70 * mensuel('Revenus Locatifs Annuels')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taux = np.where(revenus_ponderes > 0, mensualites / revenus_ponderes * 100, np.where(mensualites > 0, np.inf, 0.0))
+    return pd.DataFrame({
+        'Mois': pd.to_datetime({'year': mois_absolus // 12, 'month': mois_absolus % 12 + 1, 'day': 1}),
+        'Revenus Mensuels Pondérés': revenus_ponderes,
+        'Mensualités Prêts': mensualites,
+        "Taux d'Endettement %": taux,
+        'Reste à Vivre Mensuel': mensuel('Revenu Annuel') - mensuel('Charges (hors prêts)') - mensuel('Impôt sur le Revenu') - mensualites,
+        'Dépassement': taux > taux_max_pct,
     })
 
+# Plus-values immobilières : frais d'acquisition forfaitaires, taux d'imposition et barèmes d'abattement pour
+# durée de détention, précalculés par nombre d'années pleines de détention (0 à 30, exonération totale au-delà)
+FRAIS_ACQUISITION_PV = 0.075
+TAUX_PV_IR, TAUX_PV_PS = 0.19, 0.172
+_ANNEES_DETENTION = np.arange(31)
+ABATTEMENTS_PV_IR = np.where(_ANNEES_DETENTION <= 5, 0.0, np.minimum(1.0, 0.06 * (np.minimum(21, _ANNEES_DETENTION) - 5) + np.where(_ANNEES_DETENTION >= 22, 0.04, 0.0)))
+ABATTEMENTS_PV_PS = np.where(_ANNEES_DETENTION <= 5, 0.0, np.minimum(1.0, 0.0165 * (np.minimum(21, _ANNEES_DETENTION) - 5) + np.where(_ANNEES_DETENTION >= 22, 0.0160, 0.0) + 0.09 * np.maximum(0, np.minimum(30, _ANNEES_DETENTION) - 22)))
+
+def details_plus_value_immobiliere(plus_value_brute, impot_ir, impot_ps, est_residence_principale=False):
+    """Message de journal décrivant le calcul de la plus-value d'une vente."""
+    if est_residence_principale: return "Résidence principale (exonérée)"
+    if plus_value_brute <= 0: return "Pas de plus-value brute imposable."
+    return f"PV Brute: {plus_value_brute:,.0f}€, Impôt IR: {impot_ir:,.0f}€, Impôt PS: {impot_ps:,.0f}€"
+
 def calculer_plus_value_immobiliere_fr(prix_achat, prix_vente, date_achat, date_vente, est_residence_principale=False):
-    if est_residence_principale: return 0, 0, "Résidence principale (exonérée)"
-    frais_acquisition_forfaitaires = prix_achat * 0.075
-    prix_revient = prix_achat + frais_acquisition_forfaitaires
+    if est_residence_principale: return 0, 0, details_plus_value_immobiliere(0, 0, 0, True)
+    prix_revient = prix_achat + prix_achat * FRAIS_ACQUISITION_PV
     plus_value_brute = prix_vente - prix_revient
-    if plus_value_brute <= 0: return 0, plus_value_brute, "Pas de plus-value brute imposable."
+    if plus_value_brute <= 0: return 0, plus_value_brute, details_plus_value_immobiliere(plus_value_brute, 0, 0)
     duree_detention = (date_vente - date_achat).days / 365.25
-    if duree_detention <= 5: abattement_ir_taux, abattement_ps_taux = 0, 0
-    else:
-        abattement_ir_taux = min(1.0, 0.06 * (min(21, int(duree_detention)) - 5) + (0.04 if duree_detention >= 22 else 0))
-        abattement_ps_taux = min(1.0, 0.0165 * (min(21, int(duree_detention)) - 5) + (0.0160 if duree_detention >= 22 else 0) + (0.09 * (max(0, min(30, int(duree_detention)) - 22))))
-    plus_value_imposable_ir = max(0, plus_value_brute * (1 - abattement_ir_taux))
-    plus_value_imposable_ps = max(0, plus_value_brute * (1 - abattement_ps_taux))
-    impot_ir, impot_ps = plus_value_imposable_ir * 0.19, plus_value_imposable_ps * 0.172
-    impot_total = impot_ir + impot_ps
-    details = f"PV Brute: {plus_value_brute:,.0f}€, Impôt IR: {impot_ir:,.0f}€, Impôt PS: {impot_ps:,.0f}€"
-    return impot_total, plus_value_brute, details
\ No newline at end of file
+    annees_pleines = min(30, int(duree_detention)) if duree_detention > 5 else 0
+    impot_ir = max(0, plus_value_brute * (1 - ABATTEMENTS_PV_IR[annees_pleines])) * TAUX_PV_IR
+    impot_ps = max(0, plus_value_brute * (1 - ABATTEMENTS_PV_PS[annees_pleines])) * TAUX_PV_PS
+    return impot_ir + impot_ps, plus_value_brute, details_plus_value_immobiliere(plus_value_brute, impot_ir, impot_ps)
+
+def calculer_plus_values_immobilieres_fr(prix_achat, prix_vente, date_achat, date_vente, est_residence_principale=False):
+    """
+    Version vectorisée de `calculer_plus_value_immobiliere_fr` : les prix, dates (tableaux de datetime64 ou
+    Timestamps) et indicateurs de résidence principale sont diffusés les uns contre les autres (broadcasting numpy).
+
+    Retourne un dictionnaire de tableaux : 'impot_total', 'impot_ir', 'impot_ps' et 'plus_value_brute'.
+    """
+    prix_achat, prix_vente = np.asarray(prix_achat, dtype=float), np.asarray(prix_vente, dtype=float)
+    plus_value_brute = prix_vente - (prix_achat + prix_achat * FRAIS_ACQUISITION_PV)
+    # Jours entiers de détention (comme `timedelta.days`), puis années pleines pour l'index des barèmes
+    ecart = np.asarray(date_vente, dtype='datetime64[ns]') - np.asarray(date_achat, dtype='datetime64[ns]')
+    duree_detention = np.floor_divide(ecart.astype(np.int64), 86_400 * 10**9) / 365.25
+    annees_pleines = np.where(duree_detention > 5, np.minimum(30, np.trunc(duree_detention)), 0).astype(np.int64)
+
+    imposable = (plus_value_brute > 0) & ~np.asarray(est_residence_principale, dtype=bool)
+    impot_ir = np.where(imposable, np.maximum(0, plus_value_brute * (1 - ABATTEMENTS_PV_IR[annees_pleines])) * TAUX_PV_IR, 0.0)
+    impot_ps = np.where(imposable, np.maximum(0, plus_value_brute * (1 - ABATTEMENTS_PV_PS[annees_pleines])) * TAUX_PV_PS, 0.0)
+    return {
+        'impot_total': impot_ir + impot_ps,
+        'impot_ir': impot_ir,
+        'impot_ps': impot_ps,
+        'plus_value_brute': np.where(np.asarray(est_residence_principale, dtype=bool), 0.0, plus_value_brute),
+    }
+
+def calculer_produits_nets_vente(biens_df, prets_df, annees_vente, taux_valorisation_pct, annee_reference=None):
+    """
+    Produit net de la vente de chaque bien (lignes de `biens_df`, colonnes de `df_stocks`) au 31 décembre de
+    chaque année de `annees_vente`, pour chaque taux annuel de valorisation de `taux_valorisation_pct` appliqué
+    à la valeur actuelle depuis `annee_reference` : prix de vente - impôt sur la plus-value - capital restant dû
+    des prêts associés au bien. Toute la grille est évaluée en un seul appel vectorisé.
+
+    Retourne un dictionnaire de tableaux (biens × années × taux) : 'prix_vente', 'impot_plus_value', 'crd'
+    et 'produit_net'.
+    """
+    annee_reference = annee_reference or datetime.now().year
+    annees_vente = np.asarray(annees_vente, dtype=np.int64)
+    valeurs = pd.to_numeric(biens_df['Valeur Brute'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    facteurs = (1 + np.asarray(taux_valorisation_pct, dtype=float) / 100)[None, :] ** (annees_vente - annee_reference)[:, None]
+    prix_vente = valeurs[:, None, None] * facteurs[None, :, :]
+
+    # Capital restant dû en fin d'année, sommé par bien (nul avant le déblocage et après la dernière échéance)
+    crd = np.zeros((len(biens_df), len(annees_vente)))
+    if not prets_df.empty:
+        annees_prets, valeurs_prets = agreger_echeanciers_annuels(calculer_echeanciers_mensuels_prets(prets_df))
+        colonnes = pd.Index(annees_prets).get_indexer(annees_vente)
+        crd_prets = np.where(colonnes >= 0, valeurs_prets['CRD'][:, np.maximum(colonnes, 0)], 0.0)
+        lignes_biens = pd.Index(biens_df['Actif']).get_indexer(prets_df['Actif Associé'])
+        associes = lignes_biens >= 0
+        np.add.at(crd, lignes_biens[associes], crd_prets[associes])
+
+    plus_values = calculer_plus_values_immobilieres_fr(
+        prix_achat=pd.to_numeric(biens_df['Prix Achat Initial'], errors='coerce').fillna(0).to_numpy(dtype=float)[:, None, None],
+        prix_vente=prix_vente,
+        date_achat=pd.to_datetime(biens_df['Date Achat'], errors='coerce').to_numpy(dtype='datetime64[ns]')[:, None, None],
+        date_vente=np.array([f"{annee}-12-31" for annee in annees_vente], dtype='datetime64[ns]')[None, :, None],
+        est_residence_principale=biens_df['Type'].astype(str).str.contains('jouissance', regex=False).to_numpy(dtype=bool)[:, None, None],
+    )
+    return {
+        'prix_vente': prix_vente,
+        'impot_plus_value': plus_values['impot_total'],
+        'crd': np.broadcast_to(crd[:, :, None], prix_vente.shape),
+        'produit_net': prix_vente - plus_values['impot_total'] - crd[:, :, None],
+    }
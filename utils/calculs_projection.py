@@ -1,8 +1,12 @@
 # utils/calculs_projection.py (refactorisé et corrigé)
 import pandas as pd
+import numpy as np
 from datetime import datetime
-from .openfisca_utils import calculer_impot_openfisca
-from .calculs import generer_tableau_amortissement, calculer_plus_value_immobiliere_fr
+from .openfisca_utils import calculer_impots
+from .calculs import calculer_echeanciers_mensuels_prets, agreger_echeanciers_annuels, calculer_plus_values_immobilieres_fr, details_plus_value_immobiliere
+from .cache_projection import empreinte_dataframe
+from .cache_impot import CACHE_IMPOT
+from .trace_performance import TRACE_INACTIVE
 
 # Taux pour les dispositifs Pinel
 PINEL_RATES = {
@@ -31,327 +35,620 @@ def _preparer_donnees_initiales(adultes_df, enfants_df, annee_actuelle):
         
     return adultes_df_sim, enfants_df_sim
 
-def _gerer_ventes_immobilieres(annee, ventes_df, sim_patrimoine, historique_achat, echeanciers, prets_df):
-    """Gère la vente de biens immobiliers pour une année donnée."""
-    cash_flow_exceptionnel = 0
-    logs = []
-    
-    ventes_de_lannee = ventes_df[ventes_df['Année de Vente'] == annee]
-    for _, vente in ventes_de_lannee.iterrows():
-        nom_bien_vendu = vente['Bien à Vendre']
-        if nom_bien_vendu not in sim_patrimoine['Actif'].values:
-            continue
+def _facteurs_cumules(taux_pct, n_annees):
+    """Retourne le vecteur des facteurs de revalorisation cumulés (1, f, f², ...) sur `n_annees`."""
+    return np.cumprod(np.concatenate([[1.0], np.full(max(n_annees - 1, 0), 1 + taux_pct / 100)]))[:n_annees]
 
-        idx_bien = sim_patrimoine[sim_patrimoine['Actif'] == nom_bien_vendu].index[0]
-        prix_de_vente = sim_patrimoine.loc[idx_bien, 'Valeur Brute']
-        donnees_achat = historique_achat.loc[historique_achat['Actif'] == nom_bien_vendu].iloc[0]
-        
-        impot_pv, _, details_pv = calculer_plus_value_immobiliere_fr(
-            prix_achat=donnees_achat['Prix Achat Initial'], 
-            prix_vente=prix_de_vente, 
-            date_achat=pd.to_datetime(donnees_achat['Date Achat']), 
-            date_vente=datetime(annee, 12, 31), 
-            est_residence_principale="jouissance" in donnees_achat['Type']
-        )
-
-        crd_rembourse = 0
-        prets_associes = prets_df[prets_df['Actif Associé'] == nom_bien_vendu]
-        for id_pret in prets_associes.index:
-            if id_pret in echeanciers and annee in echeanciers[id_pret].index:
-                crd_rembourse += echeanciers[id_pret].loc[annee, 'CRD']
-            echeanciers.pop(id_pret, None)
-            
-        cash_net = prix_de_vente - impot_pv - crd_rembourse
-        cash_flow_exceptionnel += cash_net
-        sim_patrimoine = sim_patrimoine.drop(idx_bien).reset_index(drop=True)
-        
-        logs.append(f"**{annee}**: Vente de '{nom_bien_vendu}' pour {prix_de_vente:,.0f}€. Cash net : **{cash_net:,.0f}€**. {details_pv}")
-        
-    return sim_patrimoine, cash_flow_exceptionnel, echeanciers, logs
+def _numerique(df, colonne, defaut=0.0):
+    """Extrait une colonne numérique d'un DataFrame sous forme de tableau NumPy (NaN si non convertible)."""
+    if colonne not in df.columns:
+        return np.full(len(df), defaut, dtype=float)
+    return pd.to_numeric(df[colonne], errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
 
-def _calculer_revenus_et_statuts_adultes(annee, adultes_df_sim, sim_revenus, df_pension_hypotheses, indices_salaires):
+def _compiler_ventes(annees, ventes_df, stocks_df):
     """
-    Calcule les revenus (salaires, pensions) et détermine le statut de chaque adulte pour une année donnée.
+    Compile les ventes planifiées en événements : pour chaque année, la liste des lignes de `stocks_df` vendues.
+    Comme dans la simulation année par année, une vente porte sur la première ligne encore détenue portant le nom
+    du bien ; une vente d'un bien absent (ou déjà vendu) est ignorée.
+    Retourne (ventes_par_annee, annee_vente) où `annee_vente` vaut +inf pour les biens jamais vendus.
     """
-    salaires_annuels = 0
-    pensions_annuelles = 0
-    adultes_details_list = []
-    statuts_adultes = {}
-
-    for i, (_, adulte) in enumerate(adultes_df_sim.iterrows()):
-        nom_adulte = adulte['Prénom']
-        revenu_adulte_annee = 0
-        statut_adulte = "Actif"
-
-        est_retraite = False
-        if not df_pension_hypotheses.empty:
-            hypothese_retraite = df_pension_hypotheses[
-                (df_pension_hypotheses['Prénom Adulte'] == nom_adulte) &
-                (df_pension_hypotheses['Active'] == True) &
-                (pd.notna(df_pension_hypotheses['Année Départ Retraite'])) &
-                (df_pension_hypotheses['Année Départ Retraite'] <= annee)
-            ]
-            if not hypothese_retraite.empty:
-                est_retraite = True
-                pension = hypothese_retraite.iloc[0]['Montant Pension Annuelle (€)']
-                revenu_adulte_annee = pension
-                pensions_annuelles += pension
-                statut_adulte = "Retraité"
-
-        if not est_retraite:
-            if i < len(indices_salaires):
-                idx_salaire = indices_salaires[i]
-                salaire = sim_revenus.loc[idx_salaire, 'Montant Annuel']
-                revenu_adulte_annee = salaire
-                salaires_annuels += salaire
-        
-        statuts_adultes[nom_adulte] = statut_adulte
-        adultes_details_list.append({
-            'revenu': revenu_adulte_annee,
-            'annee_naissance': adulte['Année Naissance']
-        })
+    annees_set = set(int(a) for a in annees)
+    annee_vente = np.full(len(stocks_df), np.inf)
+    ventes_par_annee = {}
+    if ventes_df.empty or stocks_df.empty:
+        return ventes_par_annee, annee_vente
+
+    noms_actifs = stocks_df['Actif'].tolist()
+    ventes = [(annee, ordre, nom) for ordre, (nom, annee) in enumerate(zip(ventes_df['Bien à Vendre'], ventes_df['Année de Vente'])) if annee in annees_set]
+    for annee, _, nom in sorted(ventes, key=lambda v: (v[0], v[1])):
+        ligne = next((j for j, nom_actif in enumerate(noms_actifs) if nom_actif == nom and np.isinf(annee_vente[j])), None)
+        if ligne is None:
+            continue
+        annee_vente[ligne] = int(annee)
+        ventes_par_annee.setdefault(int(annee), []).append(ligne)
+    return ventes_par_annee, annee_vente
+
+def _compiler_reductions_fiscales(stocks_df):
+    """Liste les réductions d'impôt (Pinel) des biens productifs défiscalisés, avec leur période d'application."""
+    reductions_fiscales_actives = []
+    df_immo_productif_defisc = stocks_df[
+        (stocks_df['Type'] == 'Immobilier productif') &
+        (stocks_df['Dispositif Fiscal'].notna()) &
+        (stocks_df['Dispositif Fiscal'] != '') &
+        (stocks_df['Dispositif Fiscal'] != 'Aucun') &
+        (pd.to_numeric(stocks_df['Durée Défiscalisation (ans)'], errors='coerce').fillna(0) > 0)
+    ].copy()
+
+    for _, bien in df_immo_productif_defisc.iterrows():
+        dispositif = bien['Dispositif Fiscal']
+        duree_defisc = int(bien['Durée Défiscalisation (ans)'])
+        prix_achat = bien['Prix Achat Initial']
+        date_achat = pd.to_datetime(bien['Date Achat'])
         
-    return salaires_annuels, pensions_annuelles, adultes_details_list, statuts_adultes
+        reduction_annuelle = 0.0
+        if pd.notna(date_achat):
+            annee_debut, annee_fin = date_achat.year, date_achat.year + duree_defisc - 1
+            if "Pinel" in str(dispositif) and dispositif in PINEL_RATES and duree_defisc in PINEL_RATES[dispositif]:
+                taux_total = PINEL_RATES[dispositif][duree_defisc]
+                reduction_annuelle = (min(prix_achat, 300000) * taux_total) / duree_defisc
+            
+            if reduction_annuelle > 0:
+                reductions_fiscales_actives.append({'nom_bien': bien['Actif'], 'reduction_annuelle': reduction_annuelle, 'annee_debut': annee_debut, 'annee_fin': annee_fin})
+    return reductions_fiscales_actives
 
-def _calculer_depenses_et_statuts_enfants(annee, enfants_df_sim):
+def _compiler_entrees_projection(annees, stocks_df, revenus_df, depenses_df, adultes_df_sim, enfants_df_sim, df_pension_hypotheses, ventes_df, hyp_economiques):
     """
-    Calcule les dépenses d'études et détermine le statut de chaque enfant pour une année donnée.
+    Compile une fois pour toutes les entrées de la projection en tableaux NumPy indexés par année :
+    salaires de base et années de retraite par adulte, facteurs d'inflation et de revalorisation cumulés,
+    fenêtres d'études des enfants, biens détenus année par année (ventes) et montants de base des flux.
     """
-    depenses_etudes = 0
-    enfants_a_charge_details = []
-    statuts_enfants = {}
+    n_annees = len(annees)
+    facteur_inflation = _facteurs_cumules(hyp_economiques.get('inflation', 0.0), n_annees)
+    facteur_revalo = _facteurs_cumules(hyp_economiques.get('revalo_salaire', 0.0), n_annees)
+
+    # Revenus : lignes de salaire (affectées aux adultes dans l'ordre) et autres revenus indexés sur l'inflation
+    postes = revenus_df['Poste']
+    est_salaire = postes.str.contains('Salaire', na=False).to_numpy(dtype=bool)
+    montants_revenus = _numerique(revenus_df, 'Montant Annuel')
+    est_loyer_saisi = (postes == 'Revenus Locatifs (calculé)').to_numpy(dtype=bool)
+    salaires_base = montants_revenus[est_salaire]
+
+    # Adultes : salaire revalorisé jusqu'à la retraite, puis pension de la première hypothèse active atteinte
+    n_adultes = len(adultes_df_sim)
+    est_retraite = np.zeros((n_adultes, n_annees), dtype=bool)
+    pensions = np.zeros((n_adultes, n_annees))
+    salaires = np.zeros((n_adultes, n_annees))
+    for i, nom_adulte in enumerate(adultes_df_sim['Prénom']):
+        if i < len(salaires_base):
+            salaires[i] = salaires_base[i] * facteur_revalo
+        if df_pension_hypotheses.empty:
+            continue
+        hypotheses = df_pension_hypotheses[
+            (df_pension_hypotheses['Prénom Adulte'] == nom_adulte) &
+            (df_pension_hypotheses['Active'] == True) &
+            (pd.notna(df_pension_hypotheses['Année Départ Retraite']))
+        ]
+        # Parcours inverse : la première hypothèse (ordre du tableau) déjà atteinte l'emporte
+        for annee_depart, montant in reversed(list(zip(hypotheses['Année Départ Retraite'], hypotheses['Montant Pension Annuelle (€)']))):
+            atteinte = annees >= annee_depart
+            est_retraite[i, atteinte] = True
+            pensions[i, atteinte] = montant
+
+    # Enfants : fenêtres d'études et années à charge
+    enfants_records = enfants_df_sim.to_dict('records') if not enfants_df_sim.empty else []
+    if enfants_records:
+        ages = annees[None, :] - _numerique(enfants_df_sim, 'Année Naissance', np.nan)[:, None]
+        debut_etudes = _numerique(enfants_df_sim, 'Âge Début Études', np.nan)[:, None]
+        fin_etudes = debut_etudes + _numerique(enfants_df_sim, 'Durée Études (ans)', np.nan)[:, None]
+        est_etudiant = (debut_etudes <= ages) & (ages < fin_etudes)
+        a_fini_etudes = ages >= fin_etudes
+        a_charge = annees[None, :] < _numerique(enfants_df_sim, 'Année Fin Études', np.nan)[:, None]
+        couts_etudes = _numerique(enfants_df_sim, 'Coût Annuel Études (€)')
+    else:
+        est_etudiant = a_fini_etudes = a_charge = np.zeros((0, n_annees), dtype=bool)
+        couts_etudes = np.zeros(0)
 
-    if not enfants_df_sim.empty:
-        for _, enfant in enfants_df_sim.iterrows():
-            nom_enfant = enfant['Prénom']
-            age_enfant = annee - enfant['Année Naissance']
-            statut_enfant = "Scolarisé"
-
-            est_etudiant = enfant['Âge Début Études'] <= age_enfant < (enfant['Âge Début Études'] + enfant['Durée Études (ans)'])
-            a_fini_etudes = age_enfant >= (enfant['Âge Début Études'] + enfant['Durée Études (ans)'])
-
-            if est_etudiant:
-                statut_enfant = "Étudiant"
-                depenses_etudes += enfant['Coût Annuel Études (€)']
-            elif a_fini_etudes:
-                statut_enfant = "Fin d'études"
-            
-            statuts_enfants[nom_enfant] = statut_enfant
+    # Biens : détention année par année (après les ventes de l'année), loyers et charges
+    ventes_par_annee, annee_vente = _compiler_ventes(annees, ventes_df, stocks_df)
+    types_actifs = stocks_df['Type'].to_numpy(dtype=object)
+    loyers_annuels = np.where(types_actifs == 'Immobilier productif', np.nan_to_num(_numerique(stocks_df, 'Loyer Mensuel Brut (€)')) * 12, 0.0)
+    charges_biens = np.nan_to_num(_numerique(stocks_df, 'Charges Annuelles (€)')) + np.nan_to_num(_numerique(stocks_df, 'Taxe Foncière Annuelle (€)'))
 
-            if annee < enfant['Année Fin Études']:
-                enfants_a_charge_details.append(enfant.to_dict())
-    
-    return depenses_etudes, enfants_a_charge_details, statuts_enfants
+    return {
+        'annees': annees,
+        'facteur_inflation': facteur_inflation,
+        'salaires': salaires,
+        'est_retraite': est_retraite,
+        'pensions': pensions,
+        'prenoms_adultes': adultes_df_sim['Prénom'].tolist(),
+        'annees_naissance_adultes': adultes_df_sim['Année Naissance'].tolist(),
+        'enfants_records': enfants_records,
+        'est_etudiant': est_etudiant,
+        'a_fini_etudes': a_fini_etudes,
+        'a_charge': a_charge,
+        'couts_etudes': couts_etudes,
+        'loyers_saisis_base': np.nansum(montants_revenus[est_loyer_saisi]),
+        'autres_revenus_base': np.nansum(montants_revenus[~est_salaire & ~est_loyer_saisi]),
+        'charges_courantes_base': np.nansum(_numerique(depenses_df, 'Montant Annuel')),
+        'ventes_par_annee': ventes_par_annee,
+        'detenu': annees[None, :] < annee_vente[:, None],
+        'loyers_annuels': loyers_annuels,
+        'charges_biens': charges_biens,
+    }
 
-def _calculer_autres_flux(sim_revenus, charges_courantes_df):
+def _calculer_flux_annuels(entrees, est_parent_isole):
     """
-    Calcule les revenus non liés aux personnes (locatifs, autres) et les charges courantes.
+    Calcule en une fois, sous forme de vecteurs sur toutes les années, les revenus (salaires, pensions, loyers,
+    autres), les dépenses (charges courantes, études, charges immobilières), les statuts et les foyers fiscaux.
     """
-    loyers_locatifs = sim_revenus[sim_revenus['Poste'] == 'Revenus Locatifs (calculé)']['Montant Annuel'].sum()
-    
-    autres_revenus = sim_revenus[
-        (~sim_revenus['Poste'].str.contains('Salaire', na=False)) &
-        (sim_revenus['Poste'] != 'Revenus Locatifs (calculé)')
-    ]['Montant Annuel'].sum()
-    
-    charges_courantes = charges_courantes_df['Montant Annuel'].sum()
-    
-    return loyers_locatifs, autres_revenus, charges_courantes
+    annees, inflation = entrees['annees'], entrees['facteur_inflation']
+    est_retraite = entrees['est_retraite']
 
-def _calculer_flux_annuels(annee, adultes_df_sim, enfants_df_sim, sim_revenus, charges_courantes_df, df_pension_hypotheses, indices_salaires):
-    """
-    Orchestre le calcul des revenus et dépenses pour une année.
-    """
-    salaires, pensions, adultes_details, statuts_adultes = _calculer_revenus_et_statuts_adultes(
-        annee, adultes_df_sim, sim_revenus, df_pension_hypotheses, indices_salaires
-    )
-    depenses_etudes, enfants_details, statuts_enfants = _calculer_depenses_et_statuts_enfants(
-        annee, enfants_df_sim
-    )
-    loyers, autres_revs, charges_base = _calculer_autres_flux(
-        sim_revenus, charges_courantes_df
-    )
-    total_revenus = salaires + pensions + loyers + autres_revs
-    total_depenses = charges_base + depenses_etudes
-    statuts_annee = {**statuts_adultes, **statuts_enfants}
+    revenus_adultes = np.where(est_retraite, entrees['pensions'], entrees['salaires'])
+    salaires = np.where(est_retraite, 0.0, entrees['salaires']).sum(axis=0)
+    pensions = np.where(est_retraite, entrees['pensions'], 0.0).sum(axis=0)
 
+    loyers_calcules = (entrees['detenu'] * entrees['loyers_annuels'][:, None]).sum(axis=0)
+    loyers_locatifs = entrees['loyers_saisis_base'] * inflation + np.where(loyers_calcules > 0, loyers_calcules, 0.0)
+    autres_revenus = entrees['autres_revenus_base'] * inflation
+
+    depenses_etudes = (entrees['est_etudiant'] * entrees['couts_etudes'][:, None]).sum(axis=0)
+    charges_immo = (entrees['detenu'] * entrees['charges_biens'][:, None]).sum(axis=0) * inflation
+
+    statuts = {}
+    for i, nom_adulte in enumerate(entrees['prenoms_adultes']):
+        statuts[nom_adulte] = np.where(est_retraite[i], "Retraité", "Actif")
+    for k, enfant in enumerate(entrees['enfants_records']):
+        statuts[enfant['Prénom']] = np.where(entrees['est_etudiant'][k], "Étudiant", np.where(entrees['a_fini_etudes'][k], "Fin d'études", "Scolarisé"))
+
+    total_revenus = salaires + pensions + loyers_locatifs + autres_revenus
     return {
         "total_revenus": total_revenus,
         "salaires": salaires,
         "pensions": pensions,
-        "loyers_locatifs": loyers,
-        "autres_revenus": autres_revs,
-        "total_depenses": total_depenses,
-        "adultes_details": adultes_details,
-        "enfants_details": enfants_details,
-        "statuts_annee": statuts_annee
+        "loyers_locatifs": loyers_locatifs,
+        "autres_revenus": autres_revenus,
+        "total_depenses": entrees['charges_courantes_base'] * inflation + depenses_etudes + charges_immo,
+        "statuts": statuts,
+        "foyers_pour_impot": _foyers_fiscaux(entrees, total_revenus, revenus_adultes, est_parent_isole),
     }
 
-def _calculer_paiements_prets_annuels(annee, echeanciers, prets_df, asset_to_type_map):
-    """Calcule les mensualités et le passif total pour une année, ventilé par type d'actif."""
-    mensualites_annuelles = 0
-    passif_total = 0
-    passif_jouissance = 0
-    passif_productif = 0
-
-    for idx, echeancier in echeanciers.items():
-        if not echeancier.empty and annee in echeancier.index:
-            if 'Mensualités Annuelles' in echeancier.columns:
-                mensualites_annuelles += echeancier.loc[annee, 'Mensualités Annuelles']
-            
-            crd = echeancier.loc[annee, 'CRD']
-            passif_total += crd
-
-            actif_associe = prets_df.loc[idx, 'Actif Associé']
-            if actif_associe in asset_to_type_map:
-                asset_type = asset_to_type_map[actif_associe]
-                if 'jouissance' in asset_type:
-                    passif_jouissance += crd
-                elif 'productif' in asset_type:
-                    passif_productif += crd
-
-    return mensualites_annuelles, passif_total, passif_jouissance, passif_productif
-
-def _mettre_a_jour_patrimoine(sim_patrimoine, reste_a_vivre, passif_total):
-    """Applique l'évolution annuelle au patrimoine (rendement et injection du cash-flow)."""
-    if not sim_patrimoine.empty:
-        sim_patrimoine['Valeur Brute'] *= (1 + sim_patrimoine['Rendement %'] / 100)
-        
-        if 'Financier' in sim_patrimoine['Type'].values:
-            idx_financier = sim_patrimoine[sim_patrimoine['Type'] == 'Financier'].index[0]
-            sim_patrimoine.loc[idx_financier, 'Valeur Brute'] += reste_a_vivre
-        else:
-            sim_patrimoine.iloc[0, sim_patrimoine.columns.get_loc('Valeur Brute')] += reste_a_vivre
-        
-        valeur_immo_jouissance_gross = sim_patrimoine[sim_patrimoine['Type'] == 'Immobilier de jouissance']['Valeur Brute'].sum()
-        valeur_immo_productif_gross = sim_patrimoine[sim_patrimoine['Type'] == 'Immobilier productif']['Valeur Brute'].sum()
-        valeur_financier_gross = sim_patrimoine[sim_patrimoine['Type'] == 'Financier']['Valeur Brute'].sum()
-        
-        actifs_totaux = sim_patrimoine['Valeur Brute'].sum()
+def _foyers_fiscaux(entrees, total_revenus, revenus_adultes, est_parent_isole):
+    """Décrit le foyer fiscal de chaque année (revenus, adultes, enfants à charge) pour `calculer_impots`."""
+    return [{
+        'revenus_imposables': total_revenus[t],
+        'adultes_details': [{'revenu': float(revenus_adultes[i, t]), 'annee_naissance': naissance} for i, naissance in enumerate(entrees['annees_naissance_adultes'])],
+        'enfants_details': [enfant for k, enfant in enumerate(entrees['enfants_records']) if entrees['a_charge'][k, t]],
+        'est_parent_isole': est_parent_isole
+    } for t in range(len(total_revenus))]
+
+def _reduction_fiscale_annuelle(annees, reductions_fiscales):
+    """Montant annuel des réductions d'impôt en cours, année par année."""
+    reduction_fiscale = np.zeros(len(annees))
+    for red in reductions_fiscales:
+        reduction_fiscale += np.where((red['annee_debut'] <= annees) & (annees <= red['annee_fin']), red['reduction_annuelle'], 0.0)
+    return reduction_fiscale
+
+# Types d'événements du calendrier, dans leur ordre de traitement au sein d'une même année
+TYPES_EVENEMENTS = ('vente', 'retraite', 'debut_etudes', 'fin_etudes', 'fin_pret', 'fin_reduction_fiscale')
+# Événements modifiant l'état du patrimoine (biens détenus, prêts en cours) : ils interrompent la progression par blocs.
+# Les autres sont déjà intégrés aux flux vectorisés : ils sont seulement consignés au journal de la projection.
+EVENEMENTS_PATRIMOINE = ('vente',)
+MESSAGES_EVENEMENTS = {
+    'retraite': "{cible} part à la retraite.",
+    'debut_etudes': "{cible} commence ses études supérieures.",
+    'fin_etudes': "{cible} termine ses études.",
+    'fin_pret': "Dernière année de remboursement du prêt adossé à '{cible}'.",
+    'fin_reduction_fiscale': "Dernière année de réduction d'impôt pour '{cible}'.",
+}
+
+def _transitions(masques):
+    """Indices (ligne, année) où un masque booléen (lignes × années) passe à vrai, hors première année."""
+    return np.argwhere(masques[:, 1:] & ~masques[:, :-1]) + (0, 1)
+
+def _compiler_calendrier(annees, entrees, portefeuille, reductions_fiscales, stocks_df):
+    """
+    Compile les entrées en une file d'événements triée par année : ventes, départs à la retraite, début et fin
+    d'études, fin de remboursement d'un prêt et fin d'une période de réduction d'impôt. Chaque événement est un
+    dictionnaire {'annee', 'indice' (position dans `annees`), 'type', 'cible'} ; les ventes portent aussi la
+    'ligne' du bien dans `stocks_df`, les fins de prêt la position du 'pret' dans le portefeuille.
+    """
+    premiere_annee, n_annees = int(annees[0]), len(annees)
+    evenements = []
+
+    def ajouter(indice, type_evenement, cible, **details):
+        evenements.append({'annee': premiere_annee + int(indice), 'indice': int(indice), 'type': type_evenement, 'cible': cible, **details})
+
+    for annee, lignes in entrees['ventes_par_annee'].items():
+        for ligne in lignes:
+            ajouter(annee - premiere_annee, 'vente', stocks_df['Actif'].iat[ligne], ligne=ligne)
+    for i, t in _transitions(entrees['est_retraite']):
+        ajouter(t, 'retraite', entrees['prenoms_adultes'][i])
+    prenoms_enfants = [enfant['Prénom'] for enfant in entrees['enfants_records']]
+    for k, t in _transitions(entrees['est_etudiant']):
+        ajouter(t, 'debut_etudes', prenoms_enfants[k])
+    for k, t in _transitions(entrees['a_fini_etudes'] & ~entrees['est_etudiant']):
+        ajouter(t, 'fin_etudes', prenoms_enfants[k])
+    for k in np.flatnonzero((premiere_annee <= portefeuille.annee_fin) & (portefeuille.annee_fin < premiere_annee + n_annees)):
+        ajouter(int(portefeuille.annee_fin[k]) - premiere_annee, 'fin_pret', portefeuille.actifs_associes[k], pret=int(k))
+    for red in reductions_fiscales:
+        if premiere_annee <= red['annee_fin'] < premiere_annee + n_annees:
+            ajouter(red['annee_fin'] - premiere_annee, 'fin_reduction_fiscale', red['nom_bien'])
+
+    # Tri stable : l'ordre de saisie est conservé entre événements de même année et de même type
+    return sorted(evenements, key=lambda e: (e['indice'], TYPES_EVENEMENTS.index(e['type'])))
+
+class PortefeuillePrets:
+    """
+    Prêts de la projection en matrices denses (prêts × années de la projection) : mensualités annuelles (assurance
+    comprise) et capital restant dû de fin d'année, nuls hors de la période de remboursement. Les prêts sont repérés
+    par leur position dans `prets_df` ; `jouissance` et `productif` indexent les prêts selon le type du bien associé.
+
+    Les matrices ne changent pas pendant la simulation : les remboursements anticipés (ventes) sont portés par un
+    masque des prêts en cours, propre à chaque simulation, qui revient à mettre à zéro les lignes des prêts soldés.
+    """
+    def __init__(self, annees, prets_df, asset_to_type_map):
+        n_prets, n_annees = len(prets_df), len(annees)
+        self.mensualites = np.zeros((n_prets, n_annees))
+        self.crd = np.zeros((n_prets, n_annees))
+        self.actif = np.zeros((n_prets, n_annees), dtype=bool)
+        self.annee_fin = np.full(n_prets, np.nan)
+        self.actifs_associes = prets_df['Actif Associé'].to_numpy(dtype=object) if n_prets else np.zeros(0, dtype=object)
+        if n_prets:
+            annees_prets, valeurs = agreger_echeanciers_annuels(calculer_echeanciers_mensuels_prets(prets_df))
+            _, indices_projection, indices_prets = np.intersect1d(annees, annees_prets, return_indices=True)
+            self.mensualites[:, indices_projection] = valeurs['Mensualités Annuelles'][:, indices_prets]
+            self.crd[:, indices_projection] = valeurs['CRD'][:, indices_prets]
+            self.actif[:, indices_projection] = valeurs['actif'][:, indices_prets]
+            # Dernière année de remboursement, y compris au-delà de l'horizon de projection
+            a_echeances = valeurs['actif'].any(axis=1)
+            self.annee_fin[a_echeances] = annees_prets[valeurs['actif'].shape[1] - 1 - valeurs['actif'][a_echeances, ::-1].argmax(axis=1)]
+
+        types_associes = [str(asset_to_type_map.get(actif, '')) for actif in self.actifs_associes]
+        self.jouissance = np.array(['jouissance' in t for t in types_associes], dtype=bool)
+        self.productif = np.array(['jouissance' not in t and 'productif' in t for t in types_associes], dtype=bool)
+
+    def prets_en_cours(self, biens_vendus=()):
+        """Masque des prêts en cours une fois soldés les prêts adossés aux biens `biens_vendus`."""
+        return ~np.isin(self.actifs_associes, list(biens_vendus))
+
+    def solder(self, en_cours, nom_bien, t):
+        """
+        Rembourse par anticipation, l'année d'indice `t`, les prêts adossés au bien `nom_bien` : retourne leur capital
+        restant dû de fin d'année et les retire de `en_cours` (mis à jour sur place) à partir de cette année.
+        """
+        prets_du_bien = self.actifs_associes == nom_bien
+        crd_rembourse = self.crd[prets_du_bien & en_cours, t].sum()
+        en_cours[prets_du_bien] = False
+        return crd_rembourse
+
+    def totaux(self, en_cours, debut, fin):
+        """
+        Mensualités, passif total, passif jouissance et passif productif des prêts en cours pour les années
+        d'indices `debut` à `fin` exclu (sommes par colonne des matrices masquées).
+        """
+        crd = self.crd[:, debut:fin]
+        return (self.mensualites[en_cours, debut:fin].sum(axis=0), crd[en_cours].sum(axis=0),
+                crd[en_cours & self.jouissance].sum(axis=0), crd[en_cours & self.productif].sum(axis=0))
+
+def _gerer_ventes_immobilieres(annee, t, lignes_vendues, valeurs, detenus, historique_achat, portefeuille, prets_en_cours):
+    """
+    Gère la vente des biens (lignes de `valeurs`) cédés pendant l'année d'indice `t` et solde leurs prêts.
+    Les plus-values de toutes les ventes de l'année sont calculées en un seul appel vectorisé.
+    """
+    cash_flow_exceptionnel = 0
+    logs = []
+    if len(lignes_vendues) == 0:
+        return cash_flow_exceptionnel, logs
+
+    noms_biens_vendus = historique_achat['Actif'].to_numpy()[lignes_vendues]
+    # Données d'achat de la première ligne portant le nom de chaque bien vendu
+    donnees_achat = historique_achat.drop_duplicates('Actif').set_index('Actif').loc[noms_biens_vendus]
+    est_residence_principale = donnees_achat['Type'].str.contains('jouissance', regex=False).to_numpy(dtype=bool)
+    plus_values = calculer_plus_values_immobilieres_fr(
+        prix_achat=pd.to_numeric(donnees_achat['Prix Achat Initial']).to_numpy(dtype=float),
+        prix_vente=valeurs[lignes_vendues],
+        date_achat=pd.to_datetime(donnees_achat['Date Achat']).to_numpy(),
+        date_vente=np.datetime64(f"{annee}-12-31"),
+        est_residence_principale=est_residence_principale
+    )
+
+    for i, (ligne, nom_bien_vendu) in enumerate(zip(lignes_vendues, noms_biens_vendus)):
+        prix_de_vente = valeurs[ligne]
+        details_pv = details_plus_value_immobiliere(plus_values['plus_value_brute'][i], plus_values['impot_ir'][i], plus_values['impot_ps'][i], est_residence_principale[i])
+        crd_rembourse = portefeuille.solder(prets_en_cours, nom_bien_vendu, t)
+        cash_net = prix_de_vente - plus_values['impot_total'][i] - crd_rembourse
+        cash_flow_exceptionnel += cash_net
+        detenus[ligne] = False
+
+        logs.append(f"**{annee}**: Vente de '{nom_bien_vendu}' pour {prix_de_vente:,.0f}€. Cash net : **{cash_net:,.0f}€**. {details_pv}")
+
+    return cash_flow_exceptionnel, logs
+
+def _mettre_a_jour_patrimoine(valeurs, detenus, facteurs_rendement, types_actifs, reste_a_vivre, passif_total):
+    """
+    Applique l'évolution annuelle au patrimoine (rendement et injection du cash-flow) sur les biens détenus.
+    `valeurs` et `facteurs_rendement` sont indexés par bien sur leur dernier axe : un vecteur pour la projection
+    déterministe, une matrice (trajectoires × biens) pour la projection Monte Carlo.
+    """
+    if detenus.any():
+        valeurs[..., detenus] *= facteurs_rendement[..., detenus]
+
+        financiers = detenus & (types_actifs == 'Financier')
+        idx_injection = np.flatnonzero(financiers)[0] if financiers.any() else np.flatnonzero(detenus)[0]
+        valeurs[..., idx_injection] += reste_a_vivre
+
+        valeur_immo_jouissance_gross = np.nansum(valeurs[..., detenus & (types_actifs == 'Immobilier de jouissance')], axis=-1)
+        valeur_immo_productif_gross = np.nansum(valeurs[..., detenus & (types_actifs == 'Immobilier productif')], axis=-1)
+        valeur_financier_gross = np.nansum(valeurs[..., financiers], axis=-1)
+
+        actifs_totaux = np.nansum(valeurs[..., detenus], axis=-1)
         patrimoine_net = actifs_totaux - passif_total
     else:
         patrimoine_net = reste_a_vivre - passif_total
-        actifs_totaux = max(0, reste_a_vivre)
-        valeur_immo_jouissance_gross, valeur_immo_productif_gross, valeur_financier_gross = 0, 0, actifs_totaux
+        actifs_totaux = np.maximum(0, reste_a_vivre)
+        valeur_immo_jouissance_gross, valeur_immo_productif_gross, valeur_financier_gross = 0 * actifs_totaux, 0 * actifs_totaux, actifs_totaux
 
-    return patrimoine_net, actifs_totaux, valeur_financier_gross, valeur_immo_jouissance_gross, valeur_immo_productif_gross, sim_patrimoine
+    return patrimoine_net, actifs_totaux, valeur_financier_gross, valeur_immo_jouissance_gross, valeur_immo_productif_gross
 
-def generer_projection_complete(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df):
+def _avancer_patrimoine(valeurs, detenus, facteurs_rendement, types_actifs, reste_a_vivre, passif_total):
     """
-    Fonction principale orchestrant la projection financière année par année.
+    Équivalent de `_mettre_a_jour_patrimoine` appliqué à un bloc d'années sans événement (biens détenus inchangés) :
+    chaque bien détenu évolue par ses facteurs de rendement cumulés et le bien recevant le cash-flow suit
+    v ← v·f + reste à vivre. `reste_a_vivre` et `passif_total` sont des vecteurs sur les années du bloc ;
+    `valeurs` est mis à jour sur place à sa valeur de fin de bloc.
+    Retourne les indicateurs annuels (mêmes grandeurs que `_mettre_a_jour_patrimoine`) et la trajectoire
+    (années × biens) des valeurs de fin d'année.
     """
-    annee_actuelle = datetime.now().year
-    annees_projection = range(annee_actuelle, annee_actuelle + duree)
-    
-    inflation_factor = 1 + hyp_economiques.get('inflation', 0.0) / 100
-    revalo_salaire_factor = 1 + hyp_economiques.get('revalo_salaire', 0.0) / 100
-    
+    n_annees = len(reste_a_vivre)
+    if not detenus.any():
+        patrimoine_net = reste_a_vivre - passif_total
+        actifs_totaux = np.maximum(0, reste_a_vivre)
+        return (patrimoine_net, actifs_totaux, actifs_totaux, 0 * actifs_totaux, 0 * actifs_totaux), np.repeat(valeurs[None, :], n_annees, axis=0)
+
+    facteurs = np.where(detenus, facteurs_rendement, 1.0)
+    trajectoire = np.cumprod(np.vstack([valeurs, np.broadcast_to(facteurs, (n_annees, len(valeurs)))]), axis=0)[1:]
+
+    financiers = detenus & (types_actifs == 'Financier')
+    idx_injection = np.flatnonzero(financiers)[0] if financiers.any() else np.flatnonzero(detenus)[0]
+    valeur, facteur = valeurs[idx_injection], facteurs[idx_injection]
+    for j in range(n_annees):
+        valeur = valeur * facteur + reste_a_vivre[j]
+        trajectoire[j, idx_injection] = valeur
+    valeurs[:] = trajectoire[-1]
+
+    valeur_immo_jouissance_gross = np.nansum(trajectoire[:, detenus & (types_actifs == 'Immobilier de jouissance')], axis=1)
+    valeur_immo_productif_gross = np.nansum(trajectoire[:, detenus & (types_actifs == 'Immobilier productif')], axis=1)
+    valeur_financier_gross = np.nansum(trajectoire[:, financiers], axis=1)
+    actifs_totaux = np.nansum(trajectoire[:, detenus], axis=1)
+    return (actifs_totaux - passif_total, actifs_totaux, valeur_financier_gross, valeur_immo_jouissance_gross, valeur_immo_productif_gross), trajectoire
+
+def _preparer_projection(annees, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot, trace=TRACE_INACTIVE):
+    """
+    Prépare tout ce qui ne dépend pas de l'évolution des actifs : entrées compilées, flux annuels,
+    impôt de toutes les années (en un seul appel), réductions fiscales, portefeuille des prêts et calendrier des événements.
+    """
+    with trace.etape('_compiler_entrees_projection'):
+        entrees = _compiler_entrees_projection(annees, stocks_df, revenus_df, depenses_df, *_preparer_donnees_initiales(adultes_df, enfants_df, int(annees[0])), df_pension_hypotheses, ventes_df, hyp_economiques)
+    with trace.etape('_calculer_flux_annuels'):
+        flux = _calculer_flux_annuels(entrees, est_parent_isole)
+
+    with trace.etape('calculer_impots', moteur=moteur_impot, foyers=len(flux["foyers_pour_impot"])) as details:
+        # Écart des compteurs du cache d'impôt partagé (approximatif si d'autres sessions calculent en même temps)
+        stats_avant = CACHE_IMPOT.statistiques()
+        impots_avant_reduction = calculer_impots(annees.tolist(), flux["foyers_pour_impot"], moteur=moteur_impot)
+        stats_apres = CACHE_IMPOT.statistiques()
+        details.update(cache_hits=stats_apres['hits'] - stats_avant['hits'], cache_misses=stats_apres['misses'] - stats_avant['misses'])
+    reductions_fiscales = _compiler_reductions_fiscales(stocks_df)
+    reduction_fiscale = _reduction_fiscale_annuelle(annees, reductions_fiscales)
+
+    impots = np.maximum(0, impots_avant_reduction - reduction_fiscale)
     asset_to_type_map = pd.Series(stocks_df.Type.values, index=stocks_df.Actif).to_dict()
+    with trace.etape('PortefeuillePrets', prets=len(prets_df)):
+        portefeuille = PortefeuillePrets(annees, prets_df, asset_to_type_map)
+    with trace.etape('_compiler_calendrier'):
+        calendrier = _compiler_calendrier(annees, entrees, portefeuille, reductions_fiscales, stocks_df)
+    return {
+        'entrees': entrees,
+        'flux': flux,
+        'impots': impots,
+        'solde_hors_prets': flux["total_revenus"] - flux["total_depenses"] - impots,
+        'reduction_fiscale': reduction_fiscale,
+        'portefeuille': portefeuille,
+        'calendrier': calendrier,
+        'asset_to_type_map': asset_to_type_map,
+        'historique_achat': stocks_df[['Actif', 'Prix Achat Initial', 'Date Achat', 'Type']].copy(),
+    }
 
-    reductions_fiscales_actives = []
-    df_immo_productif_defisc = stocks_df[
-        (stocks_df['Type'] == 'Immobilier productif') &
-        (stocks_df['Dispositif Fiscal'].notna()) &
-        (stocks_df['Dispositif Fiscal'] != '') &
-        (stocks_df['Dispositif Fiscal'] != 'Aucun') &
-        (pd.to_numeric(stocks_df['Durée Défiscalisation (ans)'], errors='coerce').fillna(0) > 0)
-    ].copy()
+COLONNES_SEQUENTIELLES = ["Patrimoine Net", "Actifs Totaux", "Passifs Totaux", "Patrimoine Financier", "Immobilier Jouissance", "Immobilier Productif",
+                          "Passif Jouissance", "Passif Productif", "Mensualités Prêts", "Reste à Vivre", "Cash-flow Vente"]
 
-    for _, bien in df_immo_productif_defisc.iterrows():
-        dispositif = bien['Dispositif Fiscal']
-        duree_defisc = int(bien['Durée Défiscalisation (ans)'])
-        prix_achat = bien['Prix Achat Initial']
-        date_achat = pd.to_datetime(bien['Date Achat'])
-        
-        reduction_annuelle = 0.0
-        if pd.notna(date_achat):
-            annee_debut, annee_fin = date_achat.year, date_achat.year + duree_defisc - 1
-            if "Pinel" in str(dispositif) and dispositif in PINEL_RATES and duree_defisc in PINEL_RATES[dispositif]:
-                taux_total = PINEL_RATES[dispositif][duree_defisc]
-                reduction_annuelle = (min(prix_achat, 300000) * taux_total) / duree_defisc
-            
-            if reduction_annuelle > 0:
-                reductions_fiscales_actives.append({'nom_bien': bien['Actif'], 'reduction_annuelle': reduction_annuelle, 'annee_debut': annee_debut, 'annee_fin': annee_fin})
+def _etat_initial(stocks_df, preparation):
+    """État du patrimoine en début de projection : valeurs des biens, biens détenus et prêts en cours."""
+    return {
+        'valeurs': _numerique(stocks_df, 'Valeur Brute', np.nan),
+        'detenus': np.ones(len(stocks_df), dtype=bool),
+        'prets_en_cours': preparation['portefeuille'].prets_en_cours(),
+    }
 
-    echeanciers = {idx: generer_tableau_amortissement(p['Montant Initial'], p['Taux Annuel %'], p['Durée Initiale (ans)'], pd.to_datetime(p['Date Début']), p.get('Assurance Emprunteur %', 0)) for idx, p in prets_df.iterrows()}
-    
-    adultes_df_sim, enfants_df_sim = _preparer_donnees_initiales(adultes_df, enfants_df, annee_actuelle)
-    sim_revenus_base, sim_patrimoine, charges_courantes_df = revenus_df.copy(), stocks_df.copy(), depenses_df.copy()
-    historique_achat = stocks_df[['Actif', 'Prix Achat Initial', 'Date Achat', 'Type']].copy()
-    
-    projection_data, logs_evenements = [], []
+def _simuler_annees(t_debut, annees, preparation, stocks_df, etat, resultats, logs_evenements, points_de_controle=None, trace=TRACE_INACTIVE):
+    """
+    Partie séquentielle (ventes, prêts et accumulation du patrimoine) à partir de l'année d'indice `t_debut`,
+    pilotée par le calendrier : seules les années portant un événement modifiant le patrimoine interrompent
+    la progression, qui avance d'un bloc entre deux événements (`_avancer_patrimoine`).
+    Les autres événements du calendrier sont consignés au journal à leur année (une fin de prêt n'y figure
+    que si le prêt n'a pas été soldé par une vente).
+    `etat` est mis à jour sur place ; si `points_de_controle` est fourni, l'état de fin de chaque année y est ajouté.
+    """
+    solde_hors_prets = preparation['solde_hors_prets']
+    portefeuille, historique_achat = preparation['portefeuille'], preparation['historique_achat']
+    valeurs, detenus, prets_en_cours = etat['valeurs'], etat['detenus'], etat['prets_en_cours']
+    facteurs_rendement = 1 + _numerique(stocks_df, 'Rendement %', np.nan) / 100
+    types_actifs = stocks_df['Type'].to_numpy(dtype=object)
+
+    ventes_par_indice, journal_par_indice = {}, {}
+    for evenement in preparation['calendrier']:
+        if evenement['indice'] < t_debut:
+            continue
+        if evenement['type'] in EVENEMENTS_PATRIMOINE:
+            ventes_par_indice.setdefault(evenement['indice'], []).append(evenement['ligne'])
+        else:
+            journal_par_indice.setdefault(evenement['indice'], []).append(evenement)
+    bornes = sorted({t_debut, *ventes_par_indice, len(annees)})
 
-    for annee in annees_projection:
-        sim_patrimoine, cash_flow_vente, echeanciers, logs_vente = _gerer_ventes_immobilieres(annee, ventes_df, sim_patrimoine, historique_achat, echeanciers, prets_df)
+    for debut, fin in zip(bornes[:-1], bornes[1:]):
+        annee = int(annees[debut])
+        with trace.etape('_gerer_ventes_immobilieres', annee):
+            cash_flow_vente, logs_vente = _gerer_ventes_immobilieres(annee, debut, ventes_par_indice.get(debut, []), valeurs, detenus, historique_achat, portefeuille, prets_en_cours)
         logs_evenements.extend(logs_vente)
-        
-        # Calculer les charges immobilières pour l'année en cours sur les biens restants
-        charges_immo_annuelles = 0
-        if 'Charges Annuelles (€)' in sim_patrimoine.columns:
-            charges_immo_annuelles += pd.to_numeric(sim_patrimoine['Charges Annuelles (€)'], errors='coerce').fillna(0).sum()
-        if 'Taxe Foncière Annuelle (€)' in sim_patrimoine.columns:
-            charges_immo_annuelles += pd.to_numeric(sim_patrimoine['Taxe Foncière Annuelle (€)'], errors='coerce').fillna(0).sum()
-
-        sim_revenus_annee = sim_revenus_base.copy()
-        
-        df_immobilier_productif_actuel = sim_patrimoine[sim_patrimoine['Type'] == 'Immobilier productif']
-        total_loyers_annuels_actuel = 0
-        if not df_immobilier_productif_actuel.empty and 'Loyer Mensuel Brut (€)' in df_immobilier_productif_actuel.columns:
-            total_loyers_annuels_actuel = (pd.to_numeric(df_immobilier_productif_actuel['Loyer Mensuel Brut (€)'], errors='coerce').fillna(0) * 12).sum()
-
-        if total_loyers_annuels_actuel > 0:
-            ligne_loyers = pd.DataFrame([{'Poste': 'Revenus Locatifs (calculé)', 'Montant Annuel': total_loyers_annuels_actuel}])
-            sim_revenus_annee = pd.concat([sim_revenus_annee, ligne_loyers], ignore_index=True)
-        
-        indices_salaires_annee = sim_revenus_annee[sim_revenus_annee['Poste'].str.contains('Salaire', na=False)].index.tolist()
-        
-        flux = _calculer_flux_annuels(annee, adultes_df_sim, enfants_df_sim, sim_revenus_annee, charges_courantes_df, df_pension_hypotheses, indices_salaires_annee)
-        
-        mensualites_prets, passif_total, passif_jouissance, passif_productif = _calculer_paiements_prets_annuels(annee, echeanciers, prets_df, asset_to_type_map)
-        
-        foyer_pour_impot = {'revenus_imposables': flux["total_revenus"], 'adultes_details': flux["adultes_details"], 'enfants_details': flux["enfants_details"], 'est_parent_isole': est_parent_isole}
-        impot_annuel_avant_reduction = calculer_impot_openfisca(annee, foyer_pour_impot)
-        
-        total_reduction_fiscale_annee = sum(red['reduction_annuelle'] for red in reductions_fiscales_actives if red['annee_debut'] <= annee <= red['annee_fin'])
-        impot_annuel_final = max(0, impot_annuel_avant_reduction - total_reduction_fiscale_annee)
-        
-        total_depenses_annee = flux["total_depenses"] + charges_immo_annuelles
-        reste_a_vivre = flux["total_revenus"] - total_depenses_annee - impot_annuel_final - mensualites_prets + cash_flow_vente
-        
-        pat_net, act_tot, val_fin_gross, val_immo_j_gross, val_immo_p_gross, sim_patrimoine = _mettre_a_jour_patrimoine(sim_patrimoine, reste_a_vivre, passif_total)
-
-        donnees_annee = {
-            "Année": annee, "Patrimoine Net": pat_net, "Actifs Totaux": act_tot, "Passifs Totaux": passif_total,
-            "Patrimoine Financier": val_fin_gross, "Immobilier Jouissance": val_immo_j_gross, "Immobilier Productif": val_immo_p_gross,
-            "Patrimoine Financier Net": val_fin_gross, "Immobilier Jouissance Net": val_immo_j_gross - passif_jouissance, "Immobilier Productif Net": val_immo_p_gross - passif_productif,
-            "Revenu Annuel": flux["total_revenus"], "Charges (hors prêts)": total_depenses_annee,
-            "Mensualités Prêts": mensualites_prets, "Impôt sur le Revenu": impot_annuel_final, 
-            "Réduction Fiscale Annuelle": total_reduction_fiscale_annee, "Reste à Vivre": reste_a_vivre,
-            "Cash-flow Vente": cash_flow_vente,
-            **{f"{membre}_Statut": statut for membre, statut in flux["statuts_annee"].items()},
-            "Salaires Annuels": flux["salaires"], "Pensions Annuelles": flux["pensions"],
-            "Revenus Locatifs Annuels": flux["loyers_locatifs"], "Autres Revenus Annuels": flux["autres_revenus"]
-        }
-        projection_data.append(donnees_annee)
-
-        charges_courantes_df['Montant Annuel'] *= inflation_factor
-        sim_revenus_base.loc[~sim_revenus_base['Poste'].str.contains('Salaire', na=False), 'Montant Annuel'] *= inflation_factor
-        
-        # Appliquer l'inflation aux charges immobilières dans le dataframe du patrimoine
-        if 'Charges Annuelles (€)' in sim_patrimoine.columns:
-            sim_patrimoine['Charges Annuelles (€)'] *= inflation_factor
-        if 'Taxe Foncière Annuelle (€)' in sim_patrimoine.columns:
-            sim_patrimoine['Taxe Foncière Annuelle (€)'] *= inflation_factor
-        
-        for i, (_, adulte_sim) in enumerate(adultes_df_sim.iterrows()):
-            est_retraite_annee_suivante = False
-            if not df_pension_hypotheses.empty:
-                if not df_pension_hypotheses[(df_pension_hypotheses['Prénom Adulte'] == adulte_sim['Prénom']) & (df_pension_hypotheses['Active'] == True) & (df_pension_hypotheses['Année Départ Retraite'] <= annee + 1)].empty:
-                    est_retraite_annee_suivante = True
-            
-            indices_salaires_base = sim_revenus_base[sim_revenus_base['Poste'].str.contains('Salaire', na=False)].index.tolist()
-            if i < len(indices_salaires_base):
-                idx_salaire = indices_salaires_base[i]
-                sim_revenus_base.loc[idx_salaire, 'Montant Annuel'] = 0 if est_retraite_annee_suivante else sim_revenus_base.loc[idx_salaire, 'Montant Annuel'] * revalo_salaire_factor
+        n_logs_par_annee = []
+        for t in range(debut, fin):
+            logs_evenements.extend(
+                f"**{evenement['annee']}**: {MESSAGES_EVENEMENTS[evenement['type']].format(cible=evenement['cible'])}"
+                for evenement in journal_par_indice.get(t, [])
+                if evenement['type'] != 'fin_pret' or prets_en_cours[evenement['pret']]
+            )
+            n_logs_par_annee.append(len(logs_evenements))
+
+        # Prêts en cours inchangés jusqu'au prochain événement : échéances du bloc en sommes par colonne
+        with trace.etape('PortefeuillePrets.totaux', annee, annees=fin - debut):
+            mensualites_prets, passif_total, passif_jouissance, passif_productif = portefeuille.totaux(prets_en_cours, debut, fin)
+        cash_flow_vente = np.concatenate([[cash_flow_vente], np.zeros(fin - debut - 1)])
+        reste_a_vivre = solde_hors_prets[debut:fin] - mensualites_prets + cash_flow_vente
+
+        with trace.etape('_avancer_patrimoine', annee, annees=fin - debut):
+            (pat_net, act_tot, val_fin_gross, val_immo_j_gross, val_immo_p_gross), trajectoire = _avancer_patrimoine(
+                valeurs, detenus, facteurs_rendement, types_actifs, reste_a_vivre, passif_total)
+
+        for col, valeur in zip(COLONNES_SEQUENTIELLES, (pat_net, act_tot, passif_total, val_fin_gross, val_immo_j_gross, val_immo_p_gross,
+                                                        passif_jouissance, passif_productif, mensualites_prets, reste_a_vivre, cash_flow_vente)):
+            resultats[col][debut:fin] = valeur
+        if points_de_controle is not None:
+            points_de_controle.extend({'valeurs': trajectoire[j].copy(), 'detenus': detenus.copy(), 'n_logs': n_logs_par_annee[j]} for j in range(fin - debut))
+
+def _assembler_projection(annees, preparation, resultats):
+    """Construit le tableau de projection à partir des flux vectorisés et des résultats de la boucle séquentielle."""
+    flux = preparation['flux']
+    return pd.DataFrame({
+        "Année": annees, "Patrimoine Net": resultats["Patrimoine Net"], "Actifs Totaux": resultats["Actifs Totaux"], "Passifs Totaux": resultats["Passifs Totaux"],
+        "Patrimoine Financier": resultats["Patrimoine Financier"], "Immobilier Jouissance": resultats["Immobilier Jouissance"], "Immobilier Productif": resultats["Immobilier Productif"],
+        "Patrimoine Financier Net": resultats["Patrimoine Financier"],
+        "Immobilier Jouissance Net": resultats["Immobilier Jouissance"] - resultats["Passif Jouissance"],
+        "Immobilier Productif Net": resultats["Immobilier Productif"] - resultats["Passif Productif"],
+        "Revenu Annuel": flux["total_revenus"], "Charges (hors prêts)": flux["total_depenses"],
+        "Mensualités Prêts": resultats["Mensualités Prêts"], "Impôt sur le Revenu": preparation["impots"],
+        "Réduction Fiscale Annuelle": preparation["reduction_fiscale"], "Reste à Vivre": resultats["Reste à Vivre"],
+        "Cash-flow Vente": resultats["Cash-flow Vente"],
+        **{f"{membre}_Statut": statut for membre, statut in flux["statuts"].items()},
+        "Salaires Annuels": flux["salaires"], "Pensions Annuelles": flux["pensions"],
+        "Revenus Locatifs Annuels": flux["loyers_locatifs"], "Autres Revenus Annuels": flux["autres_revenus"]
+    })
+
+def generer_projection_complete(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot='openfisca', trace=None):
+    """
+    Fonction principale orchestrant la projection financière année par année.
+    `moteur_impot` choisit le calcul de l'impôt : 'openfisca' (référence) ou 'bareme' (barème intégré, rapide).
+    `trace` (TracePerformance, optionnel) reçoit la durée de chaque étape, par année pour la boucle séquentielle.
 
-    return pd.DataFrame(projection_data), logs_evenements
\ No newline at end of file
+    Les entrées sont d'abord compilées en tableaux NumPy ; les flux de toutes les années sont calculés en une
+    fois, puis l'impôt de toutes les années en un seul appel. Seules les parties séquentielles (ventes,
+    accumulation du patrimoine) restent dans une boucle.
+    """
+    annee_actuelle = datetime.now().year
+    annees = np.arange(annee_actuelle, annee_actuelle + max(duree, 0))
+    if len(annees) == 0:
+        return pd.DataFrame(), []
+    
+    trace = trace if trace is not None else TRACE_INACTIVE
+    with trace.etape('generer_projection_complete', duree=int(duree)):
+        preparation = _preparer_projection(annees, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot, trace)
+        resultats = {col: np.zeros(len(annees)) for col in COLONNES_SEQUENTIELLES}
+        logs_evenements = []
+        _simuler_annees(0, annees, preparation, stocks_df, _etat_initial(stocks_df, preparation), resultats, logs_evenements, trace=trace)
+        with trace.etape('_assembler_projection'):
+            return _assembler_projection(annees, preparation, resultats), logs_evenements
+
+def _signatures_annuelles(annees, preparation):
+    """
+    Signature, pour chaque année, de tout ce que la boucle séquentielle consomme cette année-là :
+    solde hors prêts (revenus, charges, impôt), ventes planifiées, échéances des prêts et événements du journal.
+    La première année dont la signature change est la première année à recalculer.
+    """
+    portefeuille = preparation['portefeuille']
+    ventes_par_annee = preparation['entrees']['ventes_par_annee']
+    journal_par_indice = {}
+    for evenement in preparation['calendrier']:
+        journal_par_indice.setdefault(evenement['indice'], []).append((evenement['type'], evenement['cible']))
+    return [
+        (preparation['solde_hors_prets'][t].tobytes(), tuple(ventes_par_annee.get(int(annee), [])),
+         portefeuille.mensualites[:, t].tobytes(), portefeuille.crd[:, t].tobytes(), tuple(portefeuille.actifs_associes[portefeuille.actif[:, t]]),
+         tuple(journal_par_indice.get(t, [])))
+        for t, annee in enumerate(annees)
+    ]
+
+class ProjectionIncrementale:
+    """
+    Projection incrémentale : conserve l'état de fin d'année (patrimoine, biens détenus, prêts en cours,
+    journal) et la signature des entrées de chaque année du dernier calcul. Lors du calcul suivant, seule la
+    partie séquentielle à partir de la première année dont les entrées ont changé est recalculée, en repartant
+    du point de contrôle de l'année précédente. Un allongement de l'horizon reprend à la dernière année calculée.
+
+    Les flux (vectorisés) et l'impôt (mis en cache par foyer) sont recalculés à chaque appel.
+    """
+    def __init__(self):
+        self._dernier_calcul = None
+        self.annee_reprise = None
+        self.annees_recalculees = 0
+
+    def calculer(self, duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot='openfisca', trace=None):
+        """Même interface et même résultat que `generer_projection_complete`."""
+        annee_actuelle = datetime.now().year
+        annees = np.arange(annee_actuelle, annee_actuelle + max(duree, 0))
+        n_annees = len(annees)
+        if n_annees == 0:
+            return pd.DataFrame(), []
+
+        trace = trace if trace is not None else TRACE_INACTIVE
+        with trace.etape('generer_projection_complete', duree=int(duree), incrementale=True) as details:
+            preparation = _preparer_projection(annees, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot, trace)
+            with trace.etape('_signatures_annuelles'):
+                signatures = _signatures_annuelles(annees, preparation)
+            # Toute modification des biens eux-mêmes (valeurs, rendements, types, achats) affecte la première année
+            cle_statique = (annee_actuelle, empreinte_dataframe(stocks_df))
+
+            dernier = self._dernier_calcul
+            t_reprise = 0
+            if dernier is not None and dernier['cle_statique'] == cle_statique:
+                n_commun = min(len(dernier['signatures']), n_annees)
+                t_reprise = next((t for t in range(n_commun) if signatures[t] != dernier['signatures'][t]), n_commun)
+
+            resultats = {col: np.zeros(n_annees) for col in COLONNES_SEQUENTIELLES}
+            if t_reprise > 0:
+                point = dernier['points_de_controle'][t_reprise - 1]
+                for col in COLONNES_SEQUENTIELLES:
+                    resultats[col][:t_reprise] = dernier['resultats'][col][:t_reprise]
+                # Prêts en cours : ceux des biens vendus avant l'année de reprise (ventes inchangées) sont soldés
+                etat = {
+                    'valeurs': point['valeurs'].copy(),
+                    'detenus': point['detenus'].copy(),
+                    'prets_en_cours': preparation['portefeuille'].prets_en_cours(stocks_df['Actif'][~point['detenus']]),
+                }
+                logs_evenements = dernier['logs'][:point['n_logs']]
+                points_de_controle = dernier['points_de_controle'][:t_reprise]
+            else:
+                etat, logs_evenements, points_de_controle = _etat_initial(stocks_df, preparation), [], []
+
+            _simuler_annees(t_reprise, annees, preparation, stocks_df, etat, resultats, logs_evenements, points_de_controle, trace)
+
+            self._dernier_calcul = {
+                'cle_statique': cle_statique,
+                'signatures': signatures,
+                'resultats': resultats,
+                'points_de_controle': points_de_controle,
+                'logs': list(logs_evenements),
+            }
+            self.annee_reprise = int(annees[t_reprise]) if t_reprise < n_annees else None
+            self.annees_recalculees = n_annees - t_reprise
+            details['annees_recalculees'] = self.annees_recalculees
+            with trace.etape('_assembler_projection'):
+                return _assembler_projection(annees, preparation, resultats), list(logs_evenements)
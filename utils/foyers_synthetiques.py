@@ -0,0 +1,127 @@
+# utils/foyers_synthetiques.py
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .state_manager import get_initial_state_config
+
+PRENOMS_ADULTES = ['Alice', 'Bruno', 'Chloé', 'David']
+PRENOMS_ENFANTS = ['Léa', 'Tom', 'Inès', 'Hugo', 'Jade', 'Noé']
+
+def generer_foyer(n_actifs=10, n_prets=3, n_adultes=2, n_enfants=2, n_ventes=1, graine=0):
+    """
+    Génère un foyer synthétique réaliste et reproductible, au format de l'état de session
+    (mêmes clés et colonnes que `get_initial_state_config`) :
+    - une résidence principale, puis des biens locatifs (~40 %) et des placements financiers,
+    - des prêts adossés aux biens immobiliers (les prêts en surnombre sont des crédits à la consommation),
+    - salaires, dépenses, pensions de retraite actives, enfants à charge et ventes planifiées.
+    """
+    rng = np.random.default_rng(graine)
+    annee = datetime.now().year
+    n_actifs = max(1, int(n_actifs))
+
+    # Biens : la résidence principale d'abord, puis alternance locatif / financier
+    types = ['Immobilier de jouissance'] + ['Immobilier productif' if rng.random() < 0.4 else 'Financier' for _ in range(n_actifs - 1)]
+    stocks = []
+    for i, type_actif in enumerate(types):
+        immobilier = type_actif != 'Financier'
+        valeur = float(rng.uniform(100000, 600000) if immobilier else rng.uniform(2000, 150000))
+        annee_achat = int(rng.integers(annee - 25, annee))
+        pinel = type_actif == 'Immobilier productif' and rng.random() < 0.3
+        stocks.append({
+            'Actif': f"{'RP' if i == 0 else ('Locatif' if immobilier else 'Placement')} {i}",
+            'Type': type_actif,
+            'Valeur Brute': round(valeur, 0),
+            'Rendement %': round(float(rng.uniform(0.5, 3.0) if immobilier else rng.uniform(1.0, 6.0)), 2),
+            'Prix Achat Initial': round(valeur * float(rng.uniform(0.6, 1.0)), 0) if immobilier else 0.0,
+            'Date Achat': f"{annee_achat}-{int(rng.integers(1, 13)):02d}-01" if immobilier else None,
+            'Dispositif Fiscal': 'Pinel Classique (avant 2023)' if pinel else None,
+            'Durée Défiscalisation (ans)': 9 if pinel else 0,
+            'Charges Annuelles (€)': round(valeur * 0.005, 0) if immobilier else 0.0,
+            'Taxe Foncière Annuelle (€)': round(valeur * 0.004, 0) if immobilier else 0.0,
+            'Loyer Mensuel Brut (€)': round(valeur * 0.045 / 12, 0) if type_actif == 'Immobilier productif' else 0.0,
+        })
+    df_stocks = pd.DataFrame(stocks)
+
+    biens_immobiliers = df_stocks.loc[df_stocks['Type'] != 'Financier', 'Actif'].tolist()
+    prets = []
+    for i in range(int(n_prets)):
+        adosse = i < len(biens_immobiliers)
+        duree = int(rng.choice([15, 20, 25])) if adosse else int(rng.integers(3, 8))
+        prets.append({
+            'Actif Associé': biens_immobiliers[i] if adosse else f"Crédit conso {i}",
+            'Montant Initial': round(float(rng.uniform(80000, 400000) if adosse else rng.uniform(5000, 40000)), 0),
+            'Taux Annuel %': round(float(rng.uniform(0.8, 4.5)), 2),
+            'Durée Initiale (ans)': duree,
+            'Date Début': f"{int(rng.integers(annee - duree + 1, annee + 2))}-{int(rng.integers(1, 13)):02d}-15",
+            'Assurance Emprunteur %': round(float(rng.uniform(0.0, 0.4)), 2),
+        })
+    df_prets = pd.DataFrame(prets, columns=get_initial_state_config()['df_prets']['cols'])
+
+    adultes = [{'Prénom': PRENOMS_ADULTES[i % len(PRENOMS_ADULTES)] + ('' if i < len(PRENOMS_ADULTES) else f" {i}"), 'Âge': int(rng.integers(28, 60)), 'Date Naissance': None} for i in range(int(n_adultes))]
+    df_adultes = pd.DataFrame(adultes, columns=get_initial_state_config()['df_adultes']['cols'])
+    enfants = [{
+        'Prénom': PRENOMS_ENFANTS[i % len(PRENOMS_ENFANTS)] + ('' if i < len(PRENOMS_ENFANTS) else f" {i}"), 'Âge': int(rng.integers(0, 18)), 'Date Naissance': None,
+        'Âge Début Études': 18, 'Durée Études (ans)': int(rng.integers(2, 6)), 'Coût Annuel Études (€)': round(float(rng.uniform(3000, 12000)), 0),
+    } for i in range(int(n_enfants))]
+    df_enfants = pd.DataFrame(enfants, columns=get_initial_state_config()['df_enfants']['cols'])
+
+    revenus = [{'Poste': f"Salaire {a['Prénom']}", 'Montant Annuel': round(float(rng.uniform(25000, 90000)), 0), 'Prénom Adulte': a['Prénom'], 'Type': 'Salaire'} for a in adultes]
+    revenus.append({'Poste': 'Dividendes', 'Montant Annuel': round(float(rng.uniform(0, 5000)), 0), 'Prénom Adulte': None, 'Type': 'Autre'})
+    df_revenus = pd.DataFrame(revenus)
+    df_depenses = pd.DataFrame([
+        {'Poste': 'Vie courante', 'Montant Annuel': round(float(rng.uniform(15000, 40000)), 0)},
+        {'Poste': 'Loisirs', 'Montant Annuel': round(float(rng.uniform(2000, 10000)), 0)},
+    ])
+
+    pensions = []
+    for a in adultes:
+        age_depart = int(rng.integers(62, 68))
+        pensions.append({'Prénom Adulte': a['Prénom'], 'Âge Départ Retraite': age_depart, 'Montant Pension Annuelle (€)': round(float(rng.uniform(12000, 35000)), 0),
+                         'Active': True, 'Année Départ Retraite': annee - a['Âge'] + age_depart})
+    df_pension_hypotheses = pd.DataFrame(pensions, columns=get_initial_state_config()['df_pension_hypotheses']['cols'])
+
+    biens_vendables = biens_immobiliers[1:]
+    ventes = [{'Bien à Vendre': bien, 'Année de Vente': int(rng.integers(annee + 1, annee + 20))}
+              for bien in rng.permutation(biens_vendables)[:int(n_ventes)].tolist()]
+    df_ventes = pd.DataFrame(ventes, columns=get_initial_state_config()['df_ventes']['cols'])
+
+    return {
+        'df_adultes': df_adultes,
+        'df_enfants': df_enfants,
+        'parent_isole': bool(n_adultes == 1 and n_enfants > 0),
+        'patrimoine': {
+            'immobilier': [{'nom': s['Actif'], 'valeur': s['Valeur Brute']} for s in stocks if s['Type'] != 'Financier'],
+            'investissements_financiers': [{'nom': s['Actif'], 'valeur': s['Valeur Brute'], 'type': 'Autre'} for s in stocks if s['Type'] == 'Financier'],
+            'autres_actifs': [],
+            'passifs': [{'nom': p['Actif Associé'], 'valeur': p['Montant Initial']} for p in prets],
+        },
+        'df_stocks': df_stocks,
+        'df_prets': df_prets,
+        'df_revenus': df_revenus,
+        'df_depenses': df_depenses,
+        'df_pension_hypotheses': df_pension_hypotheses,
+        'df_ventes': df_ventes,
+        'hyp_economiques': {'inflation': round(float(rng.uniform(0, 3)), 1), 'revalo_salaire': round(float(rng.uniform(0, 2)), 1)},
+    }
+
+def entrees_projection(etat):
+    """Arguments positionnels de `generer_projection_complete` (après la durée) tirés d'un état de session."""
+    return (etat['df_stocks'], etat['df_revenus'], etat['df_depenses'], etat['df_prets'], etat['df_adultes'], etat['df_enfants'],
+            etat['df_pension_hypotheses'], etat['hyp_economiques'], etat['parent_isole'], etat['df_ventes'])
+
+def generer_parametres_optimisation(n_actifs_financiers=3, include_immo=True, horizon=20, fix_immo_price=False):
+    """Paramètres d'optimisation au format de `setup_sidebar`, pour les pages Optimisation et Simulation Manuelle."""
+    catalogue = [("Assurance-Vie", 3.5, 1.0, 0.6), ("PER", 4.0, 2.0, 0.8), ("SCPI", 4.5, 5.0, 0.5), ("PEA", 5.5, 0.5, 0.3), ("Livret", 2.0, 0.0, 0.0)]
+    lignes = catalogue[:max(1, min(n_actifs_financiers, len(catalogue)))]
+    df_options = pd.DataFrame(
+        {'Actif': [True] * len(lignes), 'Rendement Annuel (%)': [l[1] for l in lignes], 'Frais Entrée (%)': [l[2] for l in lignes], 'Frais Gestion Annuels (%)': [l[3] for l in lignes]},
+        index=[l[0] for l in lignes]
+    )
+    return {
+        'initial_capital': 20000, 'monthly_investment': 500, 'investment_horizon': horizon,
+        'marginal_tax_rate': 30, 'per_deduction_limit': 4399, 'df_options_financiers_edited': df_options,
+        'include_immo': include_immo, 'loan_params': {'mensualite_max': 1000, 'rate': 3.5, 'duration': 20},
+        'immo_price_range': (0, 150000), 'fix_immo_price': fix_immo_price, 'fixed_immo_price': 150000,
+        'immo_params': {'rendement_locatif_brut': 5.0, 'charges_pct': 15, 'frais_notaire_pct': 8.0, 'immo_reval_rate': 1.5},
+        'manual_allocations': {},
+    }
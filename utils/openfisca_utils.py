@@ -1,63 +1,276 @@
 # utils/openfisca_utils.py
 import streamlit as st
 import pandas as pd
+import numpy as np
+from .cache_impot import CACHE_IMPOT, cle_foyer
 try:
     from openfisca_france import FranceTaxBenefitSystem
     from openfisca_core.simulation_builder import SimulationBuilder
+    from openfisca_core.parameters import Parameter
     OPENFISCA_READY = True
 except ImportError:
     OPENFISCA_READY = False
 
-@st.cache_data
-def calculer_impot_openfisca(annee, foyer_details):
-    if not OPENFISCA_READY: 
-        st.warning(f"Année {annee}: OpenFisca non installé, utilisation d'un calcul simplifié.")
-        return foyer_details.get('revenus_imposables', 0) * 0.15 
-        
-    tax_benefit_system = FranceTaxBenefitSystem()
-    simulation_builder = SimulationBuilder()
-    
+# Paramètres du barème de l'impôt sur le revenu par année de revenus (mêmes valeurs que la législation OpenFisca).
+# Au-delà de la dernière année connue, le dernier barème est reconduit.
+BAREMES_IR = {
+    2022: {'seuils': [0, 10777, 27478, 78570, 168994], 'abatpro_min': 472, 'abatpro_max': 13522, 'plafond_demi_part': 1678, 'plafond_parent_isole': 3959,
+           'decote_seuil_celib': 833, 'decote_seuil_couple': 1378, 'abat_age_seuils': [0, 16410, 26400], 'abat_age_montants': [2620, 1310, 0]},
+    2023: {'seuils': [0, 11294, 28797, 82341, 177106], 'abatpro_min': 495, 'abatpro_max': 14171, 'plafond_demi_part': 1759, 'plafond_parent_isole': 4149,
+           'decote_seuil_celib': 873, 'decote_seuil_couple': 1444, 'abat_age_seuils': [0, 17200, 27670], 'abat_age_montants': [2746, 1373, 0]},
+    2024: {'seuils': [0, 11497, 29315, 83823, 180294], 'abatpro_min': 504, 'abatpro_max': 14426, 'plafond_demi_part': 1791, 'plafond_parent_isole': 4224,
+           'decote_seuil_celib': 889, 'decote_seuil_couple': 1470, 'abat_age_seuils': [0, 17510, 28170], 'abat_age_montants': [2796, 1398, 0]},
+    2025: {'seuils': [0, 11600, 29579, 84577, 181917], 'abatpro_min': 509, 'abatpro_max': 14555, 'plafond_demi_part': 1807, 'plafond_parent_isole': 4262,
+           'decote_seuil_celib': 897, 'decote_seuil_couple': 1483, 'abat_age_seuils': [0, 17670, 28430], 'abat_age_montants': [2822, 1411, 0]},
+}
+TAUX_BAREME_IR = np.array([0, 0.11, 0.30, 0.41, 0.45])
+TAUX_ABATPRO = 0.10
+TAUX_DECOTE = 0.4525
+MOTEURS_IMPOT = ('openfisca', 'bareme')
+
+def _impot_bareme(revenu_par_part, seuils):
+    """Applique le barème progressif à un vecteur de revenus par part."""
+    largeurs = np.append(np.diff(seuils), np.inf)
+    return np.clip(revenu_par_part[:, None] - seuils[None, :], 0, largeurs[None, :]) @ TAUX_BAREME_IR
+
+def calculer_impots_bareme(annees, revenus_declarants, annees_naissance_declarants, nb_personnes_a_charge, est_parent_isole):
+    """
+    Calcule de façon vectorisée l'impôt sur le revenu net (équivalent `ip_net` d'OpenFisca) de n foyers.
+
+    `revenus_declarants` et `annees_naissance_declarants` sont de forme (n, 2) ; un second déclarant absent a un
+    revenu NaN. Le calcul couvre l'abattement de 10 %, l'abattement pour personnes âgées, le quotient familial
+    (adultes, enfants, case T), son plafonnement et la décote.
+    """
+    annees = np.atleast_1d(np.asarray(annees, dtype=np.int64))
+    revenus = np.atleast_2d(np.asarray(revenus_declarants, dtype=float))
+    naissances = np.atleast_2d(np.asarray(annees_naissance_declarants, dtype=float))
+    nb_pac = np.atleast_1d(np.asarray(nb_personnes_a_charge, dtype=float))
+    parent_isole = np.atleast_1d(np.asarray(est_parent_isole, dtype=bool))
+
+    presents = ~np.isnan(revenus)
+    nb_adultes = presents.sum(axis=1)
+    revenus = np.where(presents, revenus, 0.0)
+    ages = annees[:, None] - naissances
+    nb_ages = (presents & (ages >= 65)).sum(axis=1)
+
+    case_t = parent_isole & (nb_adultes == 1) & (nb_pac > 0)
+    nb_parts = nb_adultes + 0.5 * np.minimum(nb_pac, 2) + np.maximum(nb_pac - 2, 0) + 0.5 * case_t
+
+    impots = np.zeros(len(annees))
+    annees_bareme = np.clip(annees, min(BAREMES_IR), max(BAREMES_IR))
+    for annee_bareme in np.unique(annees_bareme):
+        sel = annees_bareme == annee_bareme
+        p = BAREMES_IR[int(annee_bareme)]
+        seuils = np.asarray(p['seuils'], dtype=float)
+
+        abattement = np.minimum(np.clip(revenus[sel] * TAUX_ABATPRO, p['abatpro_min'], p['abatpro_max']), revenus[sel])
+        rng = (revenus[sel] - abattement).sum(axis=1)
+        abat_age = nb_ages[sel] * np.asarray(p['abat_age_montants'])[np.searchsorted(p['abat_age_seuils'], rng, side='right') - 1]
+        rni = rng - np.minimum(rng, abat_age)
+
+        adultes, parts = np.maximum(nb_adultes[sel], 1), np.maximum(nb_parts[sel], 1)
+        ir_brut = parts * _impot_bareme(rni / parts, seuils)
+        ir_sans_qf = adultes * _impot_bareme(rni / adultes, seuils)
+
+        # Plafonnement des effets du quotient familial
+        demi_parts_sup = (parts - adultes) * 2
+        demi_parts_isole = np.minimum((parts - 1) * 2, 2)
+        plafond = np.where(
+            case_t[sel],
+            p['plafond_parent_isole'] * demi_parts_isole / 2 + p['plafond_demi_part'] * (demi_parts_sup - demi_parts_isole),
+            p['plafond_demi_part'] * demi_parts_sup
+        )
+        ir_plaf_qf = np.maximum(ir_brut, np.maximum(0, ir_sans_qf - plafond))
+
+        seuil_decote = np.where(adultes == 2, p['decote_seuil_couple'], p['decote_seuil_celib'])
+        decote = np.round(np.maximum(0, seuil_decote - TAUX_DECOTE * ir_plaf_qf))
+        impots[sel] = np.round(ir_plaf_qf - np.round(np.minimum(decote, ir_plaf_qf)))
+    return np.where(nb_adultes > 0, impots, 0.0)
+
+def calculer_impots_bareme_foyers(annees, foyers_details):
+    """Applique `calculer_impots_bareme` à des foyers au format de `calculer_impots_openfisca_batch`."""
+    n = len(foyers_details)
+    revenus, naissances = np.full((n, 2), np.nan), np.full((n, 2), np.nan)
+    nb_pac, parent_isole = np.zeros(n), np.zeros(n, dtype=bool)
+    for j, foyer in enumerate(foyers_details):
+        for i, adulte in enumerate(foyer['adultes_details'][:2]):
+            revenus[j, i] = round(float(adulte['revenu']))
+            naissances[j, i] = adulte.get('annee_naissance') if pd.notna(adulte.get('annee_naissance')) else np.nan
+        nb_pac[j] = sum(1 for enfant in foyer['enfants_details'] if pd.notna(enfant.get('Année Naissance')))
+        parent_isole[j] = bool(foyer.get('est_parent_isole', False))
+    return calculer_impots_bareme(annees, revenus, naissances, nb_pac, parent_isole)
+
+def calculer_impots(annees, foyers_details, moteur='openfisca'):
+    """Calcule l'impôt d'une série de foyers avec le moteur choisi ('openfisca' ou 'bareme')."""
+    if moteur not in MOTEURS_IMPOT:
+        raise ValueError(f"Moteur d'impôt inconnu : {moteur}. Valeurs possibles : {', '.join(MOTEURS_IMPOT)}")
+    if moteur == 'bareme':
+        return calculer_impots_bareme_foyers(annees, foyers_details)
+    return calculer_impots_openfisca_batch(annees, foyers_details)
+
+def valider_bareme_contre_openfisca(n_foyers=300, annee=None, graine=0):
+    """
+    Compare le moteur barème à OpenFisca sur une grille aléatoire de foyers (revenus, âges, enfants, case T).
+    Retourne un dict avec l'écart absolu maximal, l'écart moyen et le DataFrame détaillé des foyers testés.
+    """
+    if not OPENFISCA_READY:
+        raise RuntimeError("OpenFisca n'est pas installé : validation impossible.")
+    rng = np.random.default_rng(graine)
+    annee = annee or max(BAREMES_IR)
+    annees = np.full(n_foyers, annee)
+    revenus = rng.choice([0, 5000, 15000, 30000, 60000, 120000, 250000], size=(n_foyers, 2)) + rng.integers(0, 10000, size=(n_foyers, 2))
+    revenus = revenus.astype(float)
+    revenus[rng.random(n_foyers) < 0.4, 1] = np.nan
+    naissances = annee - rng.integers(25, 80, size=(n_foyers, 2))
+    nb_pac = rng.integers(0, 5, size=n_foyers)
+    parent_isole = rng.random(n_foyers) < 0.3
+
+    foyers = [{
+        'revenus_imposables': np.nansum(revenus[j]),
+        'adultes_details': [{'revenu': revenus[j, i], 'annee_naissance': naissances[j, i]} for i in range(2) if not np.isnan(revenus[j, i])],
+        'enfants_details': [{'Année Naissance': annee - 1 - k} for k in range(nb_pac[j])],
+        'est_parent_isole': bool(parent_isole[j] and np.isnan(revenus[j, 1])),
+    } for j in range(n_foyers)]
+    impots_openfisca = calculer_impots_openfisca_batch(annees, foyers, utiliser_cache=False)
+    impots_bareme = calculer_impots_bareme_foyers(annees, foyers)
+
+    details = pd.DataFrame({
+        'Revenu Déclarant 1': revenus[:, 0], 'Revenu Déclarant 2': revenus[:, 1],
+        'Personnes à Charge': nb_pac, 'Parent Isolé': [f['est_parent_isole'] for f in foyers],
+        'Impôt OpenFisca': impots_openfisca, 'Impôt Barème': impots_bareme,
+    })
+    details['Écart'] = details['Impôt Barème'] - details['Impôt OpenFisca']
+    return {'ecart_max': float(details['Écart'].abs().max()), 'ecart_moyen': float(details['Écart'].abs().mean()), 'details': details}
+
+@st.cache_resource(show_spinner=False)
+def charger_systeme_fiscal():
+    """Charge le système socio-fiscal OpenFisca France une seule fois par processus."""
+    return FranceTaxBenefitSystem()
+
+@st.cache_resource(show_spinner=False)
+def annee_legislation_figee():
+    """
+    Retourne la première année à partir de laquelle plus aucun paramètre OpenFisca n'évolue.
+    Au-delà, tous les foyers peuvent être calculés sur cette même période (âges préservés).
+    """
+    derniere_date = max(
+        (p.values_list[0].instant_str for p in charger_systeme_fiscal().parameters.get_descendants() if isinstance(p, Parameter) and p.values_list),
+        default='0001-01-01'
+    )
+    annee, mois_jour = int(derniere_date[:4]), derniere_date[5:]
+    return annee if mois_jour == '01-01' else annee + 1
+
+def _construire_individus_foyer(prefixe, annee, periode, foyer_details):
+    """
+    Construit les individus et le foyer fiscal OpenFisca d'un foyer pour l'année `annee`, calculé sur `periode`.
+    Les dates de naissance sont décalées de `annee - periode` pour conserver les âges.
+    Retourne None si une année de naissance d'adulte manque.
+    """
+    decalage = annee - periode
     individus = {}
     for i, adulte in enumerate(foyer_details['adultes_details']):
         annee_naissance_adulte = adulte.get('annee_naissance')
         if pd.isna(annee_naissance_adulte):
-            st.error(f"Année de naissance manquante pour parent{i+1} pour l'année {annee}. Calcul d'impôt approximatif utilisé.")
-            return foyer_details.get('revenus_imposables', 0) * 0.15 # Fallback
-        
-        # Assurer que l'année de naissance est un entier pour le formatage correct de la date
-        date_naissance_formatee = f"{int(annee_naissance_adulte)}-01-01"
-        
-        individus[f'parent{i+1}'] = {
-            'salaire_imposable': {str(annee): adulte['revenu']},
-            'date_naissance': {'ETERNITY': date_naissance_formatee}
+            st.error(f"Année de naissance manquante pour parent{i+1} pour l'année {annee}. Calcul d'impôt par le barème intégré utilisé.")
+            return None
+
+        # Revenu arrondi à l'euro, comme dans l'empreinte du cache d'impôt
+        individus[f'{prefixe}parent{i+1}'] = {
+            'salaire_imposable': {str(periode): int(round(float(adulte['revenu'])))},
+            'date_naissance': {'ETERNITY': f"{int(annee_naissance_adulte) - decalage}-01-01"}
         }
-    
+
     personnes_a_charge_valides = []
     for i, enfant in enumerate(foyer_details['enfants_details']):
         annee_naissance_enfant = enfant.get('Année Naissance')
         if pd.isna(annee_naissance_enfant):
             st.warning(f"Année de naissance manquante pour enfant{i+1} pour l'année {annee}. Enfant ignoré pour le calcul d'impôt.")
             continue # Ne pas traiter cet enfant si son année de naissance manque
-            
-        # Assurer que l'année de naissance est un entier pour le formatage correct de la date
-        date_naissance_enfant_formatee = f"{int(annee_naissance_enfant)}-01-01"
-        nom_openfisca_enfant = f'enfant{i+1}'
-        individus[nom_openfisca_enfant] = {'date_naissance': {'ETERNITY': date_naissance_enfant_formatee}}
+
+        nom_openfisca_enfant = f'{prefixe}enfant{i+1}'
+        individus[nom_openfisca_enfant] = {'date_naissance': {'ETERNITY': f"{int(annee_naissance_enfant) - decalage}-01-01"}}
         personnes_a_charge_valides.append(nom_openfisca_enfant)
-        
-    foyer_fiscal = {'foyerfiscal1': {
-        'declarants': [f'parent{i+1}' for i in range(len(foyer_details['adultes_details']))],
+
+    foyer_fiscal = {
+        'declarants': [f'{prefixe}parent{i+1}' for i in range(len(foyer_details['adultes_details']))],
         'personnes_a_charge': personnes_a_charge_valides
-    }}
-    
+    }
     if foyer_details.get('est_parent_isole', False):
-         foyer_fiscal['foyerfiscal1']['caseT'] = {str(annee): True}
-         
-    CASE = {'individus': individus, 'foyers_fiscaux': foyer_fiscal}
-    
+        foyer_fiscal['caseT'] = {str(periode): True}
+
+    return individus, foyer_fiscal
+
+def calculer_impots_openfisca_batch(annees, foyers_details, utiliser_cache=True):
+    """
+    Calcule l'impôt (`ip_net`) d'une série de foyers (typiquement un par année de projection) en une seule simulation.
+
+    Les foyers déjà présents dans le cache d'impôt (cf. `utils.cache_impot`) ne sont pas recalculés ; les autres
+    sont tous placés dans une même simulation vectorisée. Les années postérieures à la dernière évolution de la
+    législation sont ramenées sur l'année figée, si bien qu'une projection de 50 ans ne déclenche qu'un ou deux
+    calculs de période. Retourne un tableau NumPy aligné sur `annees`.
+    """
+    annees = [int(a) for a in annees]
+    impots = np.zeros(len(annees))
+    if not annees:
+        return impots
+
+    if not OPENFISCA_READY:
+        st.warning(f"Années {min(annees)}-{max(annees)}: OpenFisca non installé, utilisation du barème intégré.")
+        return calculer_impots_bareme_foyers(annees, foyers_details)
+
+    cles = [cle_foyer(annee, foyer) if utiliser_cache else None for annee, foyer in zip(annees, foyers_details)]
+    a_calculer = []
+    for j, cle in enumerate(cles):
+        impot_en_cache = CACHE_IMPOT.obtenir(cle) if cle is not None else None
+        if impot_en_cache is None:
+            a_calculer.append(j)
+        else:
+            impots[j] = impot_en_cache
+    if not a_calculer:
+        return impots
+
+    impots_calcules, calcules = _simuler_impots_openfisca([annees[j] for j in a_calculer], [foyers_details[j] for j in a_calculer])
+    impots[a_calculer] = impots_calcules
+    CACHE_IMPOT.enregistrer({cles[j]: impot for j, impot, ok in zip(a_calculer, impots_calcules, calcules) if ok and cles[j] is not None})
+    return impots
+
+def _simuler_impots_openfisca(annees, foyers_details):
+    """
+    Exécute la simulation OpenFisca vectorisée de `calculer_impots_openfisca_batch`.
+    Retourne (impots, calcules) où `calcules` indique les foyers réellement évalués par OpenFisca.
+    """
+    impots = np.zeros(len(annees))
+    calcules = np.zeros(len(annees), dtype=bool)
+    annee_figee = annee_legislation_figee()
+    individus, foyers_fiscaux, positions_par_periode = {}, {}, {}
+    for j, (annee, foyer_details) in enumerate(zip(annees, foyers_details)):
+        if not foyer_details['adultes_details']:
+            st.error(f"Erreur OpenFisca pour l'année {annee}: aucun déclarant dans le foyer.")
+            continue
+        periode = min(annee, annee_figee)
+        entites = _construire_individus_foyer(f'f{j}_', annee, periode, foyer_details)
+        if entites is None:
+            impots[j] = calculer_impots_bareme_foyers([annee], [foyer_details])[0] # Fallback
+            continue
+        individus.update(entites[0])
+        foyers_fiscaux[f'foyerfiscal{j}'] = entites[1]
+        positions_par_periode.setdefault(periode, []).append(j)
+
+    if not foyers_fiscaux:
+        return impots, calcules
+
     try:
-        simulation = simulation_builder.build_from_entities(tax_benefit_system, CASE)
-        return float(simulation.calculate('ip_net', str(annee))[0])
+        simulation = SimulationBuilder().build_from_entities(charger_systeme_fiscal(), {'individus': individus, 'foyers_fiscaux': foyers_fiscaux})
+        rang_foyer = {nom: rang for rang, nom in enumerate(simulation.populations['foyer_fiscal'].ids)}
+        for periode, positions in positions_par_periode.items():
+            ip_net = simulation.calculate('ip_net', str(periode))
+            impots[positions] = [float(ip_net[rang_foyer[f'foyerfiscal{j}']]) for j in positions]
+            calcules[positions] = True
     except Exception as e:
-        st.error(f"Erreur OpenFisca pour l'année {annee}: {e}")
-        return 0
\ No newline at end of file
+        st.error(f"Erreur OpenFisca pour les années {min(annees)}-{max(annees)}: {e}")
+        impots[:] = 0
+        calcules[:] = False
+    return impots, calcules
+
+def calculer_impot_openfisca(annee, foyer_details):
+    return float(calculer_impots_openfisca_batch([annee], [foyer_details])[0])
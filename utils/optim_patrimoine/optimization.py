@@ -1,26 +1,117 @@
 # Fichier: optimization.py (version corrigée)
+import os
+import time
 import streamlit as st
 import numpy as np
-from scipy.optimize import minimize, NonlinearConstraint
-from .simulation import run_unified_simulation, calculate_monthly_payment # MODIFIÉ: Import relatif
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from scipy.optimize import minimize, differential_evolution, NonlinearConstraint
+from scipy.stats import qmc
+from .simulation import simulate_batch, extract_simulation_inputs, calculate_monthly_payment # MODIFIÉ: Import relatif
 
+# L'optimiseur n'a besoin que des résultats agrégés : le noyau NumPy est appelé sans historique
 def objective_function(optimization_vars, *args):
-    final_net_worth, _, _, _, _, _, _ = run_unified_simulation(optimization_vars, *args)
-    return -final_net_worth
+    return -simulate_batch(optimization_vars, *args)['final_net_worth'][0]
 
 def cash_flow_constraint(optimization_vars, *args):
-    _, _, _, _, _, _, cash_flow_history = run_unified_simulation(optimization_vars, *args)
-    return np.array(cash_flow_history)
+    return simulate_batch(optimization_vars, *args)['cash_flow'][0]
 
-def setup_and_run_optimization(params):
+class SimulationMemo:
     """
-    Configure et lance l'optimisation en tenant compte du prix fixe ou variable de l'immobilier.
+    Mémoïse les simulations demandées par l'optimiseur, indexées sur les octets exacts de `x`.
+    L'objectif et les contraintes d'un même point partagent ainsi une seule simulation, et les
+    gradients par différences finies (n+1 points) sont évalués en un seul appel vectorisé du noyau.
+    `fixed_vars` est concaténé à `x` (ex. prix immobilier fixé par l'utilisateur).
+    """
+    def __init__(self, args, fixed_vars=(), bounds=None, max_entries=256):
+        self.args = args
+        self.inputs = extract_simulation_inputs(args[0], args[4])
+        self.fixed_vars = np.asarray(fixed_vars, dtype=float)
+        self.bounds = bounds
+        self.max_entries = max_entries
+        self._points = OrderedDict()
+        self._derivatives = OrderedDict()
+        self.n_requests = 0
+        self.n_simulations = 0
+        self.n_batches = 0
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _simulate(self, X):
+        self.n_batches += 1
+        self.n_simulations += len(X)
+        full_X = np.hstack([X, np.tile(self.fixed_vars, (len(X), 1))])
+        result = simulate_batch(full_X, *self.args, inputs=self.inputs)
+        return result['final_net_worth'], result['cash_flow']
+
+    def evaluate(self, x):
+        """Retourne (patrimoine net final, cash-flows annuels) au point `x`."""
+        x = np.asarray(x, dtype=float)
+        key = x.tobytes()
+        self.n_requests += 1
+        if key not in self._points:
+            net_worth, cash_flow = self._simulate(x[None, :])
+            self._store(self._points, key, (net_worth[0], cash_flow[0]))
+        return self._points[key]
+
+    def _finite_differences(self, x):
+        """Gradient de l'objectif et jacobienne des contraintes par différences avant, en un seul lot."""
+        x = np.asarray(x, dtype=float)
+        key = x.tobytes()
+        self.n_requests += 1
+        if key not in self._derivatives:
+            # Même schéma que l'approximation par défaut de scipy pour SLSQP : pas absolu sqrt(eps),
+            # inversé si le point décalé sortirait des bornes, et division par le pas réellement représentable
+            steps = np.full_like(x, np.sqrt(np.finfo(float).eps))
+            steps = np.where((x + steps) - x == 0, np.sqrt(np.finfo(float).eps) * np.maximum(1.0, np.abs(x)), steps)
+            if self.bounds is not None:
+                lower = np.array([-np.inf if b[0] is None else b[0] for b in self.bounds], dtype=float)
+                upper = np.array([np.inf if b[1] is None else b[1] for b in self.bounds], dtype=float)
+                steps = np.where((x + steps > upper) & (x - steps >= lower), -steps, steps)
+            steps = (x + steps) - x
+            X = np.vstack([x, x + np.diag(steps)])
+            net_worth, cash_flow = self._simulate(X)
+            self._store(self._points, key, (net_worth[0], cash_flow[0]))
+            gradient = -(net_worth[1:] - net_worth[0]) / steps
+            jacobian = ((cash_flow[1:] - cash_flow[0]) / steps[:, None]).T
+            self._store(self._derivatives, key, (gradient, jacobian))
+        return self._derivatives[key]
+
+    def objective(self, x):
+        return -self.evaluate(x)[0]
+
+    def objective_gradient(self, x):
+        return self._finite_differences(x)[0]
+
+    def cash_flow_constraint(self, x):
+        return self.evaluate(x)[1]
+
+    def cash_flow_jacobian(self, x):
+        return self._finite_differences(x)[1]
+
+    def statistics(self):
+        """Compteurs d'évaluation : demandes de l'optimiseur, points simulés et appels du noyau."""
+        return {'requests': self.n_requests, 'simulations': self.n_simulations, 'batches': self.n_batches}
+
+MODES_OPTIMISATION = ('locale', 'multistart', 'differential_evolution')
+ECHANTILLONNEURS = ('lhs', 'sobol')
+
+def build_problem(params):
+    """
+    Traduit les paramètres de la barre latérale en un problème d'optimisation sérialisable
+    (envoyable aux processus de calcul). Retourne None si aucun actif n'est sélectionné et lève
+    ValueError si le prix immobilier fixé dépasse la mensualité maximale.
     """
     active_financial_assets = params['df_options_financiers_edited'][params['df_options_financiers_edited']['Actif']].drop(columns=['Actif'])
     asset_names = active_financial_assets.index.tolist()
 
     if not asset_names and not params['include_immo']:
-        return None, None
+        return None
         
     args = (
         asset_names, params['initial_capital'], params['monthly_investment'], params['investment_horizon'],
@@ -31,61 +122,357 @@ def setup_and_run_optimization(params):
     )
     
     num_alloc_vars = len(asset_names)
-    
+    alloc_guess = [1.0/num_alloc_vars if num_alloc_vars > 0 else 0.0]*num_alloc_vars
+    alloc_bounds = [(0, 1)] * num_alloc_vars if num_alloc_vars > 0 else []
+    problem = {'args': args, 'num_alloc_vars': num_alloc_vars, 'variable_price': False, 'fixed_vars': [], 'loan_params': params['loan_params']}
+
     # Cas 1: Immobilier inclus ET prix FIXÉ
     if params['include_immo'] and params['fix_immo_price']:
         fixed_price = params['fixed_immo_price']
         
         mensualite_calculee = calculate_monthly_payment(fixed_price, params['loan_params']['rate'], params['loan_params']['duration'])
         if mensualite_calculee > params['loan_params']['mensualite_max']:
-            st.error(f"Le prix fixé de {fixed_price:,.0f} € engendre une mensualité de {mensualite_calculee:,.0f} €, ce qui dépasse votre maximum de {params['loan_params']['mensualite_max']:,.0f} €.")
-            return None, None
-            
-        initial_guess = np.array([1.0/num_alloc_vars if num_alloc_vars > 0 else 0.0]*num_alloc_vars)
-        bounds = [(0, 1)] * num_alloc_vars if num_alloc_vars > 0 else []
-        
-        constraints = []
-        if num_alloc_vars > 0:
-            constraints.append({'type': 'eq', 'fun': lambda x: 1 - np.sum(x)})
-        
-        # --- LIGNE CORRIGÉE ---
-        # La lambda accepte maintenant les arguments supplémentaires (*args_to_ignore) que scipy lui passe,
-        # mais elle continue d'utiliser les 'args' du contexte pour l'appel de la fonction.
-        wrapped_objective = lambda x, *args_to_ignore: objective_function(np.append(x, fixed_price), *args)
-        
-        wrapped_cash_constraint = lambda x: cash_flow_constraint(np.append(x, fixed_price), *args)
-        
-        nlc = NonlinearConstraint(wrapped_cash_constraint, 0, np.inf)
-        constraints.append(nlc)
-        objective_to_pass = wrapped_objective
+            raise ValueError(f"Le prix fixé de {fixed_price:,.0f} € engendre une mensualité de {mensualite_calculee:,.0f} €, ce qui dépasse votre maximum de {params['loan_params']['mensualite_max']:,.0f} €.")
+        # Le prix fixé est ajouté par le mémo à chaque point évalué
+        problem.update({'initial_guess': np.array(alloc_guess), 'bounds': alloc_bounds, 'fixed_vars': [fixed_price], 'cash_flow_constraint': True})
 
     # Cas 2: Immobilier inclus ET prix VARIABLE
     elif params['include_immo']:
-        initial_guess = np.array([1.0/num_alloc_vars if num_alloc_vars > 0 else 0.0]*num_alloc_vars + [np.mean(params['immo_price_range'])])
-        bounds = ([(0, 1)] * num_alloc_vars if num_alloc_vars > 0 else []) + [params['immo_price_range']]
-        constraints = []
-        if num_alloc_vars > 0:
-            constraints.append({'type': 'eq', 'fun': lambda x: 1 - np.sum(x[:-1])})
-        constraints.append({'type': 'ineq', 'fun': lambda x: params['loan_params']['mensualite_max'] - calculate_monthly_payment(x[-1], params['loan_params']['rate'], params['loan_params']['duration'])})
-        nlc = NonlinearConstraint(lambda x: cash_flow_constraint(x, *args), 0, np.inf)
-        constraints.append(nlc)
-        objective_to_pass = objective_function
+        problem.update({'initial_guess': np.array(alloc_guess + [np.mean(params['immo_price_range'])]), 'bounds': alloc_bounds + [params['immo_price_range']],
+                        'variable_price': True, 'cash_flow_constraint': True})
 
     # Cas 3: SANS immobilier
     else:
-        initial_guess = np.array([1.0/num_alloc_vars] * num_alloc_vars)
-        bounds = [(0, 1)] * num_alloc_vars
-        constraints = [{'type': 'eq', 'fun': lambda x: 1 - np.sum(x)}]
-        objective_to_pass = objective_function
+        problem.update({'initial_guess': np.array(alloc_guess), 'bounds': alloc_bounds, 'cash_flow_constraint': False})
+
+    return problem
+
+def _build_constraints(problem, memo):
+    num_alloc_vars, loan_params = problem['num_alloc_vars'], problem['loan_params']
+    constraints = []
+    if num_alloc_vars > 0:
+        constraints.append({'type': 'eq', 'fun': lambda x: 1 - np.sum(x[:num_alloc_vars])})
+    if problem['variable_price']:
+        constraints.append({'type': 'ineq', 'fun': lambda x: loan_params['mensualite_max'] - calculate_monthly_payment(x[-1], loan_params['rate'], loan_params['duration'])})
+    if problem['cash_flow_constraint']:
+        constraints.append(NonlinearConstraint(memo.cash_flow_constraint, 0, np.inf, jac=memo.cash_flow_jacobian))
+    return constraints
+
+def solve_from_start(problem, x0, deadline=None, maxiter=500):
+    """
+    Lance une optimisation locale SLSQP depuis `x0` (au plus `maxiter` itérations). Si `deadline`
+    (horodatage time.time()) est dépassé, l'optimisation s'arrête et retourne le dernier point atteint.
+    """
+    memo = SimulationMemo(problem['args'], fixed_vars=problem['fixed_vars'], bounds=problem['bounds'])
+
+    def stop_at_deadline(intermediate_result):
+        if deadline is not None and time.time() > deadline:
+            raise StopIteration
 
     opt_result = minimize(
-        objective_to_pass,
-        initial_guess,
-        args=args,
+        memo.objective,
+        np.asarray(x0, dtype=float),
+        jac=memo.objective_gradient,
         method='SLSQP',
-        bounds=bounds,
-        constraints=constraints,
-        options={'maxiter': 500, 'ftol': 1e-9}
+        bounds=problem['bounds'],
+        constraints=_build_constraints(problem, memo),
+        options={'maxiter': maxiter, 'ftol': 1e-9},
+        callback=stop_at_deadline if deadline is not None else None
     )
-    
-    return opt_result, args
\ No newline at end of file
+    opt_result.evaluations = memo.statistics()
+    opt_result.feasible = is_feasible(problem, opt_result.x, memo)
+    return opt_result
+
+def is_feasible(problem, x, memo=None, tol=1e-6):
+    """Vérifie les contraintes (somme des poids, mensualité maximale, cash-flows positifs) au point `x`."""
+    x = np.asarray(x, dtype=float)
+    num_alloc_vars, loan_params = problem['num_alloc_vars'], problem['loan_params']
+    if num_alloc_vars > 0 and abs(1 - np.sum(x[:num_alloc_vars])) > 1e-4:
+        return False
+    if problem['variable_price'] and calculate_monthly_payment(x[-1], loan_params['rate'], loan_params['duration']) > loan_params['mensualite_max'] + tol:
+        return False
+    if problem['cash_flow_constraint']:
+        memo = memo or SimulationMemo(problem['args'], fixed_vars=problem['fixed_vars'])
+        if memo.cash_flow_constraint(x).min(initial=0) < -tol:
+            return False
+    return True
+
+def _unit_to_vars(problem, U):
+    """
+    Transforme des points du cube unité (K × d) en variables d'optimisation : les n-1 premières
+    coordonnées donnent une allocation uniforme sur le simplexe (espacements des valeurs triées),
+    la dernière le prix immobilier dans sa fourchette.
+    """
+    U = np.atleast_2d(U)
+    num_alloc_vars = problem['num_alloc_vars']
+    n_simplex = max(num_alloc_vars - 1, 0)
+    columns = []
+    if num_alloc_vars > 0:
+        cuts = np.sort(U[:, :n_simplex], axis=1)
+        columns.append(np.diff(np.hstack([np.zeros((len(U), 1)), cuts, np.ones((len(U), 1))]), axis=1))
+    if problem['variable_price']:
+        low, high = problem['bounds'][-1]
+        columns.append((low + U[:, n_simplex] * (high - low))[:, None])
+    return np.hstack(columns) if columns else np.zeros((len(U), 0))
+
+def _search_dimension(problem):
+    return max(problem['num_alloc_vars'] - 1, 0) + (1 if problem['variable_price'] else 0)
+
+def generate_starting_points(problem, n_starts, sampler='lhs', seed=0):
+    """
+    Génère les points de départ du multi-départs (hypercube latin ou suite de Sobol sur le simplexe
+    × fourchette de prix). Le point de départ de l'optimisation locale est toujours inclus en premier.
+    """
+    d = _search_dimension(problem)
+    if d == 0 or n_starts <= 1:
+        return problem['initial_guess'][None, :]
+    if sampler == 'sobol':
+        U = qmc.Sobol(d, scramble=True, seed=seed).random_base2(int(np.ceil(np.log2(n_starts - 1))))[:n_starts - 1]
+    elif sampler == 'lhs':
+        U = qmc.LatinHypercube(d, seed=seed).random(n_starts - 1)
+    else:
+        raise ValueError(f"Échantillonneur inconnu : '{sampler}'. Disponibles : {', '.join(ECHANTILLONNEURS)}.")
+    return np.vstack([problem['initial_guess'], _unit_to_vars(problem, U)])
+
+def summarize_optima(net_worths, tol_rel=1e-4):
+    """Dispersion des optima locaux : meilleur, médian, pire, écart-type et nombre d'optima distincts."""
+    values = np.sort(np.asarray(net_worths, dtype=float))
+    if len(values) == 0:
+        return {'best': np.nan, 'median': np.nan, 'worst': np.nan, 'std': np.nan, 'n_distinct': 0}
+    tolerance = max(1.0, tol_rel * np.abs(values).max())
+    return {
+        'best': values[-1],
+        'median': float(np.median(values)),
+        'worst': values[0],
+        'std': float(values.std()),
+        'n_distinct': int(1 + np.sum(np.diff(values) > tolerance)),
+    }
+
+class _PenalizedObjective:
+    """Objectif pénalisé pour l'évolution différentielle, évalué sur le cube unité (sérialisable)."""
+    def __init__(self, problem, penalty=1e3):
+        self.problem = problem
+        self.penalty = penalty
+        self.inputs = None
+
+    def __call__(self, U):
+        # Appel vectorisé : U est de forme (d × K) ; appel simple : U est de forme (d,)
+        U = np.asarray(U, dtype=float)
+        batch = U.T if U.ndim == 2 else U[None, :]
+        problem = self.problem
+        X = _unit_to_vars(problem, batch)
+        full_X = np.hstack([X, np.tile(np.asarray(problem['fixed_vars'], dtype=float), (len(X), 1))])
+        if self.inputs is None:
+            self.inputs = extract_simulation_inputs(problem['args'][0], problem['args'][4])
+        result = simulate_batch(full_X, *problem['args'], inputs=self.inputs)
+        violation = np.maximum(0, -result['cash_flow']).sum(axis=1) if problem['cash_flow_constraint'] else 0
+        if problem['variable_price']:
+            loan_params = problem['loan_params']
+            payments = np.array([calculate_monthly_payment(price, loan_params['rate'], loan_params['duration']) for price in X[:, -1]])
+            violation = violation + 12 * np.maximum(0, payments - loan_params['mensualite_max'])
+        values = -result['final_net_worth'] + self.penalty * violation
+        return values if U.ndim == 2 else values[0]
+
+def _run_multistart(problem, n_starts, sampler, seed, deadline, workers):
+    starts = generate_starting_points(problem, n_starts, sampler, seed)
+    results, budget_exhausted = [None] * len(starts), False
+    executor = ProcessPoolExecutor(max_workers=workers)
+    futures = {executor.submit(solve_from_start, problem, x0, deadline): k for k, x0 in enumerate(starts)}
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline - time.time())):
+            results[futures[future]] = future.result()
+    except FuturesTimeoutError:
+        budget_exhausted = True
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    completed = [(k, r) for k, r in enumerate(results) if r is not None]
+    budget_exhausted = budget_exhausted or any(r.status == 99 for _, r in completed)
+    return completed, len(starts), budget_exhausted
+
+def _run_differential_evolution(problem, seed, deadline, workers):
+    d = _search_dimension(problem)
+    if d == 0:
+        return [(0, solve_from_start(problem, problem['initial_guess'], deadline))], 1, False, []
+    objective = _PenalizedObjective(problem)
+    stopped = {'budget': False}
+
+    def stop_at_deadline(xk, convergence):
+        stopped['budget'] = time.time() > deadline
+        return stopped['budget']
+
+    # Un seul processus : la population entière est évaluée en un appel vectorisé du noyau
+    parallel = {'vectorized': True} if workers == 1 else {'workers': workers}
+    de_result = differential_evolution(objective, [(0, 1)] * d, seed=seed, polish=False, updating='deferred',
+                                       callback=stop_at_deadline, **parallel)
+    # Affinage local (SLSQP) depuis la meilleure solution, si le budget le permet
+    x_best = _unit_to_vars(problem, de_result.x)[0]
+    polished = solve_from_start(problem, x_best, deadline)
+    # Les membres de la population finale ne sont que des points évalués, pas des résultats d'optimisation :
+    # ils alimentent le tableau des optima locaux mais ne peuvent pas être retenus comme meilleur résultat
+    population_rows = []
+    population = getattr(de_result, 'population', None)
+    if population is not None:
+        for k, (u, energy) in enumerate(zip(population, de_result.population_energies), start=1):
+            x = _unit_to_vars(problem, u)[0]
+            population_rows.append((k, x, energy, is_feasible(problem, x)))
+    return [(0, polished)], 1 + len(population_rows), stopped['budget'] or polished.status == 99, population_rows
+
+def _best_result(results, rtol=1e-9):
+    """
+    Meilleur résultat d'optimisation : réalisable de préférence, puis d'objectif minimal. À objectif égal
+    (à `rtol` près), un résultat ayant convergé est préféré à un départ interrompu.
+    """
+    feasible = [r for r in results if r.feasible and np.isfinite(r.fun)]
+    candidates = feasible or list(results)
+    if not candidates:
+        return None
+    best_fun = min(r.fun for r in candidates)
+    ties = [r for r in candidates if r.fun <= best_fun + rtol * max(1.0, abs(best_fun))]
+    return min(ties, key=lambda r: (not r.success, r.fun))
+
+def run_global_optimization(params, mode='multistart', n_starts=32, sampler='lhs', time_budget=30.0, workers=None, seed=0):
+    """
+    Optimisation globale de l'allocation (et du prix immobilier s'il est variable) :
+    - 'multistart' : optimisations SLSQP depuis `n_starts` points (hypercube latin ou Sobol) réparties
+      sur un ProcessPoolExecutor,
+    - 'differential_evolution' : évolution différentielle (parallélisée via `workers`), puis affinage SLSQP.
+    Le calcul s'arrête au bout de `time_budget` secondes en retournant les résultats partiels.
+
+    Retourne un dictionnaire : meilleur résultat réalisable ('best', de la même forme que le résultat de
+    `setup_and_run_optimization`), 'args', tableau des optima locaux, dispersion ('spread'), nombre de
+    départs terminés et indicateur d'épuisement du budget ; ou None si aucun actif n'est sélectionné.
+    """
+    problem = build_problem(params)
+    if problem is None:
+        return None
+    started = time.time()
+    deadline = started + time_budget
+    workers = workers or os.cpu_count() or 1
+
+    population_rows = []
+    if mode == 'multistart':
+        completed, n_planned, budget_exhausted = _run_multistart(problem, n_starts, sampler, seed, deadline, workers)
+    elif mode == 'differential_evolution':
+        completed, n_planned, budget_exhausted, population_rows = _run_differential_evolution(problem, seed, deadline, workers)
+    else:
+        raise ValueError(f"Mode d'optimisation inconnu : '{mode}'.")
+
+    num_alloc_vars = problem['num_alloc_vars']
+    asset_names = problem['args'][0]
+    rows = []
+    for k, result in completed:
+        row = {'Départ': k, 'Patrimoine Net Final': -result.fun, 'Réalisable': bool(result.feasible), 'Convergé': bool(result.success)}
+        row.update({f"Poids {name}": w for name, w in zip(asset_names, result.x[:num_alloc_vars])})
+        if problem['variable_price']:
+            row['Prix Immobilier'] = result.x[-1]
+        rows.append(row)
+    for k, x, energy, feasible_member in population_rows:
+        row = {'Départ': k, 'Patrimoine Net Final': -energy, 'Réalisable': bool(feasible_member), 'Convergé': False}
+        row.update({f"Poids {name}": w for name, w in zip(asset_names, x[:num_alloc_vars])})
+        if problem['variable_price']:
+            row['Prix Immobilier'] = x[-1]
+        rows.append(row)
+    local_optima = pd.DataFrame(rows)
+
+    feasible = [r for _, r in completed if r.feasible and np.isfinite(r.fun)]
+    best = _best_result([r for _, r in completed])
+    return {
+        'best': best,
+        'args': problem['args'],
+        'local_optima': local_optima,
+        'spread': summarize_optima(local_optima.loc[local_optima['Réalisable'], 'Patrimoine Net Final'] if not local_optima.empty else []),
+        'n_completed': len(completed) + len(population_rows),
+        'n_planned': n_planned,
+        'best_is_feasible': bool(feasible),
+        'budget_exhausted': budget_exhausted,
+        'elapsed': time.time() - started,
+        'mode': mode,
+    }
+
+# Paramètres balayables par la frontière : libellé et plage par défaut
+PARAMETRES_FRONTIERE = {
+    'monthly_investment': ("Épargne mensuelle (€)", (100, 3000)),
+    'marginal_tax_rate': ("TMI (%)", (0, 45)),
+    'fixed_immo_price': ("Prix du bien immobilier (€)", (50000, 400000)),
+    'per_deduction_limit': ("Plafond annuel PER (€)", (0, 35000)),
+    'initial_capital': ("Capital de départ (€)", (0, 200000)),
+}
+
+# Itérations SLSQP par départ sur la frontière : au-delà, les départs qui n'ont pas convergé n'améliorent
+# plus l'objectif mais dominent le temps de calcul
+MAXITER_FRONTIERE = 100
+
+def _override_parameter(params, parameter, value):
+    overridden = dict(params)
+    if parameter == 'fixed_immo_price':
+        overridden.update({'include_immo': True, 'fix_immo_price': True, 'fixed_immo_price': value})
+    else:
+        overridden[parameter] = value
+    return overridden
+
+def _solve_sweep_chunk(params, parameter, values):
+    """
+    Résout une suite contiguë de points de la frontière. Chaque point part du point initial et, si la
+    solution du point précédent a convergé vers un point réalisable, aussi de celle-ci (démarrage à chaud) :
+    le problème n'étant pas convexe (plafond PER), un démarrage à chaud seul peut rester dans un optimum
+    local. On garde le meilleur résultat réalisable des deux départs.
+    """
+    label = PARAMETRES_FRONTIERE[parameter][0]
+    rows, previous_x = [], None
+    for value in values:
+        row = {label: value}
+        try:
+            problem = build_problem(_override_parameter(params, parameter, value))
+        except ValueError:
+            problem = None
+        if problem is None:
+            rows.append({**row, 'Patrimoine Net Final': np.nan, 'Réalisable': False, 'Convergé': False})
+            previous_x = None
+            continue
+        results = [solve_from_start(problem, problem['initial_guess'], maxiter=MAXITER_FRONTIERE)]
+        if previous_x is not None and len(previous_x) == len(problem['initial_guess']):
+            results.append(solve_from_start(problem, previous_x, maxiter=MAXITER_FRONTIERE))
+        result = _best_result(results)
+        previous_x = result.x if result.success and result.feasible else None
+        row.update({'Patrimoine Net Final': -result.fun, 'Réalisable': bool(result.feasible), 'Convergé': bool(result.success),
+                    'Simulations': sum(r.evaluations['simulations'] for r in results)})
+        row.update({f"Poids {name}": w for name, w in zip(problem['args'][0], result.x[:problem['num_alloc_vars']])})
+        if problem['variable_price']:
+            row['Prix Immobilier'] = result.x[-1]
+        rows.append(row)
+    return rows
+
+def run_frontier_sweep(params, parameter, values, workers=None):
+    """
+    Frontière d'optimisation : résout le problème pour chaque valeur de `parameter` (voir
+    PARAMETRES_FRONTIERE). La grille est découpée en tranches contiguës réparties sur un
+    ProcessPoolExecutor ; dans chaque tranche, les points sont résolus comme dans `_solve_sweep_chunk`.
+    Retourne un DataFrame (une ligne par point, trié par valeur du paramètre).
+    """
+    if parameter not in PARAMETRES_FRONTIERE:
+        raise ValueError(f"Paramètre de frontière inconnu : '{parameter}'.")
+    values = np.asarray(values, dtype=float)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(values)))
+    chunks = [chunk for chunk in np.array_split(values, workers) if len(chunk)]
+
+    if workers == 1:
+        rows = _solve_sweep_chunk(params, parameter, values)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = [row for chunk_rows in executor.map(_solve_sweep_chunk, [params] * len(chunks), [parameter] * len(chunks), chunks) for row in chunk_rows]
+    return pd.DataFrame(rows).sort_values(PARAMETRES_FRONTIERE[parameter][0], ignore_index=True)
+
+def setup_and_run_optimization(params):
+    """
+    Configure et lance l'optimisation en tenant compte du prix fixe ou variable de l'immobilier.
+    """
+    try:
+        problem = build_problem(params)
+    except ValueError as e:
+        st.error(str(e))
+        return None, None
+    if problem is None:
+        return None, None
+
+    opt_result = solve_from_start(problem, problem['initial_guess'])
+    return opt_result, problem['args']
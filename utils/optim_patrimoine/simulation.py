@@ -1,6 +1,8 @@
 # Fichier: simulation.py (version mise à jour)
 import pandas as pd
+import numpy as np
 import numpy_financial as npf
+from ..trace_performance import TRACE_INACTIVE
 
 def calculate_monthly_payment(loan_amount, rate_pct, duration_years):
     """
@@ -14,126 +16,192 @@ def calculate_monthly_payment(loan_amount, rate_pct, duration_years):
         return float('inf')
     return -npf.pmt(monthly_rate, n_months, loan_amount)
 
-def run_unified_simulation(optimization_vars, asset_names, initial_capital, monthly_investment,
-                           investment_horizon, df_options_financiers, immo_params, loan_params,
-                           marginal_tax_rate, per_deduction_limit):
+def calculate_monthly_payments(loan_amounts, rate_pct, duration_years):
     """
-    Exécute une simulation complète de la croissance du patrimoine sur l'horizon de temps.
+    Version vectorisée de `calculate_monthly_payment` pour un tableau de montants empruntés.
     """
-    include_immo = immo_params is not None
-    financial_asset_names = [name for name in asset_names if name != 'Projet Immobilier']
+    loan_amounts = np.asarray(loan_amounts, dtype=float)
+    if duration_years <= 0 or rate_pct < 0:
+        return np.zeros_like(loan_amounts)
+    payments = -npf.pmt((rate_pct / 100) / 12, duration_years * 12, loan_amounts)
+    return np.where(loan_amounts > 0, payments, 0.0)
 
-    if include_immo:
-        allocation_weights = optimization_vars[:-1] if len(financial_asset_names) > 0 else []
-        target_immo_price = optimization_vars[-1]
+IMMO_DETAIL_COLS = ['Remboursement Annuel Prêt', 'Loyers Bruts', "Intérêts d'Emprunt", 'Impôt Locatif', 'Cash-Flow Net Immo']
+KPI_NAMES = ['total_tax_saving_per', 'total_rental_tax', 'total_interest_paid', 'total_rent_received', 'leaked_cash']
+
+def history_columns(financial_asset_names):
+    """
+    Colonnes de l'historique annuel, dans l'ordre affiché par l'interface.
+    """
+    base_cols = list(financial_asset_names) + ['Immobilier (Bien)', 'Dette Immobilière', 'Total Net']
+    return base_cols + IMMO_DETAIL_COLS + ['Soutien Épargne Immo'] + [f"Flux {name}" for name in financial_asset_names]
+
+def extract_simulation_inputs(asset_names, df_options_financiers):
+    """
+    Extrait une fois pour toutes les vecteurs de frais et de rendements des actifs financiers,
+    dans l'ordre des variables d'optimisation.
+    """
+    financial_asset_names = [name for name in asset_names if name != 'Projet Immobilier']
+    if financial_asset_names:
+        options = df_options_financiers.loc[financial_asset_names]
+        entry_fees = options['Frais Entrée (%)'].to_numpy(dtype=float) / 100
+        growth_factors = 1 + options['Rendement Annuel (%)'].to_numpy(dtype=float)/100 - options['Frais Gestion Annuels (%)'].to_numpy(dtype=float)/100
     else:
-        allocation_weights, target_immo_price = optimization_vars, 0
+        entry_fees, growth_factors = np.zeros(0), np.ones(0)
+    return {
+        'financial_asset_names': financial_asset_names,
+        'entry_fees': entry_fees,
+        'growth_factors': growth_factors,
+        'per_index': financial_asset_names.index('PER') if 'PER' in financial_asset_names else None,
+    }
+
+def simulate_batch(optimization_vars_batch, asset_names, initial_capital, monthly_investment,
+                   investment_horizon, df_options_financiers, immo_params, loan_params,
+                   marginal_tax_rate, per_deduction_limit, keep_history=False, inputs=None):
+    """
+    Noyau NumPy de la simulation : évalue en une passe vectorisée un lot de K vecteurs de variables
+    d'optimisation (tableau K × n_vars), avec les mêmes règles que `run_unified_simulation`.
 
-    allocation = dict(zip(financial_asset_names, allocation_weights))
+    `inputs` permet de réutiliser les vecteurs extraits par `extract_simulation_inputs`.
+    L'historique (K × années × colonnes de `history_columns`) n'est alloué que si `keep_history` est vrai.
 
-    patrimoine = {asset: 0.0 for asset in financial_asset_names}
-    patrimoine['Immobilier (Bien)'] = 0.0
+    Retourne un dictionnaire de tableaux : 'final_net_worth' (K), 'cash_flow' (K × horizon, avant
+    plafonnement à zéro), 'financial_assets' (K × n_actifs), 'immo_value', 'loan_crd', 'kpis' et 'history'.
+    """
+    if inputs is None:
+        inputs = extract_simulation_inputs(asset_names, df_options_financiers)
+    X = np.atleast_2d(np.asarray(optimization_vars_batch, dtype=float))
+    n_batch, n_fin = X.shape[0], len(inputs['financial_asset_names'])
+    include_immo = immo_params is not None
 
-    flow_cols = [f"Flux {name}" for name in financial_asset_names]
-    immo_detail_cols = ['Remboursement Annuel Prêt', 'Loyers Bruts', "Intérêts d'Emprunt", 'Impôt Locatif', 'Cash-Flow Net Immo']
-    base_cols = list(patrimoine.keys()) + ['Dette Immobilière', 'Total Net']
-    hist_cols = base_cols + immo_detail_cols + ['Soutien Épargne Immo'] + flow_cols
-    historique = pd.DataFrame(0.0, index=range(investment_horizon + 1), columns=hist_cols)
-    kpi_trackers = {'total_tax_saving_per': 0, 'total_rental_tax': 0, 'total_interest_paid': 0, 'total_rent_received': 0, 'leaked_cash': 0}
+    weights = X[:, :n_fin]
+    target_immo_price = X[:, -1] if include_immo else np.zeros(n_batch)
+    entry_fees, growth_factors = inputs['entry_fees'], inputs['growth_factors']
+    per_weights = weights[:, inputs['per_index']] if inputs['per_index'] is not None else np.zeros(n_batch)
+    net_entry = 1 - entry_fees
 
-    event_logs = []
-    cash_flow_history = [] # Pour stocker le cash-flow de chaque année
+    columns = history_columns(inputs['financial_asset_names'])
+    col = {name: j for j, name in enumerate(columns)}
+    flow_slice = slice(col[f"Flux {inputs['financial_asset_names'][0]}"], len(columns)) if n_fin else slice(0, 0)
+    history = np.zeros((n_batch, investment_horizon + 1, len(columns))) if keep_history else None
 
-    loan_crd, annuite_pret, immo_purchase_done = 0, 0, False
+    financial_assets = initial_capital * weights * net_entry
+    immo_value, loan_crd, annual_loan_payment = np.zeros(n_batch), np.zeros(n_batch), np.zeros(n_batch)
+    kpis = {name: np.zeros(n_batch) for name in KPI_NAMES}
+    cash_flow = np.zeros((n_batch, investment_horizon))
+    net_worth = np.zeros(n_batch)
+    if keep_history:
+        history[:, 0, flow_slice] = initial_capital * weights
 
-    for asset, weight in allocation.items():
-        if asset in patrimoine:
-            frais_entree = df_options_financiers.loc[asset, 'Frais Entrée (%)']/100
-            capital_flow = initial_capital * weight
-            patrimoine[asset] += capital_flow * (1 - frais_entree)
-            historique.loc[0, f"Flux {asset}"] = capital_flow
-            
+    annual_savings = monthly_investment * 12
+    tax_rate = marginal_tax_rate / 100
+    # Termes constants sur l'horizon, calculés une seule fois hors de la boucle annuelle
+    per_active = per_weights > 0.001
+    per_cap = np.divide(per_deduction_limit, per_weights, out=np.zeros(n_batch), where=per_active)
+    if include_immo:
+        loyer_annuel = target_immo_price * (immo_params['rendement_locatif_brut'] / 100)
+        charges = loyer_annuel * immo_params['charges_pct']/100
     for year in range(1, investment_horizon + 1):
-        if include_immo and not immo_purchase_done and year == 1:
-            immo_purchase_done = True
-            event_logs.append(f"Année 1: Achat d'un bien de {target_immo_price:,.0f} €.")
-            patrimoine['Immobilier (Bien)'] = target_immo_price * (1 - immo_params['frais_notaire_pct']/100)
-            loan_crd = target_immo_price
-            annuite_pret = calculate_monthly_payment(loan_crd, loan_params['rate'], loan_params['duration']) * 12
-
-        for asset in df_options_financiers.index:
-            if asset in patrimoine and patrimoine[asset] > 0:
-                rendement = df_options_financiers.loc[asset, 'Rendement Annuel (%)']/100
-                frais_gestion = df_options_financiers.loc[asset, 'Frais Gestion Annuels (%)']/100
-                patrimoine[asset] *= (1 + rendement - frais_gestion)
-        
-        if immo_purchase_done:
-            patrimoine['Immobilier (Bien)'] *= (1 + immo_params['immo_reval_rate']/100)
-
-        annual_savings = monthly_investment * 12
-        net_immo_cash_flow = 0
-        if immo_purchase_done:
-            loyer_annuel = target_immo_price * (immo_params['rendement_locatif_brut'] / 100)
+        if include_immo and year == 1:
+            immo_value = target_immo_price * (1 - immo_params['frais_notaire_pct']/100)
+            loan_crd = target_immo_price.copy()
+            annual_loan_payment = calculate_monthly_payments(target_immo_price, loan_params['rate'], loan_params['duration']) * 12
+
+        financial_assets = np.where(financial_assets > 0, financial_assets * growth_factors, financial_assets)
+
+        net_immo_cash_flow = np.zeros(n_batch)
+        if include_immo:
+            immo_value = immo_value * (1 + immo_params['immo_reval_rate']/100)
+
             interets = loan_crd * (loan_params['rate']/100)
-            charges_deductibles = (loyer_annuel * immo_params['charges_pct']/100) + interets
-            revenu_imposable = loyer_annuel - charges_deductibles
-            impot_locatif = max(0, revenu_imposable) * (marginal_tax_rate/100 + 0.172)
-            
-            remb_capital = min(loan_crd, annuite_pret - interets)
+            impot_locatif = np.maximum(0, loyer_annuel - (charges + interets)) * (tax_rate + 0.172)
+
+            remb_capital = np.minimum(loan_crd, annual_loan_payment - interets)
             paiement_annuel_pret = interets + remb_capital
-            
-            loan_crd = max(0, loan_crd - remb_capital)
-            net_immo_cash_flow = loyer_annuel - paiement_annuel_pret - (loyer_annuel*immo_params['charges_pct']/100) - impot_locatif
-            
-            kpi_trackers.update({
-                'total_rent_received': kpi_trackers['total_rent_received'] + loyer_annuel, 
-                'total_interest_paid': kpi_trackers['total_interest_paid'] + interets, 
-                'total_rental_tax': kpi_trackers['total_rental_tax'] + impot_locatif
-            })
-            
-            historique.loc[year, 'Remboursement Annuel Prêt'] = paiement_annuel_pret
-            historique.loc[year, 'Loyers Bruts'] = loyer_annuel
-            historique.loc[year, "Intérêts d'Emprunt"] = interets
-            historique.loc[year, 'Impôt Locatif'] = impot_locatif
-            historique.loc[year, 'Cash-Flow Net Immo'] = net_immo_cash_flow
-            historique.loc[year, 'Soutien Épargne Immo'] = max(0, -net_immo_cash_flow)
-        
+            loan_crd = np.maximum(0, loan_crd - remb_capital)
+            net_immo_cash_flow = loyer_annuel - paiement_annuel_pret - charges - impot_locatif
+
+            kpis['total_rent_received'] += loyer_annuel
+            kpis['total_interest_paid'] += interets
+            kpis['total_rental_tax'] += impot_locatif
+            if keep_history:
+                for name, values in zip(IMMO_DETAIL_COLS, (paiement_annuel_pret, loyer_annuel, interets, impot_locatif, net_immo_cash_flow)):
+                    history[:, year, col[name]] = values
+                history[:, year, col['Soutien Épargne Immo']] = np.maximum(0, -net_immo_cash_flow)
+
         cash_for_investment = annual_savings + net_immo_cash_flow
-        cash_flow_history.append(cash_for_investment)
+        cash_flow[:, year - 1] = cash_for_investment
+        cash_for_investment = np.maximum(cash_for_investment, 0)
+
+        # Plafonnement des versements PER : l'ensemble des versements est réduit au prorata
+        capped = per_active & (cash_for_investment * per_weights > per_deduction_limit)
+        total_invested = np.where(capped, per_cap, cash_for_investment)
+
+        flows = total_invested[:, None] * weights
+        financial_assets += flows * net_entry
+
+        tax_saving = total_invested * per_weights * tax_rate
+        # L'économie d'impôt est positive ou nulle : sans versement PER, le réinvestissement est nul
+        reinvestment = tax_saving[:, None] * weights
+        financial_assets += reinvestment * net_entry
+        flows += reinvestment
+        kpis['total_tax_saving_per'] += tax_saving
+        reinvested_tax_saving = reinvestment.sum(axis=1)
+        kpis['leaked_cash'] += np.maximum(tax_saving - reinvested_tax_saving, 0.0)
+
+        net_worth = financial_assets.sum(axis=1) + immo_value - loan_crd
+        if keep_history:
+            history[:, year, :n_fin] = financial_assets
+            history[:, year, col['Immobilier (Bien)']] = immo_value
+            history[:, year, col['Dette Immobilière']] = 0.0 - loan_crd
+            history[:, year, col['Total Net']] = net_worth
+            history[:, year, flow_slice] = flows
+
+    return {
+        'final_net_worth': net_worth,
+        'cash_flow': cash_flow,
+        'financial_assets': financial_assets,
+        'immo_value': immo_value,
+        'loan_crd': loan_crd,
+        'kpis': kpis,
+        'history': history,
+        'history_columns': columns,
+    }
 
+def run_unified_simulation(optimization_vars, asset_names, initial_capital, monthly_investment,
+                           investment_horizon, df_options_financiers, immo_params, loan_params,
+                           marginal_tax_rate, per_deduction_limit, trace=None):
+    """
+    Exécute une simulation complète de la croissance du patrimoine sur l'horizon de temps.
+    Interface détaillée pour l'affichage : appelle le noyau `simulate_batch` et construit l'historique
+    sous forme de DataFrame, le journal des événements et les indicateurs.
+    `trace` (TracePerformance, optionnel) mesure le noyau et la mise en forme ; le noyau étant vectorisé
+    sur l'horizon, il n'y a pas de découpage par année.
+    """
+    trace = trace if trace is not None else TRACE_INACTIVE
+    with trace.etape('simulate_batch', horizon=int(investment_horizon)):
+        result = simulate_batch(optimization_vars, asset_names, initial_capital, monthly_investment,
+                                investment_horizon, df_options_financiers, immo_params, loan_params,
+                                marginal_tax_rate, per_deduction_limit, keep_history=True)
+    with trace.etape('mise_en_forme_simulation'):
+        return _format_unified_simulation(result, optimization_vars, investment_horizon, immo_params)
+
+def _format_unified_simulation(result, optimization_vars, investment_horizon, immo_params):
+    """Construit l'historique, le journal des événements et les indicateurs à partir du résultat du noyau."""
+    financial_asset_names = result['history_columns'][:result['financial_assets'].shape[1]]
+
+    patrimoine = {asset: float(value) for asset, value in zip(financial_asset_names, result['financial_assets'][0])}
+    patrimoine['Immobilier (Bien)'] = float(result['immo_value'][0])
+    historique = pd.DataFrame(result['history'][0], index=range(investment_horizon + 1), columns=result['history_columns'])
+    kpi_trackers = {name: float(values[0]) for name, values in result['kpis'].items()}
+    cash_flow_history = result['cash_flow'][0].tolist()
+
+    event_logs = []
+    if immo_params is not None and investment_horizon >= 1:
+        event_logs.append(f"Année 1: Achat d'un bien de {optimization_vars[-1]:,.0f} €.")
+    for year, cash_for_investment in enumerate(cash_flow_history, start=1):
         if cash_for_investment < 0:
             event_logs.append(f"⚠️ Année {year}: Cash-flow déficitaire ({cash_for_investment:,.0f} €) détecté.")
-            cash_for_investment = 0
-        
-        per_weight = allocation.get('PER', 0)
-        total_invested_this_year = cash_for_investment
-        if per_weight > 0.001 and total_invested_this_year * per_weight > per_deduction_limit:
-            total_invested_this_year = per_deduction_limit / per_weight
-        
-        per_contribution_this_year = total_invested_this_year * per_weight
-        
-        for asset, weight in allocation.items():
-            flow_amount = total_invested_this_year * weight
-            frais_entree = df_options_financiers.loc[asset, 'Frais Entrée (%)']/100
-            patrimoine[asset] += flow_amount * (1 - frais_entree)
-            historique.loc[year, f"Flux {asset}"] = flow_amount
-
-        tax_saving = per_contribution_this_year * (marginal_tax_rate / 100)
-        if tax_saving > 0:
-            kpi_trackers['total_tax_saving_per'] += tax_saving
-            reinvested_tax_saving = 0
-            for asset, weight in allocation.items():
-                reinvestment_amount = tax_saving * weight
-                patrimoine[asset] += reinvestment_amount * (1 - (df_options_financiers.loc[asset, 'Frais Entrée (%)']/100))
-                if f"Flux {asset}" in historique.columns:
-                    historique.loc[year, f"Flux {asset}"] += reinvestment_amount
-                reinvested_tax_saving += reinvestment_amount
-            if tax_saving > reinvested_tax_saving:
-                kpi_trackers['leaked_cash'] += (tax_saving - reinvested_tax_saving)
-
-        for col in patrimoine: historique.loc[year, col] = patrimoine.get(col, 0)
-        historique.loc[year, 'Dette Immobilière'] = -loan_crd
-        historique.loc[year, 'Total Net'] = sum(patrimoine.values()) - loan_crd
 
     final_net_worth = historique['Total Net'].iloc[-1]
-    return final_net_worth, patrimoine, loan_crd, historique, event_logs, kpi_trackers, cash_flow_history
\ No newline at end of file
+    return final_net_worth, patrimoine, float(result['loan_crd'][0]), historique, event_logs, kpi_trackers, cash_flow_history
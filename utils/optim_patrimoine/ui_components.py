@@ -1,4 +1,5 @@
 # Fichier: ui_components.py (version mise à jour pour être contextuelle)
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -51,6 +52,23 @@ def setup_sidebar(page_name="optimisation"):
         'duration': st.sidebar.slider("Durée crédit (ans)", 10, 25, 20, 1, disabled=not include_immo)
     })
 
+    optimization_settings = {'optimization_mode': 'locale'}
+    if page_name == "optimisation":
+        st.sidebar.header("Recherche Globale")
+        optimization_mode = st.sidebar.radio(
+            "Mode d'optimisation",
+            options=['locale', 'multistart', 'differential_evolution'],
+            format_func=lambda m: {"locale": "Locale (SLSQP)", "multistart": "Globale multi-départs", "differential_evolution": "Évolution différentielle"}[m],
+            help="Avec un prix immobilier variable, le problème n'est pas convexe : les modes globaux explorent plusieurs points de départ."
+        )
+        optimization_settings = {
+            'optimization_mode': optimization_mode,
+            'n_starts': st.sidebar.slider("Nombre de points de départ", 4, 128, 32, 4, disabled=optimization_mode != 'multistart'),
+            'sampler': st.sidebar.selectbox("Échantillonnage des départs", options=['lhs', 'sobol'], format_func=lambda e: {"lhs": "Hypercube latin", "sobol": "Suite de Sobol"}[e], disabled=optimization_mode != 'multistart'),
+            'time_budget': st.sidebar.slider("Budget de temps (s)", 5, 300, 30, 5, disabled=optimization_mode == 'locale'),
+            'workers': st.sidebar.number_input("Processus parallèles", 1, os.cpu_count() or 1, os.cpu_count() or 1, disabled=optimization_mode == 'locale'),
+        }
+
     manual_allocations = {}
     # <<< MODIFIÉ : On n'affiche cette section que sur la page de simulation >>>
     if page_name == "simulation":
@@ -78,7 +96,8 @@ def setup_sidebar(page_name="optimisation"):
         "immo_params": immo_params,
         "fix_immo_price": fix_immo_price,
         "fixed_immo_price": fixed_immo_price,
-        "manual_allocations": manual_allocations # On retourne les allocations
+        "manual_allocations": manual_allocations, # On retourne les allocations
+        **optimization_settings
     }
 
 
@@ -88,6 +107,9 @@ def display_results(opt_result, simulation_args):
     with st.expander("Voir le journal de l'optimiseur", expanded=not opt_result.success):
         st.text(f"Message de l'optimiseur : {opt_result.message}")
         st.text(f"Convergence réussie : {opt_result.success}")
+        if opt_result.get('evaluations'):
+            evaluations = opt_result['evaluations']
+            st.text(f"Simulations exécutées : {evaluations['simulations']} en {evaluations['batches']} lots (pour {evaluations['requests']} demandes de l'optimiseur)")
     if not opt_result.success:
         st.error("L'optimisation n'a pas pu converger.")
         if simulation_args[5] is not None and 'x' in opt_result and len(opt_result.x) > 0:
@@ -105,6 +127,51 @@ def display_results(opt_result, simulation_args):
     display_kpis(historique, final_net_worth, kpis, simulation_args[1], simulation_args[2])
     display_allocations_and_charts(final_patrimoine, final_crd, historique, event_logs, kpis, optimal_vars, simulation_args)
 
+def display_global_search(global_result):
+    """Affiche le bilan d'une recherche globale : départs terminés, budget et dispersion des optima locaux."""
+    st.subheader("🌐 Recherche Globale")
+    spread = global_result['spread']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Départs terminés" if global_result['mode'] == 'multistart' else "Solutions de la population", f"{global_result['n_completed']} / {global_result['n_planned']}", help=f"Durée : {global_result['elapsed']:.1f} s")
+    col2.metric("Optima distincts", f"{spread['n_distinct']}")
+    col3.metric("Écart meilleur - médian", f"{spread['best'] - spread['median']:,.0f} €" if spread['n_distinct'] else "-")
+    if global_result['budget_exhausted']:
+        st.warning("Le budget de temps a été atteint : les résultats présentés sont partiels.")
+    if not global_result['best_is_feasible']:
+        st.error("Aucune solution ne respecte toutes les contraintes : la meilleure solution trouvée est affichée à titre indicatif.")
+
+    local_optima = global_result['local_optima']
+    if not local_optima.empty:
+        titre = "Patrimoine net final des optima locaux" if global_result['mode'] == 'multistart' else "Patrimoine net final de la population finale"
+        fig_optima = px.strip(local_optima, x='Patrimoine Net Final', color='Réalisable', hover_data=local_optima.columns, title=titre)
+        st.plotly_chart(fig_optima, use_container_width=True)
+        with st.expander("Détail des solutions"):
+            st.dataframe(local_optima.sort_values('Patrimoine Net Final', ascending=False), use_container_width=True, hide_index=True)
+
+def display_frontier(frontier_df, parameter_label):
+    """Affiche la frontière : patrimoine net final optimal et allocation optimale selon le paramètre balayé."""
+    fig_frontier = px.line(frontier_df, x=parameter_label, y='Patrimoine Net Final', markers=True,
+                           title=f"Patrimoine Net Final Optimal selon « {parameter_label} »",
+                           hover_data=[col for col in frontier_df.columns if col not in (parameter_label, 'Patrimoine Net Final')])
+    infeasible = frontier_df[~frontier_df['Réalisable']]
+    if not infeasible.empty:
+        fig_frontier.add_scatter(x=infeasible[parameter_label], y=infeasible['Patrimoine Net Final'], mode='markers',
+                                 marker=dict(color='indianred', symbol='x', size=9), name='Contraintes non respectées')
+    st.plotly_chart(fig_frontier, use_container_width=True)
+
+    weight_cols = [col for col in frontier_df.columns if col.startswith('Poids ')]
+    if weight_cols:
+        df_weights = frontier_df[[parameter_label] + weight_cols].rename(columns=lambda c: c.replace('Poids ', ''))
+        fig_weights = px.area(df_weights, x=parameter_label, y=[c.replace('Poids ', '') for c in weight_cols],
+                              title="Allocation Optimale de l'Épargne", labels={'value': 'Poids', 'variable': 'Actif'},
+                              color_discrete_map=COULEURS_ACTIFS_OPTIM)
+        fig_weights.update_yaxes(tickformat=".0%")
+        st.plotly_chart(fig_weights, use_container_width=True)
+
+    if 'Prix Immobilier' in frontier_df.columns:
+        fig_price = px.line(frontier_df, x=parameter_label, y='Prix Immobilier', markers=True, title="Prix Immobilier Optimal")
+        st.plotly_chart(fig_price, use_container_width=True)
+
 def display_kpis(historique, final_net_worth, kpis, initial_capital, monthly_investment):
     st.subheader("Indicateurs Clés de Performance (KPIs)")
     flow_cols = [col for col in historique.columns if 'Flux' in col]
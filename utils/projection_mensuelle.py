@@ -0,0 +1,244 @@
+# utils/projection_mensuelle.py
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from .openfisca_utils import calculer_impots
+from .calculs import calculer_echeanciers_mensuels_prets, calculer_plus_value_immobiliere_fr
+from .calculs_projection import (_preparer_donnees_initiales, _compiler_entrees_projection, _compiler_reductions_fiscales, _reduction_fiscale_annuelle,
+                                 _foyers_fiscaux, _avancer_patrimoine, _numerique, COLONNES_SEQUENTIELLES)
+from .trace_performance import TRACE_INACTIVE
+
+# Colonnes de flux : montant du mois dans la projection mensuelle, sommées sur l'année par `agreger_projection_annuelle`.
+# Les autres colonnes (encours, patrimoine, statuts) prennent leur valeur de fin d'année.
+COLONNES_FLUX = ["Revenu Annuel", "Charges (hors prêts)", "Mensualités Prêts", "Impôt sur le Revenu", "Réduction Fiscale Annuelle", "Reste à Vivre",
+                 "Cash-flow Vente", "Salaires Annuels", "Pensions Annuelles", "Revenus Locatifs Annuels", "Autres Revenus Annuels"]
+
+def _mois_naissance(adultes_df):
+    """Mois de naissance (1 à 12) de chaque adulte, janvier à défaut de date de naissance."""
+    if 'Date Naissance' not in adultes_df.columns:
+        return np.ones(len(adultes_df), dtype=int)
+    mois = pd.to_datetime(adultes_df['Date Naissance'], errors='coerce').dt.month
+    return mois.fillna(1).to_numpy(dtype=int)
+
+def _compiler_ventes_mensuelles(annees, ventes_df, stocks_df):
+    """
+    Mois de vente de chaque ligne de `stocks_df` (indice sur la chronologie mensuelle, +inf si jamais vendue).
+    Mêmes règles que `_compiler_ventes` ; le mois est lu dans la colonne facultative 'Mois de Vente' (janvier par défaut).
+    """
+    mois_vente = np.full(len(stocks_df), np.inf)
+    if ventes_df.empty or stocks_df.empty:
+        return mois_vente
+
+    premiere_annee, n_annees = int(annees[0]), len(annees)
+    mois_saisis = np.clip(np.nan_to_num(_numerique(ventes_df, 'Mois de Vente', 1.0), nan=1.0), 1, 12).astype(int)
+    ventes = [((int(annee) - premiere_annee) * 12 + mois - 1, ordre, nom)
+              for ordre, (nom, annee, mois) in enumerate(zip(ventes_df['Bien à Vendre'], ventes_df['Année de Vente'], mois_saisis))
+              if pd.notna(annee) and 0 <= int(annee) - premiere_annee < n_annees]
+    noms_actifs = stocks_df['Actif'].tolist()
+    for mois, _, nom in sorted(ventes, key=lambda v: (v[0], v[1])):
+        ligne = next((j for j, nom_actif in enumerate(noms_actifs) if nom_actif == nom and np.isinf(mois_vente[j])), None)
+        if ligne is not None:
+            mois_vente[ligne] = mois
+    return mois_vente
+
+def _matrices_prets_mensuelles(prets_df, premier_mois_absolu, n_mois):
+    """
+    Échéanciers de tous les prêts en matrices denses (prêts × mois de la projection) : mensualités (assurance
+    comprise), capital restant dû avant et après l'échéance du mois. Les mois hors de la durée d'un prêt valent 0.
+    """
+    matrices = {cle: np.zeros((len(prets_df), n_mois)) for cle in ('mensualites', 'crd_debut', 'crd_fin')}
+    if prets_df.empty:
+        return matrices
+    echeanciers = calculer_echeanciers_mensuels_prets(prets_df)
+    colonnes = echeanciers['mois_absolus'] - premier_mois_absolu
+    garder = echeanciers['masque'] & (colonnes >= 0) & (colonnes < n_mois)
+    lignes = np.broadcast_to(np.arange(len(prets_df))[:, None], garder.shape)[garder]
+    colonnes = colonnes[garder]
+    matrices['mensualites'][lignes, colonnes] = (echeanciers['mensualite_pi'] + echeanciers['assurance'])[garder]
+    matrices['crd_fin'][lignes, colonnes] = echeanciers['crd'][garder]
+    matrices['crd_debut'][lignes, colonnes] = (echeanciers['crd'] + echeanciers['principal'])[garder]
+    return matrices
+
+def _vendre_bien(ligne, mois, premiere_annee, valeurs, detenus, historique_achat, prets, prets_df):
+    """
+    Vend le bien `ligne` au début du mois d'indice `mois` : plus-value, remboursement anticipé du capital restant dû
+    des prêts associés, dont les échéances sont supprimées à partir de ce mois.
+    Retourne (cash net, message du journal).
+    """
+    annee, numero_mois = premiere_annee + mois // 12, mois % 12 + 1
+    nom_bien_vendu = historique_achat['Actif'].iat[ligne]
+    prix_de_vente = valeurs[ligne]
+    donnees_achat = historique_achat.loc[historique_achat['Actif'] == nom_bien_vendu].iloc[0]
+
+    impot_pv, _, details_pv = calculer_plus_value_immobiliere_fr(
+        prix_achat=donnees_achat['Prix Achat Initial'],
+        prix_vente=prix_de_vente,
+        date_achat=pd.to_datetime(donnees_achat['Date Achat']),
+        date_vente=datetime(annee, numero_mois, 1),
+        est_residence_principale="jouissance" in donnees_achat['Type']
+    )
+
+    prets_associes = (prets_df['Actif Associé'] == nom_bien_vendu).to_numpy(dtype=bool) if not prets_df.empty else np.zeros(0, dtype=bool)
+    crd_rembourse = prets['crd_debut'][prets_associes, mois].sum()
+    for matrice in prets.values():
+        matrice[prets_associes, mois:] = 0.0
+
+    cash_net = prix_de_vente - impot_pv - crd_rembourse
+    detenus[ligne] = False
+    return cash_net, f"**{annee}-{numero_mois:02d}**: Vente de '{nom_bien_vendu}' pour {prix_de_vente:,.0f}€. Cash net : **{cash_net:,.0f}€**. {details_pv}"
+
+def _calculer_flux_mensuels(entrees, mois_retraite, mois_vente, annee_du_mois):
+    """
+    Flux de chaque mois : les montants annuels compilés sont répartis par douzièmes, en tenant compte du mois
+    de départ en retraite de chaque adulte et du mois de vente de chaque bien.
+    """
+    n_mois = len(annee_du_mois)
+    mois = np.arange(n_mois)
+    inflation = entrees['facteur_inflation'][annee_du_mois]
+
+    est_retraite = mois[None, :] >= mois_retraite[:, None]
+    salaires_adultes = np.where(est_retraite, 0.0, entrees['salaires'][:, annee_du_mois]) / 12
+    pensions_adultes = np.where(est_retraite, entrees['pensions'][:, annee_du_mois], 0.0) / 12
+
+    detenu = mois[None, :] < mois_vente[:, None]
+    loyers_calcules = (detenu * entrees['loyers_annuels'][:, None]).sum(axis=0) / 12
+    loyers_locatifs = entrees['loyers_saisis_base'] * inflation / 12 + np.where(loyers_calcules > 0, loyers_calcules, 0.0)
+    autres_revenus = entrees['autres_revenus_base'] * inflation / 12
+
+    depenses_etudes = (entrees['est_etudiant'] * entrees['couts_etudes'][:, None]).sum(axis=0)[annee_du_mois] / 12
+    charges_immo = (detenu * entrees['charges_biens'][:, None]).sum(axis=0) * inflation / 12
+
+    statuts = {}
+    for i, nom_adulte in enumerate(entrees['prenoms_adultes']):
+        statuts[nom_adulte] = np.where(est_retraite[i], "Retraité", "Actif")
+    for k, enfant in enumerate(entrees['enfants_records']):
+        statuts[enfant['Prénom']] = np.where(entrees['est_etudiant'][k], "Étudiant", np.where(entrees['a_fini_etudes'][k], "Fin d'études", "Scolarisé"))[annee_du_mois]
+
+    salaires, pensions = salaires_adultes.sum(axis=0), pensions_adultes.sum(axis=0)
+    return {
+        "total_revenus": salaires + pensions + loyers_locatifs + autres_revenus,
+        "salaires": salaires,
+        "pensions": pensions,
+        "loyers_locatifs": loyers_locatifs,
+        "autres_revenus": autres_revenus,
+        "total_depenses": entrees['charges_courantes_base'] * inflation / 12 + depenses_etudes + charges_immo,
+        "revenus_adultes": salaires_adultes + pensions_adultes,
+        "statuts": statuts,
+    }
+
+def _sommes_annuelles(valeurs_mensuelles):
+    """Somme par année civile d'un vecteur (ou d'une matrice, sur son dernier axe) mensuel."""
+    return valeurs_mensuelles.reshape(*valeurs_mensuelles.shape[:-1], -1, 12).sum(axis=-1)
+
+def agreger_projection_annuelle(df_mensuel):
+    """
+    Agrège une projection mensuelle par année : les flux (COLONNES_FLUX) sont sommés, les autres colonnes
+    prennent leur valeur du dernier mois de l'année. Le résultat a les colonnes de `generer_projection_complete`.
+    """
+    if df_mensuel.empty:
+        return pd.DataFrame()
+    colonnes = [col for col in df_mensuel.columns if col not in ('Mois', 'Année')]
+    agregations = {col: 'sum' if col in COLONNES_FLUX else 'last' for col in colonnes}
+    return df_mensuel.groupby('Année', sort=False).agg(agregations).reset_index()
+
+def generer_projection_mensuelle(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot='openfisca', trace=None):
+    """
+    Projection au pas mensuel, de janvier de l'année en cours sur `duree` années : mêmes entrées et mêmes
+    colonnes que `generer_projection_complete`, plus 'Mois'. Les flux y sont des montants mensuels.
+
+    Les départs en retraite ont lieu le mois anniversaire de l'adulte (janvier s'il n'a pas de date de naissance,
+    ou s'il est déjà retraité en début de projection) et les ventes au mois de la colonne facultative
+    'Mois de Vente' (janvier par défaut) ; les autres flux annuels sont répartis par douzièmes. L'impôt reste
+    calculé sur l'année civile, puis lissé sur ses douze mois.
+
+    Retourne (df_mensuel, df_annuel, logs) où `df_annuel` est l'agrégation annuelle (`agreger_projection_annuelle`).
+    """
+    annee_actuelle = datetime.now().year
+    annees = np.arange(annee_actuelle, annee_actuelle + max(duree, 0))
+    if len(annees) == 0:
+        return pd.DataFrame(), pd.DataFrame(), []
+
+    trace = trace if trace is not None else TRACE_INACTIVE
+    n_mois = 12 * len(annees)
+    annee_du_mois = np.repeat(np.arange(len(annees)), 12)
+    with trace.etape('generer_projection_mensuelle', duree=int(duree)):
+        with trace.etape('_compiler_entrees_projection'):
+            adultes_df_sim, enfants_df_sim = _preparer_donnees_initiales(adultes_df, enfants_df, annee_actuelle)
+            entrees = _compiler_entrees_projection(annees, stocks_df, revenus_df, depenses_df, adultes_df_sim, enfants_df_sim, df_pension_hypotheses, ventes_df, hyp_economiques)
+            # Premier mois de retraite : mois anniversaire de la première année de retraite (janvier si déjà retraité)
+            premiere_annee_retraite = np.where(entrees['est_retraite'].any(axis=1), entrees['est_retraite'].argmax(axis=1), len(annees))
+            mois_retraite = np.where(premiere_annee_retraite > 0, 12 * premiere_annee_retraite + _mois_naissance(adultes_df) - 1, 0)
+            mois_vente = _compiler_ventes_mensuelles(annees, ventes_df, stocks_df)
+
+        with trace.etape('_calculer_flux_mensuels'):
+            flux = _calculer_flux_mensuels(entrees, mois_retraite, mois_vente, annee_du_mois)
+
+        with trace.etape('calculer_impots', moteur=moteur_impot, foyers=len(annees)):
+            foyers = _foyers_fiscaux(entrees, _sommes_annuelles(flux['total_revenus']), _sommes_annuelles(flux['revenus_adultes']), est_parent_isole)
+            impots_avant_reduction = calculer_impots(annees.tolist(), foyers, moteur=moteur_impot)
+        reduction_fiscale = _reduction_fiscale_annuelle(annees, _compiler_reductions_fiscales(stocks_df))
+        impots = (np.maximum(0, impots_avant_reduction - reduction_fiscale) / 12)[annee_du_mois]
+        reduction_fiscale = (reduction_fiscale / 12)[annee_du_mois]
+        solde_hors_prets = flux['total_revenus'] - flux['total_depenses'] - impots
+
+        with trace.etape('_matrices_prets_mensuelles', prets=len(prets_df)):
+            prets = _matrices_prets_mensuelles(prets_df, annee_actuelle * 12, n_mois)
+        types_prets = prets_df['Actif Associé'].map(pd.Series(stocks_df.Type.values, index=stocks_df.Actif).to_dict()).fillna('').astype(str) if not prets_df.empty else pd.Series(dtype=str)
+        prets_jouissance = types_prets.str.contains('jouissance').to_numpy(dtype=bool)
+        prets_productifs = types_prets.str.contains('productif').to_numpy(dtype=bool)
+
+        valeurs = _numerique(stocks_df, 'Valeur Brute', np.nan)
+        detenus = np.ones(len(stocks_df), dtype=bool)
+        facteurs_rendement = (1 + _numerique(stocks_df, 'Rendement %', np.nan) / 100) ** (1 / 12)
+        types_actifs = stocks_df['Type'].to_numpy(dtype=object)
+        historique_achat = stocks_df[['Actif', 'Prix Achat Initial', 'Date Achat', 'Type']]
+
+        ventes_par_mois = {}
+        for ligne in np.argsort(mois_vente, kind='stable'):
+            if np.isfinite(mois_vente[ligne]):
+                ventes_par_mois.setdefault(int(mois_vente[ligne]), []).append(int(ligne))
+        bornes = sorted({0, *ventes_par_mois, n_mois})
+
+        resultats = {col: np.zeros(n_mois) for col in COLONNES_SEQUENTIELLES}
+        logs_evenements = []
+        for debut, fin in zip(bornes[:-1], bornes[1:]):
+            cash_flow_vente = 0.0
+            with trace.etape('_vendre_biens', int(annees[debut // 12])):
+                for ligne in ventes_par_mois.get(debut, []):
+                    cash_net, log = _vendre_bien(ligne, debut, annee_actuelle, valeurs, detenus, historique_achat, prets, prets_df)
+                    cash_flow_vente += cash_net
+                    logs_evenements.append(log)
+
+            # Prêts inchangés jusqu'à la prochaine vente : sommes par colonne des matrices sur les mois du bloc
+            mensualites_prets = prets['mensualites'][:, debut:fin].sum(axis=0)
+            crd_fin = prets['crd_fin'][:, debut:fin]
+            passif_total = crd_fin.sum(axis=0)
+            cash_flow_vente = np.concatenate([[cash_flow_vente], np.zeros(fin - debut - 1)])
+            reste_a_vivre = solde_hors_prets[debut:fin] - mensualites_prets + cash_flow_vente
+
+            with trace.etape('_avancer_patrimoine', int(annees[debut // 12]), mois=fin - debut):
+                (pat_net, act_tot, val_fin_gross, val_immo_j_gross, val_immo_p_gross), _ = _avancer_patrimoine(
+                    valeurs, detenus, facteurs_rendement, types_actifs, reste_a_vivre, passif_total)
+
+            for col, valeur in zip(COLONNES_SEQUENTIELLES, (pat_net, act_tot, passif_total, val_fin_gross, val_immo_j_gross, val_immo_p_gross,
+                                                            crd_fin[prets_jouissance].sum(axis=0), crd_fin[prets_productifs].sum(axis=0),
+                                                            mensualites_prets, reste_a_vivre, cash_flow_vente)):
+                resultats[col][debut:fin] = valeur
+
+        with trace.etape('_assembler_projection'):
+            df_mensuel = pd.DataFrame({
+                "Mois": pd.date_range(f"{annee_actuelle}-01-01", periods=n_mois, freq='MS'), "Année": annees[annee_du_mois],
+                "Patrimoine Net": resultats["Patrimoine Net"], "Actifs Totaux": resultats["Actifs Totaux"], "Passifs Totaux": resultats["Passifs Totaux"],
+                "Patrimoine Financier": resultats["Patrimoine Financier"], "Immobilier Jouissance": resultats["Immobilier Jouissance"], "Immobilier Productif": resultats["Immobilier Productif"],
+                "Patrimoine Financier Net": resultats["Patrimoine Financier"],
+                "Immobilier Jouissance Net": resultats["Immobilier Jouissance"] - resultats["Passif Jouissance"],
+                "Immobilier Productif Net": resultats["Immobilier Productif"] - resultats["Passif Productif"],
+                "Revenu Annuel": flux["total_revenus"], "Charges (hors prêts)": flux["total_depenses"],
+                "Mensualités Prêts": resultats["Mensualités Prêts"], "Impôt sur le Revenu": impots,
+                "Réduction Fiscale Annuelle": reduction_fiscale, "Reste à Vivre": resultats["Reste à Vivre"],
+                "Cash-flow Vente": resultats["Cash-flow Vente"],
+                **{f"{membre}_Statut": statut for membre, statut in flux["statuts"].items()},
+                "Salaires Annuels": flux["salaires"], "Pensions Annuelles": flux["pensions"],
+                "Revenus Locatifs Annuels": flux["loyers_locatifs"], "Autres Revenus Annuels": flux["autres_revenus"]
+            })
+            return df_mensuel, agreger_projection_annuelle(df_mensuel), logs_evenements
@@ -0,0 +1,169 @@
+# utils/projection_monte_carlo.py
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from .calculs import calculer_plus_value_immobiliere_fr
+from .calculs_projection import _preparer_projection, _mettre_a_jour_patrimoine, _numerique
+
+# Facteurs aléatoires : une classe par type d'actif, plus l'inflation (ordre des matrices de corrélation)
+FACTEURS_MONTE_CARLO = ('Financier', 'Immobilier de jouissance', 'Immobilier productif', 'Inflation')
+LOIS_MONTE_CARLO = ('normale', 'student')
+# Épargne sur laquelle est mesuré l'épuisement : épargne financière si le foyer détient un actif financier,
+# sinon trésorerie cumulée de la trajectoire
+BASES_EPUISEMENT = {
+    'financier': "l'épargne financière",
+    'tresorerie': "la trésorerie cumulée (aucun actif financier détenu : les déficits ne sont pas absorbés par un placement)",
+}
+
+HYP_MONTE_CARLO_DEFAUT = {
+    'n_trajectoires': 10000,
+    'graine': 42,
+    'loi': 'normale',
+    'degres_liberte': 5,
+    # Écarts-types annuels, en points de pourcentage
+    'volatilites': {'Financier': 12.0, 'Immobilier de jouissance': 5.0, 'Immobilier productif': 6.0, 'Inflation': 1.0},
+    'correlations': [
+        [1.0, 0.1, 0.1, -0.1],
+        [0.1, 1.0, 0.7, 0.3],
+        [0.1, 0.7, 1.0, 0.3],
+        [-0.1, 0.3, 0.3, 1.0],
+    ],
+    'percentiles': (5, 25, 50, 75, 95),
+}
+
+def tirer_chocs_correles(n_trajectoires, n_annees, correlations, loi='normale', degres_liberte=5, graine=None):
+    """
+    Tire les chocs centrés réduits des facteurs, corrélés selon `correlations`.
+    Retourne un tableau (trajectoires × années × facteurs). La loi 'student' (queues épaisses) est
+    normalisée à variance unitaire et partage le même tirage du χ² entre facteurs d'une même année.
+    """
+    if loi not in LOIS_MONTE_CARLO:
+        raise ValueError(f"Loi inconnue : '{loi}'. Lois disponibles : {', '.join(LOIS_MONTE_CARLO)}.")
+    try:
+        cholesky = np.linalg.cholesky(np.asarray(correlations, dtype=float))
+    except np.linalg.LinAlgError:
+        raise ValueError("La matrice de corrélation doit être symétrique définie positive.")
+
+    rng = np.random.default_rng(graine)
+    chocs = rng.standard_normal((n_trajectoires, n_annees, cholesky.shape[0])) @ cholesky.T
+    if loi == 'student':
+        if degres_liberte <= 2:
+            raise ValueError("La loi de Student nécessite plus de 2 degrés de liberté.")
+        chi2 = rng.chisquare(degres_liberte, (n_trajectoires, n_annees, 1))
+        chocs *= np.sqrt((degres_liberte - 2) / chi2)
+    return chocs
+
+def _taux_imposition_plus_value(donnees_achat, annee_vente):
+    """
+    Taux global (IR + prélèvements sociaux) appliqué à la plus-value brute pour une date de vente donnée.
+    À durée de détention fixée, l'impôt est proportionnel à la plus-value brute positive : on l'obtient en
+    évaluant le calcul de référence sur une plus-value unitaire.
+    """
+    impot_unitaire, _, _ = calculer_plus_value_immobiliere_fr(
+        prix_achat=0,
+        prix_vente=1,
+        date_achat=pd.to_datetime(donnees_achat['Date Achat']),
+        date_vente=datetime(annee_vente, 12, 31),
+        est_residence_principale="jouissance" in donnees_achat['Type']
+    )
+    return impot_unitaire
+
+def generer_projection_monte_carlo(duree, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, hyp_monte_carlo=None, moteur_impot='bareme'):
+    """
+    Projection stochastique : rendements des actifs (par classe) et inflation sont tirés aléatoirement,
+    avec corrélations et graine fixe, pour des milliers de trajectoires calculées simultanément.
+
+    Les règles sont celles de `generer_projection_complete` (ventes, prêts, injection du reste à vivre dans
+    le premier actif financier détenu) ; l'inflation tirée indexe les charges et les revenus non salariaux.
+    L'impôt sur le revenu, qui ne dépend que des salaires et pensions, est calculé une seule fois.
+
+    Retourne un dictionnaire :
+    - 'bandes' : {indicateur: DataFrame (Année, P5, P25, ...)} pour 'Patrimoine Net' et 'Reste à Vivre',
+    - 'proba_epuisement' : probabilité que l'épargne devienne négative au moins une année,
+    - 'proba_epuisement_par_annee' : probabilité cumulée d'épuisement à chaque année,
+    - 'base_epuisement' : épargne sur laquelle l'épuisement est mesuré ('financier' ou 'tresorerie', voir BASES_EPUISEMENT),
+    - 'n_trajectoires'.
+
+    Sans actif financier détenu, le reste à vivre est injecté dans un bien immobilier : les déficits réduiraient
+    la valeur du bien et l'épargne financière resterait nulle. L'épuisement est alors mesuré sur la trésorerie
+    cumulée de chaque trajectoire (somme des restes à vivre, produits de vente compris).
+    """
+    hyp = {**HYP_MONTE_CARLO_DEFAUT, **(hyp_monte_carlo or {})}
+    volatilites = {**HYP_MONTE_CARLO_DEFAUT['volatilites'], **hyp.get('volatilites', {})}
+    annee_actuelle = datetime.now().year
+    annees = np.arange(annee_actuelle, annee_actuelle + max(duree, 0))
+    n_annees, n_trajectoires = len(annees), int(hyp['n_trajectoires'])
+    if n_annees == 0 or n_trajectoires <= 0:
+        return {'bandes': {}, 'proba_epuisement': 0.0, 'proba_epuisement_par_annee': np.zeros(0), 'base_epuisement': 'financier', 'n_trajectoires': 0}
+
+    preparation = _preparer_projection(annees, stocks_df, revenus_df, depenses_df, prets_df, adultes_df, enfants_df, df_pension_hypotheses, hyp_economiques, est_parent_isole, ventes_df, moteur_impot)
+    entrees, flux = preparation['entrees'], preparation['flux']
+    portefeuille, historique_achat = preparation['portefeuille'], preparation['historique_achat']
+    prets_en_cours = portefeuille.prets_en_cours()
+
+    chocs = tirer_chocs_correles(n_trajectoires, n_annees, hyp['correlations'], hyp['loi'], hyp['degres_liberte'], hyp['graine'])
+
+    # Inflation : facteur cumulé par trajectoire, égal à 1 la première année comme dans la projection déterministe
+    inflation_tiree = hyp_economiques.get('inflation', 0.0) + volatilites['Inflation'] * chocs[:, 1:, FACTEURS_MONTE_CARLO.index('Inflation')]
+    facteur_inflation = np.concatenate([np.ones((n_trajectoires, 1)), np.cumprod(1 + inflation_tiree / 100, axis=1)], axis=1)
+
+    # Flux : seule la part indexée sur l'inflation varie d'une trajectoire à l'autre
+    loyers_calcules = (entrees['detenu'] * entrees['loyers_annuels'][:, None]).sum(axis=0)
+    charges_immo_base = (entrees['detenu'] * entrees['charges_biens'][:, None]).sum(axis=0)
+    depenses_etudes = (entrees['est_etudiant'] * entrees['couts_etudes'][:, None]).sum(axis=0)
+    revenus_fixes = flux['salaires'] + flux['pensions'] + np.where(loyers_calcules > 0, loyers_calcules, 0.0)
+    revenus_indexes = entrees['loyers_saisis_base'] + entrees['autres_revenus_base']
+    depenses_indexees = entrees['charges_courantes_base'] + charges_immo_base
+    solde_hors_prets = (revenus_fixes - depenses_etudes - preparation['impots']) + (revenus_indexes - depenses_indexees) * facteur_inflation
+
+    # Rendements : rendement moyen propre à chaque bien, choc de sa classe d'actif
+    types_actifs = stocks_df['Type'].to_numpy(dtype=object)
+    classes = np.array([FACTEURS_MONTE_CARLO.index(t) if t in FACTEURS_MONTE_CARLO[:-1] else 0 for t in types_actifs], dtype=int)
+    volatilites_biens = np.array([volatilites[FACTEURS_MONTE_CARLO[c]] for c in classes])
+    rendements_moyens = _numerique(stocks_df, 'Rendement %', np.nan)
+
+    valeurs = np.tile(_numerique(stocks_df, 'Valeur Brute', np.nan), (n_trajectoires, 1))
+    detenus = np.ones(len(stocks_df), dtype=bool)
+    patrimoine_net = np.zeros((n_trajectoires, n_annees))
+    reste_a_vivre = np.zeros((n_trajectoires, n_annees))
+    epargne = np.zeros((n_trajectoires, n_annees))
+    tresorerie_cumulee = np.zeros(n_trajectoires)
+    base_epuisement = 'financier'
+
+    for t, annee in enumerate(annees.tolist()):
+        cash_flow_vente = np.zeros(n_trajectoires)
+        for ligne in entrees['ventes_par_annee'].get(annee, []):
+            nom_bien_vendu = historique_achat['Actif'].iat[ligne]
+            donnees_achat = historique_achat.loc[historique_achat['Actif'] == nom_bien_vendu].iloc[0]
+            plus_value_brute = valeurs[:, ligne] - donnees_achat['Prix Achat Initial'] * 1.075
+            impot_pv = np.where(plus_value_brute > 0, plus_value_brute * _taux_imposition_plus_value(donnees_achat, annee), 0.0)
+
+            crd_rembourse = portefeuille.solder(prets_en_cours, nom_bien_vendu, t)
+            cash_flow_vente += valeurs[:, ligne] - impot_pv - crd_rembourse
+            detenus[ligne] = False
+
+        mensualites_prets, passif_total, _, _ = portefeuille.totaux(prets_en_cours, t, t + 1)
+        reste_a_vivre[:, t] = solde_hors_prets[:, t] - mensualites_prets[0] + cash_flow_vente
+
+        facteurs_rendement = 1 + (rendements_moyens + volatilites_biens * chocs[:, t, classes]) / 100
+        tresorerie_cumulee += reste_a_vivre[:, t]
+        detient_financier = (detenus & (types_actifs == 'Financier')).any()
+        patrimoine_net[:, t], _, epargne_financiere, _, _ = _mettre_a_jour_patrimoine(valeurs, detenus, facteurs_rendement, types_actifs, reste_a_vivre[:, t], passif_total[0])
+        epargne[:, t] = epargne_financiere if detient_financier else tresorerie_cumulee
+        if not detient_financier:
+            base_epuisement = 'tresorerie'
+
+    percentiles = list(hyp['percentiles'])
+    bandes = {}
+    for indicateur, trajectoires in (("Patrimoine Net", patrimoine_net), ("Reste à Vivre", reste_a_vivre)):
+        quantiles = np.percentile(trajectoires, percentiles, axis=0)
+        bandes[indicateur] = pd.DataFrame({"Année": annees, **{f"P{p}": quantiles[k] for k, p in enumerate(percentiles)}})
+
+    epuisee = np.logical_or.accumulate(epargne < 0, axis=1)
+    return {
+        'bandes': bandes,
+        'proba_epuisement': float(epuisee[:, -1].mean()),
+        'proba_epuisement_par_annee': epuisee.mean(axis=0),
+        'base_epuisement': base_epuisement,
+        'n_trajectoires': n_trajectoires,
+    }
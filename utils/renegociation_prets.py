@@ -0,0 +1,151 @@
+# utils/renegociation_prets.py
+import itertools
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .calculs import calculer_echeanciers_mensuels_prets
+
+TYPES_OPTIONS = {'remboursement_anticipe': "Remboursement anticipé", 'renegociation': "Renégociation"}
+MODES_REMBOURSEMENT = {'duree': "Durée conservée", 'mensualite': "Mensualité conservée"}
+
+# Plafond légal des indemnités de remboursement anticipé : 3 % du capital remboursé, 6 mois d'intérêts au taux du prêt
+PLAFOND_IRA_PCT_CAPITAL = 3.0
+PLAFOND_IRA_MOIS_INTERETS = 6
+
+COLONNES_OPTIONS = ['Prêt', 'Type', 'Date', 'Montant Remboursé (€)', 'Nouveau Taux %', 'Frais (€)', 'Mode']
+
+def generer_options(indices_prets, dates, montants=(), modes=('duree',), taux=(), frais=(0.0,)):
+    """
+    Grille des options à évaluer pour chaque prêt (index de `df_prets`) et chaque date :
+    remboursements anticipés (montants × modes) et renégociations (nouveaux taux × frais, durée restante conservée).
+    Retourne un DataFrame aux colonnes COLONNES_OPTIONS ; les indemnités des remboursements anticipés sont
+    calculées par `evaluer_options` (colonne 'Frais (€)' à NaN).
+    """
+    for mode in modes:
+        if mode not in MODES_REMBOURSEMENT:
+            raise ValueError(f"Mode inconnu : '{mode}'. Modes disponibles : {', '.join(MODES_REMBOURSEMENT)}.")
+    options = [(pret, 'remboursement_anticipe', date, float(montant), np.nan, np.nan, mode)
+               for pret, date, montant, mode in itertools.product(indices_prets, dates, montants, modes)]
+    options += [(pret, 'renegociation', date, 0.0, float(nouveau_taux), float(frais_dossier), 'duree')
+                for pret, date, nouveau_taux, frais_dossier in itertools.product(indices_prets, dates, taux, frais)]
+    df_options = pd.DataFrame(options, columns=COLONNES_OPTIONS)
+    df_options['Date'] = pd.to_datetime(df_options['Date'])
+    return df_options
+
+def _mensualite(capital, r, n):
+    """Mensualité hors assurance (formule d'annuité ; amortissement linéaire à taux nul)."""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        facteur = (1 + r) ** n
+        mensualite = np.where(r > 0, capital * r * facteur / (facteur - 1), capital / np.maximum(n, 1))
+    return np.where((capital > 0) & (n > 0), mensualite, 0.0)
+
+def _crd_apres(capital, r, mensualite, j):
+    """Capital restant dû après `j` échéances de `mensualite`."""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        facteur = (1 + r) ** j
+        crd = np.where(r > 0, capital * facteur - mensualite * (facteur - 1) / np.where(r > 0, r, 1), capital - mensualite * j)
+    return np.maximum(0.0, np.nan_to_num(crd))
+
+def _nombre_echeances(capital, r, mensualite):
+    """Nombre (fractionnaire) d'échéances de `mensualite` nécessaires pour rembourser `capital`."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = np.where(r > 0, -np.log1p(-r * capital / mensualite) / np.log1p(r), capital / mensualite)
+    return np.where(capital > 0, np.nan_to_num(n, nan=np.inf), 0.0)
+
+def _valeur_acquise(montant, debut, fin, horizon, g):
+    """
+    Valeur à l'horizon (fin du mois `horizon` - 1) de versements mensuels `montant` des mois [debut, fin), placés
+    au taux mensuel `g`. Les versements postérieurs à l'horizon sont ignorés.
+    """
+    debut, fin = np.minimum(debut, horizon), np.minimum(fin, horizon)
+    if g > 0:
+        return montant * ((1 + g) ** (horizon - debut) - (1 + g) ** (horizon - fin)) / g
+    return montant * (fin - debut)
+
+def evaluer_options(prets_df, options, horizon_annees=25, taux_placement_pct=0.0, date_reference=None):
+    """
+    Évalue en une passe vectorisée toutes les options (cf. `generer_options`) sur les prêts de `prets_df`.
+
+    Pour chaque option, le capital restant dû à la date de l'option est recalculé : remboursé en partie
+    (durée ou mensualité conservée, indemnités au plafond légal) ou renégocié au nouveau taux sur la durée
+    restante. L'impact sur le patrimoine net à l'horizon (`horizon_annees` à partir de `date_reference`)
+    compare les deux trajectoires : sommes décaissées et écarts de mensualités placés au taux
+    `taux_placement_pct`, et capital restant dû à l'horizon. L'assurance, assise sur le capital initial,
+    reste due jusqu'à la dernière échéance.
+
+    Retourne les options valides (prêt en cours à la date choisie) enrichies des colonnes de résultat,
+    triées par impact sur le patrimoine net décroissant.
+    """
+    if options.empty or prets_df.empty:
+        return pd.DataFrame()
+    date_reference = pd.Timestamp(date_reference or datetime.now())
+    mois_reference = date_reference.year * 12 + date_reference.month - 1
+    echeanciers = calculer_echeanciers_mensuels_prets(prets_df)
+
+    lignes = prets_df.index.get_indexer(options['Prêt'])
+    dates = pd.to_datetime(options['Date'])
+    mois_option = np.asarray(dates.dt.year * 12 + dates.dt.month - 1, dtype=np.int64)
+    mois_depart = np.where(lignes >= 0, echeanciers['mois_absolus'][lignes, 0], 0)
+    k = mois_option - mois_depart
+    valide = (lignes >= 0) & (k >= 0) & (k < echeanciers['n_mois'][lignes]) & (mois_option >= mois_reference)
+    if not valide.any():
+        return pd.DataFrame()
+    options, lignes, k, mois_option = options[valide].reset_index(drop=True), lignes[valide], k[valide], mois_option[valide]
+
+    # Situation du prêt au début du mois de l'option (avant l'échéance du mois)
+    taux_actuel = np.nan_to_num(pd.to_numeric(prets_df['Taux Annuel %'], errors='coerce').to_numpy(dtype=float))[lignes]
+    r = np.where(taux_actuel > 0, taux_actuel / 1200, 0.0)
+    crd = echeanciers['crd'][lignes, k] + echeanciers['principal'][lignes, k]
+    mensualite = echeanciers['mensualite_pi'][lignes, 0]
+    assurance = echeanciers['assurance'][lignes, 0]
+    n_restant = echeanciers['n_mois'][lignes] - k
+    interets_restants = np.cumsum(echeanciers['interets'][:, ::-1], axis=1)[:, ::-1][lignes, k]
+
+    est_remboursement = (options['Type'] == 'remboursement_anticipe').to_numpy()
+    montant = np.where(est_remboursement, np.minimum(np.maximum(options['Montant Remboursé (€)'].to_numpy(dtype=float), 0.0), crd), 0.0)
+    ira = np.minimum(montant * PLAFOND_IRA_PCT_CAPITAL / 100, montant * r * PLAFOND_IRA_MOIS_INTERETS)
+    frais = np.where(est_remboursement, ira, np.nan_to_num(options['Frais (€)'].to_numpy(dtype=float)))
+    nouveau_taux = np.where(est_remboursement, taux_actuel, options['Nouveau Taux %'].to_numpy(dtype=float))
+    r_nouveau = np.where(nouveau_taux > 0, nouveau_taux / 1200, 0.0)
+    capital = crd - montant
+
+    # Nouvel échéancier : durée conservée (nouvelle mensualité) ou mensualité conservée (durée raccourcie)
+    conserve_mensualite = (options['Mode'] == 'mensualite').to_numpy() & est_remboursement
+    n_exact = np.where(conserve_mensualite, np.minimum(_nombre_echeances(capital, r_nouveau, mensualite), n_restant), n_restant)
+    n_pleines = np.floor(n_exact + 1e-9)
+    nouvelle_mensualite = np.where(capital <= 0, 0.0, np.where(conserve_mensualite, mensualite, _mensualite(capital, r_nouveau, n_restant)))
+    derniere = np.where(n_pleines < n_exact, _crd_apres(capital, r_nouveau, nouvelle_mensualite, n_pleines) * (1 + r_nouveau), 0.0)
+    # Un prêt entièrement remboursé s'arrête, quel que soit le mode (plus d'échéances ni d'assurance)
+    n_pleines = np.where(capital > 0, n_pleines, 0.0)
+    derniere = np.where(capital > 0, derniere, 0.0)
+    n_nouveau = n_pleines + (derniere > 0)
+    nouveaux_interets = nouvelle_mensualite * n_pleines + derniere - capital
+
+    # Impact à l'horizon : décaissements et écarts de mensualités placés, écart de capital restant dû
+    horizon = mois_reference + int(horizon_annees) * 12
+    g = (1 + taux_placement_pct / 100) ** (1 / 12) - 1
+    flux_initiaux = _valeur_acquise(mensualite + assurance, mois_option, mois_option + n_restant, horizon, g)
+    nouveaux_flux = (_valeur_acquise(nouvelle_mensualite + assurance, mois_option, mois_option + n_pleines, horizon, g)
+                     + _valeur_acquise(derniere + assurance, mois_option + n_pleines, mois_option + n_nouveau, horizon, g))
+    decaissement = _valeur_acquise(montant + frais, mois_option, mois_option + 1, horizon, g)
+    echeances_avant_horizon = np.clip(horizon - mois_option, 0, None)
+    crd_initial_horizon = np.where(echeances_avant_horizon < n_restant, _crd_apres(crd, r, mensualite, echeances_avant_horizon), 0.0)
+    crd_nouveau_horizon = np.where(echeances_avant_horizon < n_nouveau, _crd_apres(capital, r_nouveau, nouvelle_mensualite, echeances_avant_horizon), 0.0)
+
+    assurance_nouvelle = np.where(n_nouveau > 0, assurance, 0.0)
+    resultats = options.assign(**{
+        'Frais (€)': frais,
+        'Nouveau Taux %': nouveau_taux,
+        'Montant Remboursé (€)': montant,
+        'Capital Restant Dû (€)': crd,
+        'Mensualité Actuelle (€)': mensualite + assurance,
+        'Nouvelle Mensualité (€)': nouvelle_mensualite + assurance_nouvelle,
+        'Variation Mensualité (€)': nouvelle_mensualite + assurance_nouvelle - mensualite - assurance,
+        'Échéances Restantes': n_restant,
+        'Nouvelles Échéances Restantes': n_nouveau.astype(np.int64),
+        'Intérêts Économisés (€)': interets_restants - nouveaux_interets,
+        'Impact Patrimoine Net Final (€)': flux_initiaux - nouveaux_flux - decaissement + crd_initial_horizon - crd_nouveau_horizon,
+    })
+    resultats['Type'] = resultats['Type'].map(TYPES_OPTIONS)
+    resultats['Mode'] = resultats['Mode'].map(MODES_REMBOURSEMENT)
+    return resultats.sort_values('Impact Patrimoine Net Final (€)', ascending=False, ignore_index=True)
@@ -0,0 +1,152 @@
+# utils/scenarios.py
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .calculs_projection import ProjectionIncrementale
+
+# Types de variantes : libellé affiché (complété par la cible éventuelle)
+TYPES_VARIANTES = {
+    'retraite': "Retraite",           # cible : prénom de l'adulte, valeurs : âges de départ
+    'vente': "Vente",                 # cible : nom du bien, valeurs : années de vente (None : pas de vente)
+    'rendement': "Rendement",         # cible : nom de l'actif, valeurs : rendements annuels (%)
+    'inflation': "Inflation",         # valeurs : taux d'inflation (%)
+    'revalo_salaire': "Revalorisation salaires",  # valeurs : taux de revalorisation (%)
+}
+
+ENTREES_PROJECTION = ('stocks_df', 'revenus_df', 'depenses_df', 'prets_df', 'adultes_df', 'enfants_df', 'df_pension_hypotheses', 'hyp_economiques', 'est_parent_isole', 'ventes_df')
+
+def libelle_variante(variante):
+    """Libellé d'une dimension de la grille, ex. 'Retraite Marie' ou 'Inflation'."""
+    libelle = TYPES_VARIANTES[variante['type']]
+    return f"{libelle} {variante['cible']}" if variante.get('cible') else libelle
+
+def generer_grille_scenarios(variantes):
+    """
+    Produit cartésien des variantes. Chaque variante est un dictionnaire {'type', 'cible' (optionnelle), 'valeurs'}.
+    Retourne la liste des scénarios, chacun étant un dictionnaire {libellé de la variante: valeur}.
+    """
+    for variante in variantes:
+        if variante['type'] not in TYPES_VARIANTES:
+            raise ValueError(f"Type de variante inconnu : '{variante['type']}'. Types disponibles : {', '.join(TYPES_VARIANTES)}.")
+    libelles = [libelle_variante(v) for v in variantes]
+    if len(set(libelles)) != len(libelles):
+        raise ValueError("Chaque variante (type et cible) ne peut apparaître qu'une fois dans la grille.")
+    return [dict(zip(libelles, combinaison)) for combinaison in itertools.product(*(v['valeurs'] for v in variantes))]
+
+def _appliquer_retraite(entrees, prenom, age):
+    adultes = entrees['adultes_df']
+    ages = pd.to_numeric(adultes.loc[adultes['Prénom'] == prenom, 'Âge'], errors='coerce')
+    if ages.empty or pd.isna(ages.iloc[0]):
+        raise ValueError(f"Adulte inconnu ou sans âge renseigné : '{prenom}'.")
+    annee_naissance = datetime.now().year - int(ages.iloc[0])
+    pensions = entrees['df_pension_hypotheses'].copy()
+    lignes = np.flatnonzero((pensions['Prénom Adulte'] == prenom).to_numpy(dtype=bool))
+    if not len(lignes):
+        nouvelle = pd.DataFrame([{'Prénom Adulte': prenom, 'Âge Départ Retraite': int(age), 'Montant Pension Annuelle (€)': 0.0, 'Active': True, 'Année Départ Retraite': annee_naissance + int(age)}])
+        entrees['df_pension_hypotheses'] = pd.concat([pensions, nouvelle], ignore_index=True)
+        return
+    # Une seule hypothèse active par adulte : la première active (ou à défaut la première saisie), au nouvel âge
+    actives = lignes[pensions['Active'].iloc[lignes].fillna(False).astype(bool).to_numpy()]
+    retenue = actives[0] if len(actives) else lignes[0]
+    col_active, col_age, col_annee = (pensions.columns.get_loc(c) for c in ('Active', 'Âge Départ Retraite', 'Année Départ Retraite'))
+    for ligne in lignes:
+        pensions.iat[ligne, col_active] = ligne == retenue
+    pensions.iat[retenue, col_age] = int(age)
+    pensions.iat[retenue, col_annee] = annee_naissance + int(age)
+    entrees['df_pension_hypotheses'] = pensions
+
+def appliquer_scenario(entrees_base, variantes, scenario):
+    """
+    Applique les valeurs d'un scénario aux entrées de base (dictionnaire aux clés ENTREES_PROJECTION).
+    Les entrées de base ne sont pas modifiées : seules les tables concernées sont copiées.
+    """
+    entrees = dict(entrees_base)
+    for variante in variantes:
+        valeur = scenario[libelle_variante(variante)]
+        type_variante, cible = variante['type'], variante.get('cible')
+        if type_variante in ('inflation', 'revalo_salaire'):
+            entrees['hyp_economiques'] = {**entrees['hyp_economiques'], type_variante: float(valeur)}
+        elif type_variante == 'retraite':
+            _appliquer_retraite(entrees, cible, valeur)
+        elif type_variante == 'vente':
+            ventes = entrees['ventes_df']
+            ventes = ventes[ventes['Bien à Vendre'] != cible]
+            if valeur is not None and pd.notna(valeur):
+                ventes = pd.concat([ventes, pd.DataFrame([{'Bien à Vendre': cible, 'Année de Vente': int(valeur)}])], ignore_index=True)
+            entrees['ventes_df'] = ventes.reset_index(drop=True)
+        elif type_variante == 'rendement':
+            stocks = entrees['stocks_df'].copy()
+            stocks.loc[stocks['Actif'] == cible, 'Rendement %'] = float(valeur)
+            entrees['stocks_df'] = stocks
+    return entrees
+
+# Entrées communes à tous les scénarios d'un processus de calcul : transmises une seule fois, à l'initialisation
+# du processus. Ce dictionnaire n'est rempli que dans les processus du pool, jamais dans le serveur Streamlit
+# où plusieurs sessions peuvent lancer une grille en même temps.
+_CONTEXTE_GRILLE = {}
+
+def _contexte_grille(duree, entrees_base, variantes, moteur_impot):
+    return {'duree': duree, 'entrees_base': entrees_base, 'variantes': variantes, 'moteur_impot': moteur_impot}
+
+def _initialiser_contexte(duree, entrees_base, variantes, moteur_impot):
+    _CONTEXTE_GRILLE.update(_contexte_grille(duree, entrees_base, variantes, moteur_impot))
+
+def _projeter_tranche(tranche, contexte=None):
+    """
+    Projette une tranche contiguë de scénarios [(id, scénario)]. Un moteur incrémental est partagé par la tranche :
+    deux scénarios voisins de la grille ne différant souvent que par la dernière variante, seules les années
+    concernées sont recalculées. Sans `contexte` explicite, utilise celui de l'initialisation du processus.
+    """
+    contexte = contexte if contexte is not None else _CONTEXTE_GRILLE
+    projection = ProjectionIncrementale()
+    resultats = []
+    for id_scenario, scenario in tranche:
+        entrees = appliquer_scenario(contexte['entrees_base'], contexte['variantes'], scenario)
+        df_scenario, _ = projection.calculer(contexte['duree'], *(entrees[cle] for cle in ENTREES_PROJECTION), moteur_impot=contexte['moteur_impot'])
+        resultats.append(df_scenario.assign(**{'Scénario': id_scenario, **scenario}))
+    return resultats
+
+def executer_grille_scenarios(duree, entrees_base, variantes, moteur_impot='bareme', workers=None):
+    """
+    Projette chaque scénario du produit cartésien des `variantes` appliquées au foyer `entrees_base`.
+    Les scénarios sont répartis par tranches contiguës sur un ProcessPoolExecutor ; les entrées de base
+    sont transmises une seule fois à chaque processus. Avec un seul processus, la tranche est projetée
+    dans le processus appelant avec un contexte propre à l'appel.
+
+    Retourne un DataFrame au format long : une ligne par scénario et par année, avec l'identifiant
+    'Scénario', la valeur de chaque variante et toutes les colonnes de la projection.
+    """
+    scenarios = list(enumerate(generer_grille_scenarios(variantes)))
+    if not scenarios or duree <= 0:
+        return pd.DataFrame()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(scenarios)))
+    tranches = [list(tranche) for tranche in np.array_split(np.arange(len(scenarios)), workers) if len(tranche)]
+    tranches = [[scenarios[k] for k in tranche] for tranche in tranches]
+
+    if workers == 1:
+        resultats = _projeter_tranche(tranches[0], _contexte_grille(duree, entrees_base, variantes, moteur_impot))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_contexte, initargs=(duree, entrees_base, variantes, moteur_impot)) as executor:
+            resultats = [df for dfs in executor.map(_projeter_tranche, tranches) for df in dfs]
+
+    colonnes_variantes = [libelle_variante(v) for v in variantes]
+    df_long = pd.concat(resultats, ignore_index=True)
+    return df_long[['Scénario'] + colonnes_variantes + [c for c in df_long.columns if c not in ['Scénario'] + colonnes_variantes]]
+
+def synthese_scenarios(df_long, variantes):
+    """Une ligne par scénario : patrimoine net final, reste à vivre minimal et cumulé, classés par patrimoine final."""
+    colonnes_variantes = [libelle_variante(v) for v in variantes]
+    groupes = df_long.groupby('Scénario', sort=True)
+    synthese = groupes[colonnes_variantes].first()
+    synthese['Patrimoine Net Final'] = groupes['Patrimoine Net'].last()
+    synthese['Reste à Vivre Minimal'] = groupes['Reste à Vivre'].min()
+    synthese['Reste à Vivre Cumulé'] = groupes['Reste à Vivre'].sum()
+    return synthese.sort_values('Patrimoine Net Final', ascending=False).reset_index()
+
+def annees_vente_possibles(duree):
+    """Années proposées pour une variante de vente sur l'horizon de projection."""
+    annee_actuelle = datetime.now().year
+    return list(range(annee_actuelle, annee_actuelle + duree))
@@ -1,8 +1,15 @@
 # utils/state_manager.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, date
+import copy
+import gzip
+import hashlib
+import io
 import json
+import pickle
+import zipfile
 
 # --- DÉFINITION DE L'ÉTAT INITIAL ---
 def get_initial_state_config():
@@ -93,46 +100,220 @@ def custom_decoder(dct):
         if obj_type == 'datetime':
             return pd.to_datetime(dct['value'])
         if obj_type == 'dataframe':
-            # Utilise read_json avec l'orientation 'split'
-            return pd.read_json(dct['value'], orient='split')
+            # Utilise read_json avec l'orientation 'split' (le JSON littéral doit être passé comme un flux)
+            return pd.read_json(io.StringIO(dct['value']), orient='split')
     return dct
 
-def save_state_to_file(file_path):
+def lire_etat_json(contenu):
     """
-    Sauvegarde l'état actuel de la session dans un fichier JSON.
+    Décode le contenu d'un fichier de sauvegarde (hors de toute session Streamlit).
+    Retourne (etat, cles_ignorees) : l'état contient toutes les clés de la configuration initiale,
+    les clés absentes du fichier prenant leur valeur par défaut.
     """
-    state_to_save = {}
+    return _completer_etat(json.loads(contenu, object_hook=custom_decoder))
+
+def _completer_etat(donnees):
+    """Complète les données lues avec les valeurs par défaut ; retourne (etat, cles_ignorees)."""
     config = get_initial_state_config()
+    etat = {}
+    for key, item_config in config.items():
+        if key in donnees:
+            etat[key] = donnees[key]
+        elif item_config['type'] == 'dataframe':
+            etat[key] = pd.DataFrame(columns=item_config['cols'])
+        else:
+            etat[key] = copy.deepcopy(item_config['default'])
+    return etat, [key for key in donnees if key not in config]
+
+# --- FORMAT BINAIRE ---
+# Archive zip : un manifeste JSON (valeurs simples et structure de l'état) et un bloc binaire par DataFrame
+# (Arrow IPC compressé lz4, types conservés) ou tableau NumPy (.npy). Chaque bloc est vérifié par son SHA-256.
+FORMAT_BINAIRE = 'audit_patrimonial_binaire'
+VERSION_FORMAT_BINAIRE = 1
+FORMATS_SAUVEGARDE = {'json': ('.json', 'application/json'), 'binaire': ('.zip', 'application/zip')}
+
+def _ecrire_bloc_arrow(df):
+    """DataFrame -> fichier Arrow IPC compressé. Mono-thread : les blocs sont modestes et le serveur est partagé entre sessions."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, nthreads=1)
+    flux = pa.BufferOutputStream()
+    with pa.ipc.new_file(flux, table.schema, options=pa.ipc.IpcWriteOptions(compression='lz4', use_threads=False)) as ecrivain:
+        ecrivain.write_table(table)
+    return flux.getvalue().to_pybytes()
+
+def _lire_bloc_arrow(contenu):
+    """Fichier Arrow IPC -> DataFrame, types pandas (Int64, boolean, dates, index) restaurés depuis les métadonnées."""
+    import pyarrow as pa
+    lecteur = pa.ipc.open_file(pa.py_buffer(contenu), options=pa.ipc.IpcReadOptions(use_threads=False))
+    return lecteur.read_all().to_pandas(use_threads=False)
+
+def _decomposer(obj, blocs):
+    """Remplace récursivement DataFrames et tableaux NumPy par des références aux blocs binaires ajoutés à `blocs`."""
+    if isinstance(obj, pd.DataFrame):
+        nom = f"blocs/{len(blocs):04d}"
+        try:
+            blocs[f"{nom}.arrow"] = _ecrire_bloc_arrow(obj)
+            return {'__complex_object__': 'dataframe', 'bloc': f"{nom}.arrow"}
+        except (ImportError, ValueError, TypeError, NotImplementedError):
+            # Colonnes de types mélangés ou noms non textuels : repli sur l'encodage JSON historique
+            blocs[f"{nom}.json"] = obj.to_json(orient='split', date_format='iso').encode('utf-8')
+            return {'__complex_object__': 'dataframe', 'bloc': f"{nom}.json"}
+    if isinstance(obj, np.ndarray) and obj.dtype != object:
+        nom = f"blocs/{len(blocs):04d}.npy"
+        tampon = io.BytesIO()
+        np.save(tampon, obj, allow_pickle=False)
+        blocs[nom] = tampon.getvalue()
+        return {'__complex_object__': 'ndarray', 'bloc': nom}
+    if isinstance(obj, dict):
+        valeur = {str(k): _decomposer(v, blocs) for k, v in obj.items()}
+        if type(obj) is not dict and type(obj).__name__ == 'OptimizeResult':
+            return {'__complex_object__': 'optimize_result', 'value': valeur}
+        return valeur
+    if isinstance(obj, tuple):
+        return {'__complex_object__': 'tuple', 'value': [_decomposer(v, blocs) for v in obj]}
+    if isinstance(obj, (list, np.ndarray)):
+        return [_decomposer(v, blocs) for v in obj]
+    if isinstance(obj, (datetime, date, pd.Timestamp)):
+        return {'__complex_object__': 'datetime', 'value': obj.isoformat()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if pd.isna(obj):
+        return None
+    raise TypeError(f"Type non sérialisable : {type(obj).__name__}")
+
+def _recomposer(obj, lire_bloc):
+    """Inverse de `_decomposer` : reconstruit les objets à partir du manifeste et des blocs."""
+    if isinstance(obj, list):
+        return [_recomposer(v, lire_bloc) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    obj_type = obj.get('__complex_object__')
+    if obj_type == 'dataframe':
+        contenu = lire_bloc(obj['bloc'])
+        if obj['bloc'].endswith('.arrow'):
+            return _lire_bloc_arrow(contenu)
+        return pd.read_json(io.StringIO(contenu.decode('utf-8')), orient='split')
+    if obj_type == 'ndarray':
+        return np.load(io.BytesIO(lire_bloc(obj['bloc'])), allow_pickle=False)
+    if obj_type == 'datetime':
+        return pd.to_datetime(obj['value'])
+    if obj_type == 'tuple':
+        return tuple(_recomposer(v, lire_bloc) for v in obj['value'])
+    if obj_type == 'optimize_result':
+        from scipy.optimize import OptimizeResult
+        return OptimizeResult(_recomposer(obj['value'], lire_bloc))
+    return {k: _recomposer(v, lire_bloc) for k, v in obj.items()}
+
+def ecrire_etat_binaire(etat):
+    """Sérialise un état (dictionnaire) au format binaire ; retourne le contenu de l'archive (bytes)."""
+    blocs = {}
+    manifeste = {
+        'format': FORMAT_BINAIRE,
+        'version': VERSION_FORMAT_BINAIRE,
+        'cree_le': datetime.now().isoformat(timespec='seconds'),
+        'etat': _decomposer(etat, blocs),
+        'blocs': {nom: hashlib.sha256(contenu).hexdigest() for nom, contenu in blocs.items()},
+    }
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, 'w') as archive:
+        archive.writestr('manifest.json', json.dumps(manifeste, ensure_ascii=False), compress_type=zipfile.ZIP_DEFLATED)
+        for nom, contenu in blocs.items():
+            # Les blocs Arrow sont déjà compressés (lz4) : seuls les autres blocs sont dégonflés
+            archive.writestr(nom, contenu, compress_type=zipfile.ZIP_STORED if nom.endswith('.arrow') else zipfile.ZIP_DEFLATED)
+    return tampon.getvalue()
+
+def lire_etat_binaire(contenu):
+    """
+    Décode une archive écrite par `ecrire_etat_binaire` après vérification des sommes de contrôle.
+    Retourne (etat, cles_ignorees), comme `lire_etat_json`.
+    """
+    with zipfile.ZipFile(io.BytesIO(contenu)) as archive:
+        manifeste = json.loads(archive.read('manifest.json').decode('utf-8'))
+        if manifeste.get('format') != FORMAT_BINAIRE:
+            raise ValueError("Archive non reconnue : ce n'est pas un fichier de sauvegarde de l'audit patrimonial.")
+        if manifeste.get('version', 0) > VERSION_FORMAT_BINAIRE:
+            raise ValueError(f"Version de format {manifeste['version']} non prise en charge (maximum {VERSION_FORMAT_BINAIRE}).")
+
+        def lire_bloc(nom):
+            donnees = archive.read(nom)
+            if hashlib.sha256(donnees).hexdigest() != manifeste['blocs'].get(nom):
+                raise ValueError(f"Fichier de sauvegarde corrompu : somme de contrôle invalide pour le bloc '{nom}'.")
+            return donnees
+
+        return _completer_etat(_recomposer(manifeste['etat'], lire_bloc))
+
+def lire_etat(contenu):
+    """Décode un fichier de sauvegarde quel que soit son format (archive binaire, JSON éventuellement gzip) ; retourne (etat, cles_ignorees)."""
+    if isinstance(contenu, bytes) and contenu[:2] == b'\x1f\x8b':
+        contenu = gzip.decompress(contenu)
+    if isinstance(contenu, bytes) and contenu[:4] == b'PK\x03\x04':
+        return lire_etat_binaire(contenu)
+    return lire_etat_json(contenu.decode('utf-8') if isinstance(contenu, bytes) else contenu)
+
+def extraire_etat_session():
+    """Clés de l'état défini présentes dans la session (références, sans copie)."""
     # On ne sauvegarde que les clés qui font partie de notre état défini
-    for key in config.keys():
-        if key in st.session_state:
-            state_to_save[key] = st.session_state[key]
-            
+    return {key: st.session_state[key] for key in get_initial_state_config() if key in st.session_state}
+
+def serialiser_etat(etat, format_fichier='json', compresser=False):
+    """
+    Sérialise un état en mémoire ; retourne le contenu du fichier de sauvegarde (bytes).
+    `compresser` applique gzip au format JSON (le format binaire est déjà compressé).
+    """
+    if format_fichier == 'binaire':
+        return ecrire_etat_binaire(etat)
+    contenu = json.dumps(etat, cls=CustomEncoder, indent=4).encode('utf-8')
+    return gzip.compress(contenu, compresslevel=6) if compresser else contenu
+
+def caracteristiques_fichier_sauvegarde(format_fichier='json', compresser=False):
+    """Extension et type MIME du fichier produit par `serialiser_etat`."""
+    if format_fichier == 'json' and compresser:
+        return '.json.gz', 'application/gzip'
+    return FORMATS_SAUVEGARDE[format_fichier]
+
+def empreinte_etat(etat):
+    """
+    Empreinte (SHA-1) du contenu d'un état, y compris après modification sur place. Calculée sur le pickle de
+    l'état (dix fois plus rapide qu'un hachage colonne par colonne) ; None si l'état n'est pas sérialisable.
+    """
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(state_to_save, f, cls=CustomEncoder, indent=4)
-        st.success(f"État sauvegardé avec succès dans {file_path}")
-    except Exception as e:
-        st.error(f"Erreur lors de la sauvegarde du fichier : {e}")
+        return hashlib.sha1(pickle.dumps(etat, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+def sauvegarde_paresseuse(etat, format_fichier='json', compresser=False, memo=None):
+    """
+    Retourne une fonction sans argument produisant, en mémoire, le fichier de sauvegarde de `etat`
+    (à passer à `st.download_button`, qui ne l'appelle qu'au clic). Le résultat est conservé dans `memo`
+    (dictionnaire propre à la session) et réutilisé tant que l'état et le format n'ont pas changé.
+    """
+    memo = {} if memo is None else memo
+
+    def generer():
+        cle = (format_fichier, compresser, empreinte_etat(etat))
+        if cle[2] is None or memo.get('cle') != cle:
+            memo['contenu'] = serialiser_etat(etat, format_fichier, compresser)
+            memo['cle'] = cle
+        return memo['contenu']
+    return generer
 
 def load_state_from_file(uploaded_file):
     """
-    Charge l'état de la session depuis un fichier JSON, en réinitialisant d'abord.
+    Charge l'état de la session depuis un fichier de sauvegarde (JSON ou binaire), en réinitialisant d'abord.
     """
     try:
-        content = uploaded_file.read().decode('utf-8')
-        loaded_data = json.loads(content, object_hook=custom_decoder)
+        etat, cles_ignorees = lire_etat(uploaded_file.read())
         
         # Réinitialiser l'état avant de charger pour éviter les conflits de clés anciennes/nouvelles
         reset_state()
         
-        # Mettre à jour la session avec les données chargées
-        for key, value in loaded_data.items():
-            # S'assurer de ne charger que les clés attendues pour la sécurité et la propreté
-            if key in get_initial_state_config():
-                st.session_state[key] = value
-            else:
-                st.warning(f"Clé '{key}' trouvée dans le fichier mais non reconnue par l'application. Elle a été ignorée.")
+        # Mettre à jour la session avec les données chargées (seules les clés attendues sont conservées)
+        for key, value in etat.items():
+            st.session_state[key] = value
+        for key in cles_ignorees:
+            st.warning(f"Clé '{key}' trouvée dans le fichier mais non reconnue par l'application. Elle a été ignorée.")
 
         st.success("État chargé avec succès !")
         st.rerun()
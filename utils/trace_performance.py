@@ -0,0 +1,63 @@
+# utils/trace_performance.py
+import time
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+
+class TracePerformance:
+    """
+    Trace d'exécution légère : chaque étape instrumentée enregistre son début, sa durée, l'année traitée
+    (pour les étapes de la boucle annuelle) et des détails libres (ex. hits du cache d'impôt).
+    Les étapes peuvent s'imbriquer ; la trace s'exporte au format Chrome Trace (chrome://tracing, Perfetto).
+    """
+    def __init__(self):
+        self.origine = time.perf_counter()
+        self.evenements = []
+
+    @contextmanager
+    def etape(self, nom, annee=None, **details):
+        """Chronomètre le bloc ; le dictionnaire `details` retourné peut être complété pendant l'étape."""
+        debut = time.perf_counter()
+        try:
+            yield details
+        finally:
+            self.evenements.append({'etape': nom, 'annee': annee, 'debut': debut - self.origine, 'duree': time.perf_counter() - debut, 'details': details})
+
+    def synthese(self):
+        """Une ligne par étape : nombre d'appels, durée cumulée et moyenne (ms), triées par durée cumulée."""
+        if not self.evenements:
+            return pd.DataFrame(columns=['Étape', 'Appels', 'Durée Totale (ms)', 'Durée Moyenne (ms)'])
+        df = pd.DataFrame(self.evenements)
+        synthese = df.groupby('etape', sort=False)['duree'].agg(['count', 'sum', 'mean']).reset_index()
+        synthese.columns = ['Étape', 'Appels', 'Durée Totale (ms)', 'Durée Moyenne (ms)']
+        synthese[['Durée Totale (ms)', 'Durée Moyenne (ms)']] *= 1000
+        return synthese.sort_values('Durée Totale (ms)', ascending=False, ignore_index=True)
+
+    def par_annee(self):
+        """Durée cumulée (ms) des étapes de la boucle annuelle : une ligne par année, une colonne par étape."""
+        annuels = [e for e in self.evenements if e['annee'] is not None]
+        if not annuels:
+            return pd.DataFrame()
+        df = pd.DataFrame(annuels)
+        return df.pivot_table(index='annee', columns='etape', values='duree', aggfunc='sum').mul(1000).rename_axis(index='Année', columns=None)
+
+    def details(self, nom):
+        """Détails enregistrés par les appels de l'étape `nom` (ex. hits et misses du cache d'impôt)."""
+        return [e['details'] for e in self.evenements if e['etape'] == nom]
+
+    def vers_chrome_trace(self):
+        """Trace au format Chrome Trace Event (événements complets 'X', horodatages en microsecondes)."""
+        return {
+            'traceEvents': [{
+                'name': e['etape'], 'cat': 'projection', 'ph': 'X', 'pid': 1, 'tid': 1,
+                'ts': round(e['debut'] * 1e6, 3), 'dur': round(e['duree'] * 1e6, 3),
+                'args': {**({'annee': e['annee']} if e['annee'] is not None else {}), **{k: v for k, v in e['details'].items()}},
+            } for e in sorted(self.evenements, key=lambda e: e['debut'])],
+            'displayTimeUnit': 'ms',
+        }
+
+class _TraceInactive:
+    """Trace nulle utilisée par défaut : aucune mesure, coût négligeable."""
+    def etape(self, nom, annee=None, **details):
+        return nullcontext(details)
+
+TRACE_INACTIVE = _TraceInactive()
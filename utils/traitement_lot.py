@@ -0,0 +1,144 @@
+# utils/traitement_lot.py
+"""
+Traitement par lot des fichiers de sauvegarde (JSON ou binaires, produits par `serialiser_etat` et téléchargés
+depuis la page de sauvegarde via `sauvegarde_paresseuse`), sans interface :
+
+    python -m utils.traitement_lot dossier_clients --sortie resultats --format parquet --duree 25
+
+Pour chaque fichier : synthèse du bilan patrimonial, taux d'endettement et projection complète.
+Les fichiers sont répartis sur tous les cœurs ; le résultat est une table consolidée (une ligne par
+fichier et par année de projection) et un rapport d'erreurs par fichier.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+from .calculs import calculer_taux_endettement
+from .calculs_projection import generer_projection_complete
+from .openfisca_utils import MOTEURS_IMPOT
+from .patrimoine_calculs import calculate_patrimoine_summaries
+from .state_manager import lire_etat
+
+# Paramètres communs à tous les fichiers d'un processus : transmis une seule fois, à l'initialisation
+_PARAMETRES_LOT = {}
+
+def _initialiser_lot(duree, moteur_impot, hyp_economiques):
+    _PARAMETRES_LOT.update(duree=duree, moteur_impot=moteur_impot, hyp_economiques=hyp_economiques)
+
+def traiter_fichier(chemin, duree=25, moteur_impot='bareme', hyp_economiques=None):
+    """
+    Traite un fichier de sauvegarde. Les étapes sont indépendantes : l'échec de l'une est consigné
+    et n'empêche pas les suivantes.
+
+    Retourne un dictionnaire : 'synthese' (indicateurs du fichier), 'projection' (DataFrame, éventuellement
+    vide) et 'erreurs' (liste de {'Fichier', 'Étape', 'Erreur'}).
+    """
+    synthese, projection, erreurs = {'Fichier': str(chemin)}, pd.DataFrame(), []
+
+    def consigner(etape, exception):
+        erreurs.append({'Fichier': str(chemin), 'Étape': etape, 'Erreur': f"{type(exception).__name__}: {exception}"})
+
+    try:
+        etat, _ = lire_etat(Path(chemin).read_bytes())
+    except Exception as e:
+        consigner('chargement', e)
+        return {'synthese': synthese, 'projection': projection, 'erreurs': erreurs}
+
+    try:
+        bilan = calculate_patrimoine_summaries(etat['patrimoine'])
+        synthese.update({'Actif Total': bilan['total_actifs'], 'Passif Total': bilan['total_passifs'], 'Patrimoine Net (Bilan)': bilan['patrimoine_net']})
+    except Exception as e:
+        consigner('bilan', e)
+
+    try:
+        endettement = calculer_taux_endettement(etat['df_revenus'], etat['df_prets'], etat['df_stocks'])
+        synthese.update({
+            'Revenus Mensuels Pondérés': endettement['total_revenus_mensuels_ponderes'],
+            'Charges Prêts Mensuelles': endettement['total_charges_prets_mensuelles'],
+            "Taux d'Endettement (%)": endettement['taux_endettement'],
+        })
+    except Exception as e:
+        consigner('endettement', e)
+
+    try:
+        hyp = {**etat['hyp_economiques'], **(hyp_economiques or {})}
+        projection, _ = generer_projection_complete(
+            duree, etat['df_stocks'], etat['df_revenus'], etat['df_depenses'], etat['df_prets'], etat['df_adultes'], etat['df_enfants'],
+            etat['df_pension_hypotheses'], hyp, etat['parent_isole'], etat['df_ventes'], moteur_impot=moteur_impot
+        )
+    except Exception as e:
+        consigner('projection', e)
+    return {'synthese': synthese, 'projection': projection, 'erreurs': erreurs}
+
+def _traiter_fichier_lot(chemin):
+    return traiter_fichier(chemin, **_PARAMETRES_LOT)
+
+def traiter_lot(chemins, duree=25, moteur_impot='bareme', hyp_economiques=None, workers=None):
+    """
+    Traite une liste de fichiers de sauvegarde sur un ProcessPoolExecutor.
+    Retourne (resultats, erreurs) : la table consolidée au format long (indicateurs du fichier répétés sur
+    chaque année de sa projection ; une seule ligne si la projection a échoué) et le rapport d'erreurs.
+    """
+    chemins = [str(c) for c in chemins]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chemins) or 1))
+    if workers == 1:
+        _initialiser_lot(duree, moteur_impot, hyp_economiques)
+        traitements = [_traiter_fichier_lot(chemin) for chemin in chemins]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_lot, initargs=(duree, moteur_impot, hyp_economiques)) as executor:
+            traitements = list(executor.map(_traiter_fichier_lot, chemins, chunksize=max(1, len(chemins) // (workers * 8))))
+
+    tables = []
+    for traitement in traitements:
+        projection = traitement['projection']
+        if projection.empty:
+            tables.append(pd.DataFrame([traitement['synthese']]))
+        else:
+            tables.append(projection.assign(**traitement['synthese'])[list(traitement['synthese']) + list(projection.columns)])
+    resultats = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    erreurs = pd.DataFrame([erreur for traitement in traitements for erreur in traitement['erreurs']], columns=['Fichier', 'Étape', 'Erreur'])
+    return resultats, erreurs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Projection par lot des fichiers de sauvegarde de l'audit patrimonial.")
+    parser.add_argument('dossier', help="Dossier contenant les fichiers de sauvegarde")
+    parser.add_argument('--motif', default='*.json', help="Motif des fichiers à traiter (défaut : *.json ; *.zip pour le format binaire)")
+    parser.add_argument('--sortie', default='resultats_lot', help="Dossier de sortie (défaut : resultats_lot)")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet', help="Format de la table consolidée")
+    parser.add_argument('--duree', type=int, default=25, help="Durée de la projection en années (défaut : 25)")
+    parser.add_argument('--moteur-impot', choices=list(MOTEURS_IMPOT), default='bareme', help="Moteur de calcul de l'impôt (défaut : bareme)")
+    parser.add_argument('--inflation', type=float, help="Remplace le taux d'inflation (%%) de chaque fichier")
+    parser.add_argument('--revalo-salaire', type=float, help="Remplace le taux de revalorisation des salaires (%%) de chaque fichier")
+    parser.add_argument('--workers', type=int, help="Nombre de processus (défaut : nombre de cœurs)")
+    args = parser.parse_args(argv)
+
+    chemins = sorted(Path(args.dossier).glob(args.motif))
+    if not chemins:
+        print(f"Aucun fichier '{args.motif}' trouvé dans {args.dossier}.", file=sys.stderr)
+        return 1
+    hyp_economiques = {cle: valeur for cle, valeur in (('inflation', args.inflation), ('revalo_salaire', args.revalo_salaire)) if valeur is not None}
+
+    debut = time.time()
+    resultats, erreurs = traiter_lot(chemins, args.duree, args.moteur_impot, hyp_economiques, args.workers)
+
+    sortie = Path(args.sortie)
+    sortie.mkdir(parents=True, exist_ok=True)
+    if args.format == 'parquet':
+        try:
+            resultats.to_parquet(sortie / 'resultats.parquet', index=False)
+        except ImportError as e:
+            print(f"Écriture Parquet impossible ({e}) : utilisez --format csv.", file=sys.stderr)
+            return 1
+    else:
+        resultats.to_csv(sortie / 'resultats.csv', index=False)
+    erreurs.to_csv(sortie / 'erreurs.csv', index=False)
+
+    n_en_erreur = erreurs['Fichier'].nunique()
+    print(f"{len(chemins)} fichier(s) traité(s) en {time.time() - debut:.1f} s, {n_en_erreur} avec erreur(s). Résultats dans {sortie}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())